@@ -1,23 +1,77 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes
-from db_manager import init_db, get_db, get_or_create_user, save_test_to_db, get_test_questions_from_db, save_quiz_result, get_leaderboards, Test 
+from db_manager import (
+    get_engine, init_db, run_db, get_or_create_user, save_test_to_db, get_question_set_by_id,
+    save_quiz_result, get_leaderboards, get_monthly_leaderboard, get_user_rank, get_catalogue_page, get_question_difficulty,
+    delete_test_by_id, get_pool_status, create_broadcast, get_latest_broadcast, cancel_broadcast,
+    get_test_board, get_user_results, get_test_name, get_test_id_by_name, get_popular_test_ids,
+)
+import config
 from config import TELEGRAM_BOT_TOKEN, ADMIN_ID
-from parser import parse_text_to_quiz
-import random
-import json
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError 
+from quiz_cache import question_cache, TTLCache
+from quiz_session import QuizSession
+from parser import iter_quiz
+from session_store import create_session_store
+from callback_data import encode_callback, decode_callback, MAX_TAIL_SIZE
+from update_processor import PerUserUpdateProcessor
+from timer_wheel import TimerWheel
+from question_stats import QuestionStatsBuffer
+from outbound import OutboundScheduler, PRIORITY_ANSWER, PRIORITY_BULK
+from retention import MONTH_RE, RETENTION_INTERVAL, retention_loop, partition_loop
+from broadcast import BroadcastManager, format_broadcast
+import metrics
+from result_writer import ResultWriter, RESULT_WRITE_BEHIND
+import asyncio
+import datetime
+import functools
+import html
+import io
+import time
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from telegram.error import TelegramError
 
-user_quiz_state = {}
+session_store = create_session_store()
+leaderboard_cache = TTLCache(getattr(config, "LEADERBOARD_CACHE_TTL", 5))
+# Test reytinglarining birinchi sahifasi; yangi natija yozilganda bekor qilinadi.
+test_board_cache = TTLCache(getattr(config, "TEST_BOARD_CACHE_TTL", 60))
 
 
-def get_db_session(context: ContextTypes.DEFAULT_TYPE):
-    """Context'dan DB sessiyasini oladi."""
-    try:
-        return next(get_db())
-    except Exception as e:
-        print(f"DB sessiyasini olishda xatolik: {e}")
-        return None
+def invalidate_test_boards(results):
+    for test_id in {r['test_id'] for r in results}:
+        test_board_cache.invalidate(test_id)
+
+
+result_writer = ResultWriter(on_saved=invalidate_test_boards) if RESULT_WRITE_BEHIND else None
+outbound = OutboundScheduler()
+session_timers = TimerWheel()
+question_stats = QuestionStatsBuffer()
+broadcasts = BroadcastManager()
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+BOT_MODE = getattr(config, "BOT_MODE", "polling")
+CONCURRENT_UPDATES = getattr(config, "CONCURRENT_UPDATES", 16)
+BOT_API_BASE_URL = getattr(config, "BOT_API_BASE_URL", None)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+METRICS_HOST = getattr(config, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(config, "METRICS_PORT", None)
+QUESTION_TIME_LIMIT = getattr(config, "QUESTION_TIME_LIMIT", None)  # sekund, None - cheklovsiz
+QUIZ_TIME_LIMIT = getattr(config, "QUIZ_TIME_LIMIT", None)
+SESSION_IDLE_TIMEOUT = getattr(config, "SESSION_IDLE_TIMEOUT", 30 * 60)
+WARMUP_TESTS = getattr(config, "WARMUP_TESTS", 20)  # ishga tushganda keshga oldindan yuklanadigan testlar
+
+# Katalog rejimlari: /takequiz, /listtests, /delete
+CATALOGUE_TAKE, CATALOGUE_LIST, CATALOGUE_DELETE = 0, 1, 2
+CATALOGUE_TITLES = {
+    CATALOGUE_TAKE: "Qaysi testni olishni xohlaysiz?",
+    CATALOGUE_LIST: "Saqlangan testlar ro'yxati:",
+    CATALOGUE_DELETE: "Qaysi testni o‘chirmoqchisiz?",
+}
+CATALOGUE_EMPTY = {
+    CATALOGUE_TAKE: "Hozirda mavjud testlar yo'q.",
+    CATALOGUE_LIST: "Hozirda saqlangan testlar mavjud emas.",
+    CATALOGUE_DELETE: "Hech qanday test mavjud emas.",
+}
 
 async def add_test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Admin /addtest buyrug'ini ishga tushirganda chaqiriladi."""
@@ -25,151 +79,374 @@ async def add_test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
         return
     
-    user_quiz_state[update.effective_user.id] = {'step': 'awaiting_test_name'}
+    await session_store.put(update.effective_user.id, {'step': 'awaiting_test_name'})
+    schedule_session(update.effective_user.id, None)
     await update.message.reply_text("Yangi test uchun **nom** kiriting (masalan: Geografiya_101).")
 
 
 async def handle_admin_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Adminning matn/nom kiritishini boshqaradi."""
     user_id = update.effective_user.id
-    state = user_quiz_state.get(user_id, {})
+    state, version = await session_store.get(user_id)
+    if not isinstance(state, dict):
+        return
     step = state.get('step')
     
     if step == 'awaiting_test_name' and update.message.text:
         test_name = update.message.text.strip()
-        user_quiz_state[user_id]['step'] = 'awaiting_test_content'
-        user_quiz_state[user_id]['test_name'] = test_name
+        new_state = {'step': 'awaiting_test_content', 'test_name': test_name}
+        if not await session_store.save(user_id, new_state, version):
+            return
+        schedule_session(user_id, None)
         await update.message.reply_text(
             f"Test nomi **{test_name}** qabul qilindi.\n\n"
             "Endi **matnni** quyidagi formatda yuboring (Savollar raqam bilan boshlanishi kerak):\n"
             "1. Savol matni?\n*To'g'ri javob\nNoto'g'ri javob\nNoto'g'ri javob\n"
-            "2. Boshqa savol?\n*To'g'ri javob"
+            "2. Boshqa savol?\n*To'g'ri javob\n\n"
+            "Katta testlar uchun shu formatdagi .txt yoki .md faylni yuborishingiz mumkin."
         )
         return
 
     elif step == 'awaiting_test_content' and update.message.text:
-        text_content = update.message.text
-        parsed_questions = parse_text_to_quiz(text_content)
+        errors = []
+        parsed_questions = list(iter_quiz(update.message.text.split('\n'), errors))
         
         if not parsed_questions:
-            await update.message.reply_text("Xato: Matndan savollar ajratilmadi. Formatni tekshiring.")
+            await update.message.reply_text(
+                "Xato: Matndan savollar ajratilmadi. Formatni tekshiring." + format_parse_errors(errors)
+            )
             return
             
-        test_name = state['test_name']
-        db: Session = get_db_session(context)
+        await save_test_content(update, user_id, state['test_name'], parsed_questions, errors)
+        return
+
+
+async def handle_admin_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin yuborgan .txt/.md fayldagi savollarni oqim ko'rinishida o'qib saqlaydi."""
+    user_id = update.effective_user.id
+    state, version = await session_store.get(user_id)
+    if not isinstance(state, dict) or state.get('step') != 'awaiting_test_content':
+        return
+
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_UPLOAD_BYTES:
+        await update.message.reply_text("Xato: Fayl juda katta.")
+        return
+
+    telegram_file = await document.get_file()
+    buffer = io.BytesIO()
+    await telegram_file.download_to_memory(buffer)
+    buffer.seek(0)
+
+    errors = []
+    lines = io.TextIOWrapper(buffer, encoding='utf-8-sig', errors='replace')
+    await save_test_content(update, user_id, state['test_name'], iter_quiz(lines, errors), errors)
+
+
+def format_parse_errors(errors, limit=10):
+    """Tahlil xatolarini qator raqamlari bilan matnga aylantiradi."""
+    if not errors:
+        return ""
+    message = "\n\nO'tkazib yuborilgan qatorlar:\n"
+    for line_no, reason in errors[:limit]:
+        message += f"{line_no}-qator: {reason}\n"
+    if len(errors) > limit:
+        message += f"... va yana {len(errors) - limit} ta"
+    return message
+
+
+async def save_test_content(update, user_id, test_name, questions, errors):
+    """Tahlil qilingan savollarni saqlaydi va adminga natijani yuboradi."""
+    try:
+        test_id, count = await run_db(save_test_to_db, test_name, questions)
         
-        if not db:
-            await update.message.reply_text("DB ulanishida xatolik yuz berdi. Iltimos, serverni tekshiring.")
-            return
-            
-        try:
-            test_id = save_test_to_db(db, test_name, parsed_questions)
-            
+        if not count:
             await update.message.reply_text(
-                f"✅ Test **'{test_name}'** (ID: {test_id}) muvaffaqiyatli saqlandi!\n"
-                f"Jami **{len(parsed_questions)}** ta savol qo'shildi."
+                "Xato: Fayldan savollar ajratilmadi. Formatni tekshiring." + format_parse_errors(errors)
             )
-        except IntegrityError:
-            await update.message.reply_text(f"Xato: **'{test_name}'** nomli test allaqachon mavjud.")
-        except Exception as e:
-            print(f"DB Save Error: {e}")
-            await update.message.reply_text(f"Xato: Testni saqlashda kutilmagan xato yuz berdi: ({e})")
-        finally:
-            del user_quiz_state[user_id]
-        return
+            return
+        
+        await update.message.reply_text(
+            f"✅ Test **'{test_name}'** (ID: {test_id}) muvaffaqiyatli saqlandi!\n"
+            f"Jami **{count}** ta savol qo'shildi." + format_parse_errors(errors)
+        )
+    except IntegrityError:
+        await update.message.reply_text(f"Xato: **'{test_name}'** nomli test allaqachon mavjud.")
+    except SQLAlchemyError as e:
+        print(f"DB Save Error: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi. Iltimos, serverni tekshiring.")
+    except Exception as e:
+        print(f"DB Save Error: {e}")
+        await update.message.reply_text(f"Xato: Testni saqlashda kutilmagan xato yuz berdi: ({e})")
+    await session_store.delete(user_id)
+    session_timers.cancel(user_id)
 
 
 
-async def take_quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Foydalanuvchi /takequiz buyrug'ini beradi."""
-    user_id = update.effective_user.id
-    db: Session = get_db_session(context)
-    
-    if not db: return 
-    
-    available_tests = db.query(Test.name).all()
-    available_tests = [t[0] for t in available_tests]
-    
-    if not available_tests:
-        await update.message.reply_text("Hozirda mavjud testlar yo'q.")
+def _prefix_bytes(prefix):
+    """Qidiruv prefiksini callback_data ga sig'adigan UTF-8 baytlarga qisqartiradi."""
+    raw = prefix.encode()[:MAX_TAIL_SIZE]
+    return raw.decode(errors="ignore").encode()
+
+
+async def render_catalogue(mode, anchor_id=None, backward=False, prefix=""):
+    """Katalog sahifasi uchun (matn, klaviatura) qaytaradi; test bo'lmasa None."""
+    entries, prev_anchor, next_anchor = await run_db(
+        get_catalogue_page, anchor_id, backward, prefix
+    )
+    if not entries:
+        return None
+
+    text = CATALOGUE_TITLES[mode]
+    if prefix:
+        text += f"\n(qidiruv: {prefix})"
+    buttons = []
+    if mode == CATALOGUE_LIST:
+        text += "\n\n" + "\n".join(f"- {e.name} ({e.question_count} ta savol)" for e in entries)
+    else:
+        kind = "t" if mode == CATALOGUE_TAKE else "d"
+        buttons = [
+            [InlineKeyboardButton(f"{e.name} ({e.question_count})", callback_data=encode_callback(kind, e.test_id))]
+            for e in entries
+        ]
+
+    tail = _prefix_bytes(prefix)
+    nav = []
+    if prev_anchor is not None:
+        nav.append(InlineKeyboardButton("◀️", callback_data=encode_callback("p", mode, 1, prev_anchor, tail=tail)))
+    if next_anchor is not None:
+        nav.append(InlineKeyboardButton("▶️", callback_data=encode_callback("p", mode, 0, next_anchor, tail=tail)))
+    if nav:
+        buttons.append(nav)
+    return text, InlineKeyboardMarkup(buttons) if buttons else None
+
+
+async def send_catalogue(update: Update, context: ContextTypes.DEFAULT_TYPE, mode) -> None:
+    """Katalogning birinchi sahifasini yuboradi; buyruq argumenti qidiruv prefiksi bo'ladi."""
+    prefix = _prefix_bytes(" ".join(context.args or [])).decode() if context else ""
+    try:
+        page = await render_catalogue(mode, prefix=prefix)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
         return
 
-    buttons = [[InlineKeyboardButton(name, callback_data=f"take_{name}")] for name in available_tests]
-    keyboard = InlineKeyboardMarkup(buttons)
-    
-    await update.message.reply_text("Qaysi testni olishni xohlaysiz?", reply_markup=keyboard)
+    if page is None:
+        await update.message.reply_text(CATALOGUE_EMPTY[mode])
+        return
+    text, keyboard = page
+    await update.message.reply_text(text, reply_markup=keyboard)
 
 
-async def start_quiz_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Quizni boshlash uchun tanlangan test bo'yicha."""
+async def handle_catalogue_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Katalogda oldingi/keyingi sahifaga o'tish."""
     query = update.callback_query
     await query.answer()
-    user_id = query.from_user.id
-    db: Session = get_db_session(context)
-    
-    if not db: 
+
+    decoded = decode_callback(query.data)
+    if decoded is None or decoded[0] != "p":
+        return
+    mode, direction, anchor_id, *tail = decoded[1]
+    if mode not in CATALOGUE_TITLES:
+        return
+    if mode != CATALOGUE_TAKE and query.from_user.id != ADMIN_ID:
+        return
+    prefix = tail[0].decode(errors="ignore") if tail else ""
+
+    try:
+        page = await render_catalogue(mode, anchor_id, bool(direction), prefix)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
         await query.edit_message_text("DB ulanishida xatolik yuz berdi.")
         return
-    
-    if query.data.startswith("take_"):
-        test_name = query.data.split("take_")[1]
-        
-        questions, test_id = get_test_questions_from_db(db, test_name)
-        
-        if not questions:
-            await query.edit_message_text(f"Test topilmadi: {test_name}")
-            return
-            
-        update_info = query.from_user
-        get_or_create_user(db, user_id, update_info)
-        
-        random.shuffle(questions) 
-        
-        state = user_quiz_state.get(user_id, {})
-        state['step'] = 'in_quiz'
-        state['test_name'] = test_name
-        state['test_id'] = test_id
-        state['questions'] = questions
-        state['current_q_index'] = 0
-        state['correct_answers'] = 0
-        state['incorrect_answers'] = 0
-        user_quiz_state[user_id] = state
-        
-        await present_question(update, context, query, 0)
+
+    if page is None:
+        await query.edit_message_text(CATALOGUE_EMPTY[mode])
+        return
+    text, keyboard = page
+    await query.edit_message_text(text, reply_markup=keyboard)
 
 
-async def present_question(update, context, query, q_index):
-    """Belgilangan indeksdagi savolni foydalanuvchiga ko'rsatadi."""
+async def take_quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Foydalanuvchi /takequiz buyrug'ini beradi."""
+    await send_catalogue(update, context, CATALOGUE_TAKE)
+
+
+question_loads = {}  # test_id -> yuklanayotgan savollar to'plami
+
+
+async def load_question_set(test_id):
+    """Savollar to'plamini oladi; bir test bir vaqtda faqat bir marta DB dan yuklanadi.
+
+    Ishga tushishdagi isitish va birinchi bosish bir testni ustma-ust
+    yuklamasligi uchun yuklanayotgan vazifa kutiladi.
+    """
+    task = question_loads.get(test_id)
+    if task is None:
+        task = question_loads[test_id] = asyncio.ensure_future(run_db(get_question_set_by_id, test_id))
+        task.add_done_callback(lambda _: question_loads.pop(test_id, None))
+    # Kutuvchilardan biri bekor qilinsa, umumiy yuklash to'xtamaydi.
+    return await asyncio.shield(task)
+
+
+async def start_quiz_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, test_id):
+    """Quizni boshlash uchun tanlangan test bo'yicha."""
+    query = update.callback_query
     user_id = query.from_user.id
-    state = user_quiz_state[user_id]
-    
-    current_q_data = state['questions'][q_index]
-    
-    
-    labels = ['A', 'B', 'C', 'D', 'E', 'F']
-    options_pool = [current_q_data['correct_answer']] + current_q_data['options']
-    random.shuffle(options_pool)
-    
-    selected_options = options_pool[:4]
     
-    buttons = []
-    for i, option_text in enumerate(selected_options):
-        label = labels[i]
-        
-        is_correct = (option_text == current_q_data['correct_answer'])
-        callback_data = f"ans_next_{q_index + 1}_{is_correct}"
-        
-        buttons.append(InlineKeyboardButton(f"{label}. {option_text}", callback_data=callback_data))
+    try:
+        qset = await load_question_set(test_id)
         
+        if qset:
+            await run_db(get_or_create_user, user_id, query.from_user)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await query.edit_message_text("DB ulanishida xatolik yuz berdi.")
+        return
     
-    question_text = f"**{q_index + 1}-Savol ({state['test_name']}):**\n{current_q_data['question']}"
+    if not qset or not qset.questions:
+        await query.edit_message_text("Test topilmadi.")
+        return
     
-    keyboard = InlineKeyboardMarkup([[btn] for btn in buttons])
+    state = QuizSession(qset.test_id, qset.name, qset.questions)
+    if query.message:
+        state.chat_id, state.message_id = query.message.chat.id, query.message.message_id
+    question_text, keyboard = build_question(state)
+    await session_store.put(user_id, state)
+    schedule_session(user_id, state)
+    question_stats.shown(state.test_id, state.current_question())
     
+    await present_question(update, query, question_text, keyboard)
+
+
+def session_deadline(state):
+    """Sessiya tugashi kerak bo'lgan vaqt (time.time()); cheklov bo'lmasa None.
+
+    Quizda oxirgi faollik - joriy savol ko'rsatilgan vaqt; admin sessiyalari
+    uchun hisob hozirdan boshlanadi.
+    """
+    if not isinstance(state, QuizSession):
+        return time.time() + SESSION_IDLE_TIMEOUT if SESSION_IDLE_TIMEOUT else None
+    deadlines = []
+    if SESSION_IDLE_TIMEOUT:
+        deadlines.append(state.asked_at + SESSION_IDLE_TIMEOUT)
+    if QUESTION_TIME_LIMIT:
+        deadlines.append(state.asked_at + QUESTION_TIME_LIMIT)
+    if QUIZ_TIME_LIMIT:
+        deadlines.append(state.started_at + QUIZ_TIME_LIMIT)
+    return min(deadlines) if deadlines else None
+
+
+def schedule_session(user_id, state):
+    """Sessiya taymerini yangilaydi (state=None - admin sessiyasi)."""
+    deadline = session_deadline(state)
+    if deadline is None:
+        session_timers.cancel(user_id)
+    else:
+        session_timers.schedule(user_id, deadline)
+
+
+async def rearm_sessions():
+    """Qayta ishga tushgandan keyin saqlangan sessiyalar taymerlarini tiklaydi.
+
+    Muddati o'tib bo'lganlari keyingi tick'da expire_session orqali yakunlanadi.
+    """
+    count = 0
+    async for user_id, state in session_store.items():
+        schedule_session(user_id, state)
+        count += 1
+    if count:
+        print(f"Sessiya taymerlari tiklandi: {count} ta")
+
+
+async def expire_session(bot, user_id):
+    """Muddati o'tgan sessiyani yakunlaydi.
+
+    Savol vaqti tugasa javob noto'g'ri hisoblanib keyingi savolga o'tiladi;
+    quiz vaqti yoki faolsizlik muddati tugasa quiz joriy natija bilan yakunlanadi.
+    """
+    state, version = await session_store.get(user_id)
+    if state is None:
+        return
+    if not isinstance(state, QuizSession):
+        await session_store.delete(user_id, version)
+        return
+
+    now = time.time()
+    deadline = session_deadline(state)
+    if deadline is None:
+        return
+    if now < deadline:
+        # Sessiya boshqa joyda yangilangan (masalan, boshqa worker'da).
+        session_timers.schedule(user_id, deadline)
+        return
+
+    question_expired = QUESTION_TIME_LIMIT and now >= state.asked_at + QUESTION_TIME_LIMIT
+    quiz_expired = (
+        (QUIZ_TIME_LIMIT and now >= state.started_at + QUIZ_TIME_LIMIT)
+        or (SESSION_IDLE_TIMEOUT and now >= state.asked_at + SESSION_IDLE_TIMEOUT)
+    )
+    if question_expired:
+        state.incorrect += 1
+
+    try:
+        if question_expired and not quiz_expired and state.index + 1 < len(state):
+            state.index += 1
+            state.asked_at = now
+            question_text, keyboard = build_question(state)
+            if not await session_store.save(user_id, state, version):
+                return
+            schedule_session(user_id, state)
+            question_stats.shown(state.test_id, state.current_question())
+            if state.message_id is not None:
+                await bot.edit_message_text(
+                    "⏰ Vaqt tugadi.\n\n" + question_text, chat_id=state.chat_id, message_id=state.message_id,
+                    reply_markup=keyboard, parse_mode='Markdown', rate_limit_args=PRIORITY_ANSWER,
+                )
+        else:
+            if not await session_store.delete(user_id, version):
+                return
+            await finalize_quiz(bot, user_id, state, "⏰ **Vaqt tugadi.**")
+    except TelegramError as e:
+        print(f"Telegram xatosi (taymer): {e}")
+
+
+@functools.lru_cache(maxsize=4096)
+def render_question_text(position, test_name, question):
+    """Savol matni; bir xil (pozitsiya, test, savol) uchun qayta ishlatiladi."""
+    limit = f" ⏱ {QUESTION_TIME_LIMIT:g} s" if QUESTION_TIME_LIMIT else ""
+    return f"**{position + 1}-Savol ({test_name}):**{limit}\n{question}"
+
+
+def render_answer_keyboard(nonce, position, labels):
+    """Javob tugmalari. callback_data sessiya nonce'i bilan imzolangani uchun keshlanmaydi."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=encode_callback("a", nonce, position, slot))]
+        for slot, label in enumerate(labels)
+    ])
+
+
+def build_question(state):
+    """Sessiyaning joriy savoli uchun matn va tugmalarni tayyorlaydi.
+
+    To'g'ri variantning sloti faqat sessiyada saqlanadi; tugmalarda
+    faqat imzolangan (nonce, pozitsiya, slot) bo'ladi.
+    """
+    labels = state.arrangement()[0]
+    question_text = render_question_text(state.index, state.test_name, state.current_question().question)
+    return question_text, render_answer_keyboard(state.nonce, state.index, labels)
+
+
+async def present_question(update, query, question_text, keyboard):
+    """Tayyorlangan savolni foydalanuvchiga ko'rsatadi."""
     if query.message:
-        await query.edit_message_text(question_text, reply_markup=keyboard, parse_mode='Markdown')
+        await query.edit_message_text(
+            question_text, reply_markup=keyboard, parse_mode='Markdown', rate_limit_args=PRIORITY_ANSWER
+        )
     else:
-        await update.message.reply_text(question_text, reply_markup=keyboard, parse_mode='Markdown')
+        await update.message.reply_text(
+            question_text, reply_markup=keyboard, parse_mode='Markdown', rate_limit_args=PRIORITY_ANSWER
+        )
 
 
 async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -177,57 +454,94 @@ async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    db: Session = get_db_session(context)
-    
-    if query.data.startswith("take_"):
-        await start_quiz_selection(update, context)
-        return
 
     if query.data == "show_leaderboard":
         await show_leaderboard(update, context)
         return
 
-    state = user_quiz_state.get(user_id)
+    decoded = decode_callback(query.data)
+    if decoded is None:
+        return
+    kind, fields = decoded
     
-    if state and state['step'] == 'in_quiz' and query.data.startswith("ans_next_"):
-        try:
-            parts = query.data.split('_')
-            next_q_index = int(parts[2])
-            is_correct = parts[3] == 'True' 
+    if kind == "t":
+        await start_quiz_selection(update, context, fields[0])
+        return
 
-            current_q_index = state['current_q_index']
-            
+    if kind != "a":
+        return
 
-            if is_correct:
-                state['correct_answers'] += 1
-                result_text = "✅ **To'g'ri javob!**"
-            else:
-                state['incorrect_answers'] += 1
-                result_text = "❌ **Noto'g'ri.**"
-            
-            
-            if next_q_index < len(state['questions']):
-                state['current_q_index'] = next_q_index
-                await present_question(update, context, query, next_q_index)
-                
-            else:
-                await finalize_quiz(update, context, query, state, result_text, db)
+    nonce, position, slot = fields
+    state, version = await session_store.get(user_id)
+    
+    # Eski xabardagi yoki qayta yuborilgan bosishlar hisobga olinmaydi.
+    if not isinstance(state, QuizSession) or state.nonce != nonce or state.index != position:
+        return
+    deadline = session_deadline(state)
+    if deadline is not None and deadline <= time.time():
+        # Taymer hali ishlamagan (masalan, bot qayta ishga tushgan): kech javob qabul qilinmaydi.
+        await expire_session(query.get_bot(), user_id)
+        return
+
+    try:
+        _, correct_slot, choices = state.arrangement()
+        answered_question = state.current_question()
+        if slot == correct_slot:
+            state.correct += 1
+            result_text = "✅ **To'g'ri javob!**"
+        else:
+            state.incorrect += 1
+            result_text = "❌ **Noto'g'ri.**"
         
-        except Exception as e:
-            print(f"Quiz xatosi: {e}")
-            await query.edit_message_text("Quizda kutilmagan xatolik yuz berdi. Iltimos, /takequiz orqali qayta urinib ko'ring.")
-            if user_id in user_quiz_state:
-                del user_quiz_state[user_id]
-
-async def finalize_quiz(update, context, query, state, last_result_text, db: Session):
-    """Quiz tugaganidan keyin natijani ko'rsatadi va DB ga saqlaydi."""
-    user_id = query.from_user.id
+        
+        if position + 1 < len(state):
+            state.index = position + 1
+            state.asked_at = time.time()
+            question_text, keyboard = build_question(state)
+            if not await session_store.save(user_id, state, version):
+                return
+            record_answer(state, answered_question, choices, slot, correct_slot)
+            schedule_session(user_id, state)
+            question_stats.shown(state.test_id, state.current_question())
+            await present_question(update, query, question_text, keyboard)
+            
+        else:
+            if not await session_store.delete(user_id, version):
+                return
+            record_answer(state, answered_question, choices, slot, correct_slot)
+            session_timers.cancel(user_id)
+            await finalize_quiz(query.get_bot(), user_id, state, result_text)
     
-    total_correct = state['correct_answers']
-    total_incorrect = state['incorrect_answers']
-    total_score = total_correct + total_incorrect
+    except TelegramError as e:
+        # Sessiya allaqachon saqlangan; xabar yuborilmagani uchun uni o'chirish shart emas.
+        print(f"Telegram xatosi (quiz): {e}")
+    except Exception as e:
+        print(f"Quiz xatosi: {e}")
+        await query.edit_message_text("Quizda kutilmagan xatolik yuz berdi. Iltimos, /takequiz orqali qayta urinib ko'ring.")
+        await session_store.delete(user_id)
+        session_timers.cancel(user_id)
+
+def record_answer(state, question, choices, slot, correct_slot):
+    """Javobni savol statistikasiga qo'shadi; faqat sessiya yozilgandan keyin chaqiriladi
+    (versiya to'qnashuvida yutqazgan bosish hisoblanmaydi)."""
+    if slot < len(choices):
+        question_stats.answered(state.test_id, question, choices[slot], slot == correct_slot)
+
+async def finalize_quiz(bot, user_id, state, last_result_text):
+    """Quiz tugaganidan keyin natijani ko'rsatadi va DB ga saqlaydi.
+
+    Sessiyadagi xabar tahrirlanadi, shuning uchun taymer ham chaqira oladi.
+    """
+    total_correct = state.correct
+    total_incorrect = state.incorrect
+    total_score = state.answered
     
-    save_quiz_result(db, user_id, state['test_id'], total_correct, total_score)
+    # Birorta ham javobsiz (taymer bilan tugagan) quiz natija sifatida saqlanmaydi.
+    if total_score and result_writer:
+        await result_writer.submit(user_id, state.test_id, total_correct, total_score)
+    elif total_score:
+        await run_db(save_quiz_result, user_id, state.test_id, total_correct, total_score)
+        test_board_cache.invalidate(state.test_id)
 
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("📊 Reytingni Ko'rish", callback_data="show_leaderboard")]
@@ -236,14 +550,17 @@ async def finalize_quiz(update, context, query, state, last_result_text, db: Ses
     final_message = (
         f"🎉 **Quiz yakunlandi!**\n\n"
         f"{last_result_text}\n\n"
-        f"Jami natijalar ({state['test_name']}):\n"
+        f"Jami natijalar ({state.test_name}):\n"
         f"🔹 To'g'ri javoblar: **{total_correct}**\n"
         f"🔸 Noto'g'ri javoblar: **{total_incorrect}**\n"
         f"💯 Umumiy ishlangan savol: **{total_score}**"
     )
     
-    await query.edit_message_text(final_message, reply_markup=keyboard, parse_mode='Markdown')
-    del user_quiz_state[user_id] 
+    if state.message_id is not None:
+        await bot.edit_message_text(
+            final_message, chat_id=state.chat_id, message_id=state.message_id,
+            reply_markup=keyboard, parse_mode='Markdown', rate_limit_args=PRIORITY_ANSWER,
+        )
 
 
 
@@ -252,69 +569,151 @@ async def list_tests_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if update.effective_user.id != ADMIN_ID:
         await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
         return
-        
-    db: Session = get_db_session(context)
-    if not db:
-        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
-        return
 
-    test_names = db.query(Test.name).all() 
-    test_names = [t[0] for t in test_names]
-
-    if not test_names:
-        await update.message.reply_text("Hozirda saqlangan testlar mavjud emas.")
-        return
-        
-    message = "Saqlangan testlar ro'yxati:\n\n"
-    for name in test_names:
-        message += f"- **{name}**\n"
-        
-    await update.message.reply_text(message, parse_mode='Markdown')
+    await send_catalogue(update, context, CATALOGUE_LIST)
 
 async def delete_test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if update.effective_user.id != ADMIN_ID:
         await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
         return
 
-    db: Session = get_db_session(context)
-    tests = db.query(Test.name).all()
-
-    if not tests:
-        await update.message.reply_text("Hech qanday test mavjud emas.")
-        return
-
-    buttons = [
-        [InlineKeyboardButton(name[0], callback_data=f"delete::{name[0]}")]
-        for name in tests
-    ]
-
-    keyboard = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("Qaysi testni o‘chirmoqchisiz?", reply_markup=keyboard)
+    await send_catalogue(update, context, CATALOGUE_DELETE)
 
 async def handle_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Admin test o‘chirishni tasdiqlaganda ishlaydi."""
     query = update.callback_query
     await query.answer()
 
-    if not query.data.startswith("delete::"):
+    decoded = decode_callback(query.data)
+    if decoded is None or decoded[0] != "d" or query.from_user.id != ADMIN_ID:
         return
-    test_name = query.data.split("delete::")[1]
+    test_id = decoded[1][0]
 
-    db: Session = get_db_session(context)
-    if not db:
+    try:
+        test_name = await run_db(delete_test_by_id, test_id)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
         await query.edit_message_text("DB ulanishida xatolik yuz berdi.")
         return
+    test_board_cache.invalidate(test_id)
+    leaderboard_cache.invalidate()
+    question_stats.discard_test(test_id)
 
-    from db_manager import delete_test_by_name
-    success = delete_test_by_name(db, test_name)
-
-    if success:
+    if test_name:
         await query.edit_message_text(
             f"🗑 Test **{test_name}** muvaffaqiyatli o‘chirildi.",
             parse_mode='Markdown'
         )
     else:
-        await query.edit_message_text(f"⚠️ Test topilmadi: {test_name}")
+        await query.edit_message_text("⚠️ Test topilmadi.")
+
+
+async def difficulty_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin uchun test savollarining qiyinligi: /difficulty <test nomi>."""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
+        return
+
+    test_name = " ".join(context.args or []).strip()
+    if not test_name:
+        await update.message.reply_text("Foydalanish: /difficulty <test nomi>")
+        return
+
+    try:
+        await question_stats.flush()
+        report = await run_db(get_question_difficulty, test_name)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    if report is None:
+        await update.message.reply_text("Test topilmadi.")
+        return
+    if not report:
+        await update.message.reply_text(f"'{test_name}' bo'yicha hali javoblar yo'q.")
+        return
+
+    message = f"📊 {test_name}: eng qiyin savollar\n(ko'rsatildi / javob / to'g'ri %)\n"
+    for i, row in enumerate(report, 1):
+        question = row['question'] if len(row['question']) <= 60 else row['question'][:57] + "..."
+        message += f"\n{i}. {question}\n   👁 {row['shown']} · ✍️ {row['answered']} · ✅ {row['correct'] * 100 // row['answered']}%"
+        if row['top_wrong'] is not None:
+            # Noto'g'ri variant to'g'ri javobdan ko'p tanlansa, savol noaniq bo'lishi mumkin.
+            flag = " ⚠️" if row['top_wrong_count'] >= row['correct'] else ""
+            message += f"\n   ko'p tanlangan xato: {row['top_wrong']} ({row['top_wrong_count']}){flag}"
+    await update.message.reply_text(message[:4096])
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin uchun: /broadcast <matn> - hammaga yuborish, /broadcast - holat, /broadcast stop - to'xtatish."""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
+        return
+
+    # Qator ko'chishlari saqlanishi uchun matn context.args dan emas, xabarning o'zidan olinadi.
+    parts = (update.message.text or "").split(maxsplit=1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+    try:
+        if not text:
+            broadcast = await run_db(get_latest_broadcast)
+            if broadcast is None:
+                await update.message.reply_text("Foydalanish: /broadcast <matn>")
+                return
+            broadcast = broadcasts.progress(broadcast['id']) or broadcast
+            await update.message.reply_text(format_broadcast(broadcast))
+            return
+        if text == "stop":
+            broadcast_id = await run_db(cancel_broadcast)
+            reply = f"Yuborish #{broadcast_id} to'xtatildi." if broadcast_id else "Ishlayotgan yuborish yo'q."
+            await update.message.reply_text(reply)
+            return
+        broadcast = await run_db(create_broadcast, text, update.effective_chat.id, broadcasts.owner, broadcasts.lease_until())
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    if broadcast is None:
+        await update.message.reply_text("Boshqa yuborish hali tugamagan. Holat: /broadcast, to'xtatish: /broadcast stop")
+        return
+    broadcasts.start(context.bot, broadcast)
+    await update.message.reply_text(f"📣 Yuborish #{broadcast['id']} boshlandi. Tugaganda natija shu yerga yuboriladi.")
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin uchun handler'lar, DB pool, kesh va sessiyalar statistikasini ko'rsatadi."""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("Bu buyruq faqat adminlarga ruxsat etilgan.")
+        return
+
+    await update.message.reply_text(await metrics.summary())
+
+
+def _numeric(stats):
+    return {key: value for key, value in stats.items() if isinstance(value, (int, float))}
+
+
+def register_metrics():
+    """Gauge'larni ro'yxatdan o'tkazadi va SQL so'rovlarini kuzatishni yoqadi."""
+    metrics.instrument_engine(get_engine())
+    metrics.register_gauge("bot_active_sessions", "Faol quiz va admin sessiyalari.", session_store.count)
+    metrics.register_gauge("bot_question_cache", "Savollar keshi statistikasi.", question_cache.stats)
+    metrics.register_gauge(
+        "bot_leaderboard_cache", "Reyting keshi hit/miss.",
+        lambda: {"hits": leaderboard_cache.hits, "misses": leaderboard_cache.misses},
+    )
+    metrics.register_gauge("bot_db_pool", "DB pool holati.", lambda: _numeric(get_pool_status()))
+    if result_writer:
+        metrics.register_gauge("bot_result_queue", "Natijalar navbati.", result_writer.stats)
+    metrics.register_gauge("bot_outbound", "Chiquvchi Bot API so'rovlari.", outbound.stats)
+    metrics.register_gauge("bot_question_stats", "Savol statistikasi buferi.", question_stats.stats)
+    metrics.register_gauge("bot_session_timers", "Faol sessiya taymerlari.", lambda: len(session_timers))
+    metrics.register_gauge(
+        "bot_test_board_cache", "Test reytingi keshi hit/miss.",
+        lambda: {"hits": test_board_cache.hits, "misses": test_board_cache.misses},
+    )
+    metrics.register_gauge("bot_broadcasts", "Ommaviy yuborishlar.", broadcasts.stats)
 
 
 def format_leaderboard_message(title, data, is_global=False):
@@ -332,83 +731,307 @@ def format_leaderboard_message(title, data, is_global=False):
             
     return message
 
+async def show_monthly_leaderboard(update: Update, month_key):
+    """/leaderboard YYYY-MM: o'tgan oy reytingi (monthly_scores dan, arxivlangan oylar uchun ham)."""
+    try:
+        message = leaderboard_cache.get(f"month:{month_key}")
+        if message is None:
+            monthly_lb = await run_db(get_monthly_leaderboard, month_key)
+            if not monthly_lb:
+                await update.message.reply_text(f"{month_key} oyi uchun natijalar topilmadi.")
+                return
+            message = format_leaderboard_message(f"Oylik Reyting ({month_key})", monthly_lb, is_global=False)
+            leaderboard_cache.set(f"month:{month_key}", message)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    await update.message.reply_html(message, rate_limit_args=PRIORITY_BULK)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+async def render_test_board(test_id, after=None, rank=0):
+    """Test reytingi sahifasi uchun (matn, klaviatura); birinchi sahifa keshlanadi."""
+    page = test_board_cache.get(test_id) if after is None else None
+    if page is None:
+        page = await run_db(get_test_board, test_id, after)
+        if after is None:
+            test_board_cache.set(test_id, page)
+    entries, cursor = page
+    test_name = await run_db(get_test_name, test_id) or "?"
+
+    if not entries:
+        return f"'{html.escape(test_name)}' bo'yicha hali natijalar yo'q.", None
+    text = f"🏆 <b>{html.escape(test_name)}</b>: eng yaxshi natijalar\n\n"
+    for i, item in enumerate(entries, rank + 1):
+        text += (
+            f"{i}. <a href='tg://user?id={item['id']}'>{html.escape(item['username'])}</a>: "
+            f"<b>{item['score']}</b>/{item['total']}\n"
+        )
+    keyboard = None
+    if cursor is not None:
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+            "▶️", callback_data=encode_callback("l", test_id, cursor[0], cursor[1], rank + len(entries))
+        )]])
+    return text, keyboard
+
+
+async def render_user_results(user_id, after=None):
+    """/myresults sahifasi uchun (matn, klaviatura); natija bo'lmasa None."""
+    entries, cursor = await run_db(get_user_results, user_id, after)
+    if not entries:
+        return None
+    text = "📋 <b>Sizning natijalaringiz</b>\n\n"
+    for item in entries:
+        taken = item['date_taken'].strftime("%Y-%m-%d %H:%M") if item['date_taken'] else "-"
+        text += f"{taken} · {html.escape(item['test_name'])}: <b>{item['score']}</b>/{item['total']}\n"
+    keyboard = None
+    if cursor is not None:
+        micros = (cursor[0] - EPOCH) // datetime.timedelta(microseconds=1)
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+            "▶️", callback_data=encode_callback("h", micros, cursor[1])
+        )]])
+    return text, keyboard
+
+
+async def show_test_leaderboard(update: Update, test_name):
+    """/leaderboard <test nomi>: test bo'yicha reyting."""
+    try:
+        test = await run_db(get_test_id_by_name, test_name)
+        page = await render_test_board(test[0]) if test else None
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    if page is None:
+        await update.message.reply_text("Test topilmadi.")
+        return
+    text, keyboard = page
+    await update.message.reply_html(text, reply_markup=keyboard, rate_limit_args=PRIORITY_BULK)
+
+
+async def my_results_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/myresults: foydalanuvchining oxirgi urinishlari."""
+    try:
+        page = await render_user_results(update.effective_user.id)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await update.message.reply_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    if page is None:
+        await update.message.reply_text("Siz hali birorta ham quiz ishlamagansiz. /takequiz")
+        return
+    text, keyboard = page
+    await update.message.reply_html(text, reply_markup=keyboard, rate_limit_args=PRIORITY_BULK)
+
+
+async def handle_results_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Test reytingi va /myresults da keyingi sahifaga o'tish."""
+    query = update.callback_query
+    await query.answer()
+
+    decoded = decode_callback(query.data)
+    if decoded is None:
+        return
+    kind, fields = decoded
+    try:
+        if kind == "l":
+            test_id, score, result_id, rank = fields
+            page = await render_test_board(test_id, (score, result_id), rank)
+        elif kind == "h":
+            micros, result_id = fields
+            taken = EPOCH + datetime.timedelta(microseconds=micros)
+            # Tugma kimniki bo'lishidan qat'i nazar, bosgan foydalanuvchining o'z natijalari ko'rsatiladi.
+            page = await render_user_results(query.from_user.id, (taken, result_id))
+        else:
+            return
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        await query.edit_message_text("DB ulanishida xatolik yuz berdi.")
+        return
+
+    if page is None:
+        return
+    text, keyboard = page
+    await query.edit_message_text(text, reply_markup=keyboard, parse_mode='HTML', rate_limit_args=PRIORITY_BULK)
+
+
 async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Reytingni ko'rsatadi."""
     query = update.callback_query if update.callback_query else None
+    user_id = update.effective_user.id
     
     if query:
         await query.answer()
+    elif context.args and MONTH_RE.match(context.args[0]):
+        await show_monthly_leaderboard(update, context.args[0])
+        return
+    elif context.args:
+        await show_test_leaderboard(update, " ".join(context.args))
+        return
         
-    db: Session = get_db_session(context)
-    
-    if not db:
-        target = query or update.message
+    try:
+        full_message = leaderboard_cache.get("main")
+        if full_message is None:
+            global_lb, monthly_lb = await run_db(get_leaderboards)
+            global_msg = format_leaderboard_message("Global Reyting (Umumiy To'g'ri Javob)", global_lb, is_global=True)
+            monthly_msg = format_leaderboard_message("Oylik Reyting (Joriy Oy)", monthly_lb, is_global=False)
+            full_message = global_msg + "\n" + "-"*30 + "\n" + monthly_msg
+            leaderboard_cache.set("main", full_message)
+
+        global_rank, monthly_rank = await run_db(get_user_rank, user_id)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
+        target = query.message if query else update.message
         await target.reply_text("DB ulanishida xatolik yuz berdi.")
         return
-        
-    global_lb, monthly_lb = get_leaderboards(db)
     
-    global_msg = format_leaderboard_message("Global Reyting (Umumiy To'g'ri Javob)", global_lb, is_global=True)
-    monthly_msg = format_leaderboard_message("Oylik Reyting (Joriy Oy)", monthly_lb, is_global=False)
-    
-    full_message = global_msg + "\n" + "-"*30 + "\n" + monthly_msg
+    if global_rank or monthly_rank:
+        full_message += "\n" + "-"*30 + "\n"
+        full_message += f"Sizning o'rningiz: global #{global_rank or '-'}, oylik #{monthly_rank or '-'}\n"
     
     if query:
-        await query.edit_message_text(full_message, parse_mode='HTML')
+        await query.edit_message_text(full_message, parse_mode='HTML', rate_limit_args=PRIORITY_BULK)
     else:
-     
-        await update.message.reply_html(full_message)
+        await update.message.reply_html(full_message, rate_limit_args=PRIORITY_BULK)
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """/start buyrug'iga javob beradi va DB da foydalanuvchini yaratadi."""
     user_id = update.effective_user.id
-    db: Session = get_db_session(context)
     
-    if not db:
+    try:
+        await run_db(get_or_create_user, user_id, update.effective_user)
+    except SQLAlchemyError as e:
+        print(f"DB xatosi: {e}")
         await update.message.reply_text("Bot serveri va DB ulanishida muammo bor.")
         return
     
-    update_info = update.effective_user
-    get_or_create_user(db, user_id, update_info)
-    
     response = (
         "Assalomu alaykum! Men quiz generator botman.\n\n"
         "**Adminlar uchun (ID: {ADMIN_ID}):**\n"
         "/addtest - Yangi test matnini yuboring.\n"
         "/delete -Mavjud testlarni o'chiradi.\n"
-        "/listtests - Mavjud testlarni ko'rish.\n\n"
+        "/listtests - Mavjud testlarni ko'rish.\n"
+        "/stats - Bot statistikasi.\n"
+        "/broadcast - Barcha foydalanuvchilarga xabar.\n\n"
         "**Foydalanuvchilar uchun:**\n"
         "/takequiz - Quiz olish.\n"
-        "/leaderboard - Reytingni ko'rish."
+        "/leaderboard - Reytingni ko'rish.\n"
+        "/leaderboard YYYY-MM - O'tgan oy reytingi.\n"
+        "/leaderboard <test nomi> - Test bo'yicha reyting.\n"
+        "/myresults - Mening natijalarim."
     ).format(ADMIN_ID=ADMIN_ID)
     
     await update.message.reply_text(response)
 
 
+async def warm_up(limit=WARMUP_TESTS):
+    """Eng ko'p ishlangan testlarni va katalogni fon rejimida keshga yuklaydi.
+
+    Har bir test alohida run_db chaqiruvida yuklanadi, shuning uchun shu
+    vaqtda kelgan update'lar DB thread'larini navbat kutmaydi.
+    """
+    started = time.perf_counter()
+    loaded = 0
+    try:
+        await run_db(get_catalogue_page)
+        for test_id in await run_db(get_popular_test_ids, limit):
+            if await load_question_set(test_id) is not None:
+                loaded += 1
+    except SQLAlchemyError as e:
+        print(f"Keshni isitishda DB xatosi: {e}")
+    print(f"Kesh isitildi: {loaded} ta test, {time.perf_counter() - started:.2f}s")
+
+
+async def on_startup(application: Application) -> None:
+    """Fon vazifalarini ishga tushiradi."""
+    if result_writer:
+        await result_writer.start()
+    if METRICS_PORT:
+        await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT)
+    session_timers.start(lambda user_id: expire_session(application.bot, user_id))
+    await rearm_sessions()
+    await question_stats.start()
+    await broadcasts.resume(application.bot)
+    application.bot_data["broadcast_task"] = asyncio.create_task(broadcasts.watch(application.bot))
+    if RETENTION_INTERVAL:
+        application.bot_data["retention_task"] = asyncio.create_task(retention_loop())
+    else:
+        # Arxivlash cron orqali bo'lsa ham yangi oy natijalari o'z partitsiyasiga tushishi kerak.
+        application.bot_data["partition_task"] = asyncio.create_task(partition_loop())
+    if WARMUP_TESTS:
+        # Polling/webhook ishga tushayotganda parallel bajariladi.
+        application.bot_data["warmup_task"] = asyncio.create_task(warm_up())
+
+
+async def on_shutdown(application: Application) -> None:
+    """Fon vazifalarini to'xtatadi va navbatdagi natijalarni yozadi."""
+    await session_timers.stop()
+    for name in ("broadcast_task", "retention_task", "partition_task", "warmup_task"):
+        task = application.bot_data.pop(name, None)
+        if task:
+            task.cancel()
+    await broadcasts.stop()
+    await question_stats.stop()
+    if result_writer:
+        await result_writer.stop()
+
+
 def main() -> None:
     """Botni ishga tushiradi."""
 
     init_db()
+    register_metrics()
+
 
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .rate_limiter(outbound)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    application = builder.build()
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    instrument = metrics.instrument
 
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("delete", delete_test_command))
-    application.add_handler(CommandHandler("addtest", add_test_command)) 
-    application.add_handler(CallbackQueryHandler(handle_delete_callback, pattern="^delete::"))
-    application.add_handler(CommandHandler("listtests", list_tests_command))
-    application.add_handler(CommandHandler("takequiz", take_quiz_command))
-    application.add_handler(CommandHandler("leaderboard", show_leaderboard))
+    application.add_handler(CommandHandler("start", instrument(start_command)))
+    application.add_handler(CommandHandler("delete", instrument(delete_test_command)))
+    application.add_handler(CommandHandler("addtest", instrument(add_test_command))) 
+    application.add_handler(CallbackQueryHandler(instrument(handle_delete_callback), pattern="^d:"))
+    application.add_handler(CallbackQueryHandler(instrument(handle_catalogue_page), pattern="^p:"))
+    application.add_handler(CallbackQueryHandler(instrument(handle_results_page), pattern="^[lh]:"))
+    application.add_handler(CommandHandler("listtests", instrument(list_tests_command)))
+    application.add_handler(CommandHandler("takequiz", instrument(take_quiz_command)))
+    application.add_handler(CommandHandler("leaderboard", instrument(show_leaderboard)))
+    application.add_handler(CommandHandler("myresults", instrument(my_results_command)))
+    application.add_handler(CommandHandler("stats", instrument(stats_command)))
+    application.add_handler(CommandHandler("difficulty", instrument(difficulty_command)))
+    application.add_handler(CommandHandler("broadcast", instrument(broadcast_command)))
 
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.User(user_id=ADMIN_ID), handle_admin_message))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.User(user_id=ADMIN_ID), instrument(handle_admin_message)))
+    application.add_handler(MessageHandler(
+        (filters.Document.FileExtension("txt") | filters.Document.FileExtension("md")) & filters.User(user_id=ADMIN_ID),
+        instrument(handle_admin_document),
+    ))
     
-    application.add_handler(CallbackQueryHandler(handle_quiz_callback))
+    application.add_handler(CallbackQueryHandler(instrument(handle_quiz_callback)))
 
 
 
     print("Bot ishga tushirildi va DB sozlandi...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook
+        asyncio.run(run_webhook(application, ALLOWED_UPDATES, on_startup, on_shutdown))
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
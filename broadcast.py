@@ -0,0 +1,201 @@
+"""Barcha foydalanuvchilarga ommaviy xabar yuborish (/broadcast).
+
+Foydalanuvchi id lari users jadvalidan keyset sahifalar bilan o'qiladi
+(har bir to'plam alohida qisqa so'rov), to'plam bir nechta worker bilan
+PRIORITY_BULK ustuvorligida chiquvchi rejalashtiruvchi orqali yuboriladi,
+shuning uchun umumiy ~30 xabar/s limiti saqlanadi va quiz javoblari
+navbatda oldinda turadi. Har bir to'plamdan keyin nazorat nuqtasi yoziladi:
+bot qayta ishga tushsa, yuborish oxirgi yozilgan to'plamdan davom etadi
+(to'xtagan to'plam qayta yuborilishi mumkin).
+
+Bir nechta worker bo'lsa, ishni faqat uni ijaraga olgan (owner, lease_until)
+worker yuboradi; ijara har bir nazorat nuqtasida uzaytiriladi. Worker
+to'xtasa, ijara tugagach ishni boshqa worker davom ettiradi.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from telegram.error import Forbidden, TelegramError
+
+import config
+from db_manager import (
+    run_db, get_running_broadcasts, get_user_ids_after, save_broadcast_progress, claim_broadcast,
+    release_broadcast, get_broadcast,
+)
+from outbound import PRIORITY_BULK, PRIORITY_DEFAULT
+
+BROADCAST_WORKERS = getattr(config, "BROADCAST_WORKERS", 8)
+BROADCAST_BATCH_SIZE = getattr(config, "BROADCAST_BATCH_SIZE", 100)  # ~30 xabar/s da ~3 s
+BROADCAST_LEASE = getattr(config, "BROADCAST_LEASE", 120)  # sekund; bitta to'plamdan ancha uzun bo'lishi kerak
+
+DELIVERED, BLOCKED, FAILED = "delivered", "blocked", "failed"
+
+
+def format_broadcast(broadcast):
+    return (
+        f"📣 Yuborish #{broadcast['id']} ({broadcast['status']}): "
+        f"yetkazildi {broadcast['delivered']}, bloklagan {broadcast['blocked']}, xato {broadcast['failed']}"
+    )
+
+
+class BroadcastJob:
+    """Bitta yuborish ishini nazorat nuqtasidan boshlab oxirigacha bajaradi."""
+
+    def __init__(self, bot, broadcast, workers=BROADCAST_WORKERS, batch_size=BROADCAST_BATCH_SIZE,
+                 owner=None, lease=BROADCAST_LEASE):
+        self.bot = bot
+        self.broadcast = dict(broadcast)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.owner = owner
+        self.lease = lease
+
+    def _lease_until(self):
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    async def run(self):
+        broadcast = self.broadcast
+        while True:
+            user_ids = await run_db(get_user_ids_after, broadcast['last_user_id'], self.batch_size)
+            if not user_ids:
+                if await run_db(
+                    save_broadcast_progress, broadcast['id'], broadcast['last_user_id'], 0, 0, 0, "done",
+                    self.owner, self._lease_until(),
+                ):
+                    broadcast['status'] = "done"
+                    await self._notify_admin()
+                return
+
+            counts = await self._send_batch(user_ids)
+            running = await run_db(
+                save_broadcast_progress, broadcast['id'], user_ids[-1],
+                counts[DELIVERED], counts[BLOCKED], counts[FAILED], None, self.owner, self._lease_until(),
+            )
+            broadcast['last_user_id'] = user_ids[-1]
+            for key, value in counts.items():
+                broadcast[key] += value
+            if not running:
+                current = await run_db(get_broadcast, broadcast['id'])
+                if current is None or current['status'] != "running":
+                    broadcast['status'] = "cancelled"
+                    await self._notify_admin()
+                else:
+                    print(f"Yuborish #{broadcast['id']} ijarasini boshqa worker oldi.")
+                return
+
+    async def _send_batch(self, user_ids):
+        counts = {DELIVERED: 0, BLOCKED: 0, FAILED: 0}
+        pending = iter(user_ids)
+
+        async def worker():
+            for user_id in pending:
+                counts[await self._send(user_id)] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(user_ids)))))
+        return counts
+
+    async def _send(self, user_id):
+        try:
+            await self.bot.send_message(chat_id=user_id, text=self.broadcast['text'], rate_limit_args=PRIORITY_BULK)
+        except Forbidden:
+            # Botni bloklagan yoki o'chirilgan akkaunt.
+            return BLOCKED
+        except TelegramError as e:
+            print(f"Yuborishda xatolik ({user_id}): {e}")
+            return FAILED
+        return DELIVERED
+
+    async def _notify_admin(self):
+        if self.broadcast['admin_chat_id'] is None:
+            return
+        try:
+            await self.bot.send_message(
+                chat_id=self.broadcast['admin_chat_id'], text=format_broadcast(self.broadcast),
+                rate_limit_args=PRIORITY_DEFAULT,
+            )
+        except TelegramError as e:
+            print(f"Admin xabarida xatolik: {e}")
+
+
+class BroadcastManager:
+    """Ishlayotgan yuborish vazifalari: ishga tushirish, qayta tiklash va to'xtatish."""
+
+    def __init__(self, workers=BROADCAST_WORKERS, batch_size=BROADCAST_BATCH_SIZE, lease=BROADCAST_LEASE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = lease
+        # Jarayon qayta ishga tushsa ham boshqa egaga aylanadi: eski ijara tugashini kutadi.
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._jobs = {}  # broadcast id -> (job, task)
+
+    def lease_until(self):
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    def start(self, bot, broadcast):
+        """Bu worker ijarasidagi (yoki egasiz) ishni ishga tushiradi."""
+        job = BroadcastJob(bot, broadcast, self.workers, self.batch_size, self.owner, self.lease)
+        task = asyncio.create_task(self._run(job))
+        self._jobs[broadcast['id']] = (job, task)
+        return task
+
+    async def _run(self, job):
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Nazorat nuqtasi saqlangan: keyingi ishga tushishda davom etadi.
+            print(f"Yuborish #{job.broadcast['id']} to'xtadi: {e}")
+        finally:
+            self._jobs.pop(job.broadcast['id'], None)
+
+    async def resume(self, bot):
+        """Egasiz yoki ijarasi tugagan yuborishlarni olib davom ettiradi; ishga tushgan vazifalar."""
+        tasks = []
+        for broadcast in await run_db(get_running_broadcasts):
+            if broadcast['id'] in self._jobs:
+                continue
+            if not await run_db(claim_broadcast, broadcast['id'], self.owner, self.lease_until()):
+                continue  # boshqa worker yubormoqda
+            print(f"Yuborish #{broadcast['id']} davom ettirilmoqda (id > {broadcast['last_user_id']})")
+            tasks.append(self.start(bot, broadcast))
+        return tasks
+
+    async def watch(self, bot):
+        """Har ijara muddatida to'xtagan worker'lardan qolgan ishlarni tekshiradi."""
+        while True:
+            await asyncio.sleep(self.lease)
+            try:
+                await self.resume(bot)
+            except Exception as e:
+                print(f"Yuborishlarni tekshirishda xatolik: {e}")
+
+    async def stop(self):
+        """Vazifalarni to'xtatadi va ijaralarni bo'shatadi."""
+        ids = list(self._jobs)
+        tasks = [task for _, task in self._jobs.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for broadcast_id in ids:
+            try:
+                await run_db(release_broadcast, broadcast_id, self.owner)
+            except Exception as e:
+                print(f"Yuborish #{broadcast_id} ijarasini bo'shatishda xatolik: {e}")
+
+    def progress(self, broadcast_id):
+        """Ishlayotgan ishning oxirgi to'plamdan keyingi holati yoki None."""
+        entry = self._jobs.get(broadcast_id)
+        return dict(entry[0].broadcast) if entry else None
+
+    def stats(self):
+        jobs = [job.broadcast for job, _ in self._jobs.values()]
+        return {
+            "running": len(jobs),
+            DELIVERED: sum(b[DELIVERED] for b in jobs),
+            BLOCKED: sum(b[BLOCKED] for b in jobs),
+            FAILED: sum(b[FAILED] for b in jobs),
+        }
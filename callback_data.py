@@ -0,0 +1,79 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+
+import config
+
+# Telegram callback_data 64 baytdan oshmasligi kerak, shuning uchun
+# ma'lumotlar ixcham binar ko'rinishda, qisqa HMAC imzo bilan yuboriladi:
+#   "<tur>:" + base64url(struct.pack(format, *maydonlar) + qo'shimcha + mac)
+CALLBACK_FORMATS = {
+    "t": ">Q",    # testni boshlash: test_id
+    "d": ">Q",    # testni o'chirish: test_id
+    "a": ">IHB",  # javob: sessiya nonce, savol pozitsiyasi, variant sloti
+    "p": ">BBQ",  # katalog sahifasi: rejim, yo'nalish, langar test_id (+ qidiruv prefiksi)
+    "l": ">QqQI", # test reytingi sahifasi: test_id, kursor (score, id), o'rin
+    "h": ">qQ",   # /myresults sahifasi: kursor (date_taken mikrosekund, id)
+}
+MAC_SIZE = 6
+# Qo'shimcha baytlar (masalan, qidiruv prefiksi) uchun joy: 64 baytlik chegaraga sig'ishi kerak.
+MAX_TAIL_SIZE = 24
+
+_secret = getattr(config, "CALLBACK_SECRET", None)
+if _secret is None:
+    _secret = hashlib.sha256(b"callback-data:" + config.TELEGRAM_BOT_TOKEN.encode()).digest()
+elif isinstance(_secret, str):
+    _secret = _secret.encode()
+
+# Kalit bilan tayyorlangan HMAC holati; har bir imzo uchun nusxa olinadi.
+_mac_base = hmac.new(_secret, digestmod=hashlib.sha256)
+
+
+def keyed_digest(purpose, data):
+    """Maxfiy kalit bilan olingan HMAC-SHA256 (tashqaridan taxmin qilib bo'lmaydigan seed'lar uchun)."""
+    mac = _mac_base.copy()
+    mac.update(b"\0" + purpose + b"\0" + data)
+    return mac.digest()
+
+
+def _mac(kind, payload):
+    mac = _mac_base.copy()
+    mac.update(kind.encode() + payload)
+    return mac.digest()[:MAC_SIZE]
+
+
+def encode_callback(kind, *fields, tail=b""):
+    """Tur va maydonlarni imzolangan callback_data satriga aylantiradi."""
+    if len(tail) > MAX_TAIL_SIZE:
+        raise ValueError("callback_data uchun qo'shimcha ma'lumot juda uzun")
+    payload = struct.pack(CALLBACK_FORMATS[kind], *fields) + tail
+    token = base64.urlsafe_b64encode(payload + _mac(kind, payload)).rstrip(b"=")
+    return f"{kind}:{token.decode()}"
+
+
+def decode_callback(data):
+    """callback_data ni (tur, maydonlar) ga ajratadi; noto'g'ri yoki soxta bo'lsa None.
+
+    Qo'shimcha baytlar bo'lsa, ular maydonlarning oxirgi elementi sifatida qaytadi.
+    """
+    kind, sep, token = (data or "").partition(":")
+    fmt = CALLBACK_FORMATS.get(kind)
+    if not sep or fmt is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        return None
+
+    size = struct.calcsize(fmt)
+    if not size + MAC_SIZE <= len(raw) <= size + MAX_TAIL_SIZE + MAC_SIZE:
+        return None
+    payload, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    if not hmac.compare_digest(mac, _mac(kind, payload)):
+        return None
+    fields = struct.unpack(fmt, payload[:size])
+    if len(payload) > size:
+        fields += (payload[size:],)
+    return kind, fields
@@ -1,20 +1,118 @@
-import json
+import asyncio
+import contextvars
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy import BigInteger
+from sqlalchemy import BigInteger, select, tuple_, or_, update, delete, union_all
 
 from sqlalchemy.sql import func
 from datetime import datetime, date
+import config
 from config import DATABASE_URL
+from quiz_cache import question_cache, test_catalogue, make_question, CatalogueEntry
+
+DB_POOL_SIZE = getattr(config, "DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = getattr(config, "DB_MAX_OVERFLOW", 20)
+DB_POOL_PRE_PING = getattr(config, "DB_POOL_PRE_PING", True)
+DB_POOL_RECYCLE = getattr(config, "DB_POOL_RECYCLE", 1800)
+
+
+def _engine_options(url):
+    """Pool sozlamalari (SQLite o'z pool'idan foydalanadi)."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
 
-engine = create_engine(DATABASE_URL)
 Base = declarative_base()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine birinchi murojaatda bog'lanadi (session_scope), import paytida emas.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+pool_counters = {"checkouts": 0, "checkins": 0, "connects": 0, "invalidated": 0}
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    pool_counters["connects"] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_counters["checkouts"] += 1
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    pool_counters["checkins"] += 1
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_counters["invalidated"] += 1
+
+
+def get_engine():
+    """Engine ni birinchi chaqiruvda yaratadi: DB drayveri va pool import paytida ochilmaydi."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+                event.listen(engine, "connect", _on_connect)
+                event.listen(engine, "checkout", _on_checkout)
+                event.listen(engine, "checkin", _on_checkin)
+                event.listen(engine, "invalidate", _on_invalidate)
+                _engine = engine
+    return _engine
+
+
+def __getattr__(name):
+    # `from db_manager import engine` va `db_manager.engine` ham engine ni yaratadi.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_pool_status():
+    """Pool holati: band, bo'sh va overflow ulanishlar soni."""
+    pool = get_engine().pool
+    status = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        status.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    status.update(pool_counters)
+    return status
+
+
+LEADERBOARD_LIMIT = getattr(config, "LEADERBOARD_LIMIT", 10)
+RESULTS_PAGE_SIZE = getattr(config, "RESULTS_PAGE_SIZE", 10)  # /leaderboard <test> va /myresults sahifasi
+SAVE_CHUNK_SIZE = getattr(config, "SAVE_CHUNK_SIZE", 1000)
+CATALOGUE_PAGE_SIZE = getattr(config, "CATALOGUE_PAGE_SIZE", 10)
+QUESTION_REPORT_LIMIT = getattr(config, "QUESTION_REPORT_LIMIT", 20)
+POPULAR_SAMPLE_SIZE = getattr(config, "POPULAR_SAMPLE_SIZE", 20000)  # ishga tushishda isitiladigan testlarni tanlash uchun
+
+# Sinxron SQLAlchemy chaqiruvlari event loop'ni to'sib qo'ymasligi uchun
+# ular cheklangan thread pool'da bajariladi.
+DB_WORKERS = getattr(config, "DB_WORKERS", 8)
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
 
 
-from sqlalchemy import BigInteger
+# SQLite faqat INTEGER PRIMARY KEY ni avtoinkrement qiladi.
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
 
 class User(Base):
     __tablename__ = "users"
@@ -22,46 +120,194 @@ class User(Base):
     id = Column(BigInteger, primary_key=True)
     username = Column(String)
     full_name = Column(String)
-    total_correct_global = Column(Integer, default=0)
+    total_correct_global = Column(Integer, default=0, index=True)
 
 class Test(Base):
     __tablename__ = 'tests'
-    id = Column(BigInteger, primary_key=True, index=True)
+    id = Column(BigIntegerPK, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(Text)
+    # Savollar almashtirilganda (qayta import) oshadi: boshqa jarayonlar keshidagi eski to'plam shundan bilinadi.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+class CatalogueVersion(Base):
+    """Testlar katalogi versiyasi: test qo'shilganda, o'chirilganda yoki import qilinganda oshadi."""
+    __tablename__ = "catalogue_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
 
 class Question(Base):
     __tablename__ = 'questions'
-    id = Column(BigInteger, primary_key=True, index=True)
-    test_id = Column(BigInteger, ForeignKey('tests.id'))
+    id = Column(BigIntegerPK, primary_key=True, index=True)
+    test_id = Column(BigInteger, ForeignKey('tests.id', ondelete='CASCADE'), index=True)
     question_text = Column(Text)
-    options_json = Column(Text)
+    options_json = Column(JSON().with_variant(JSONB(), 'postgresql'))
     correct_label = Column(String)
 
 class QuizResult(Base):
+    """Har bir urinish natijasi.
+
+    Postgres'da jadval month_year bo'yicha LIST partitsiyalangan (7-migratsiya):
+    eski oylar arxivlanganda butun partitsiya bir amal bilan o'chiriladi.
+    """
     __tablename__ = "quiz_results"
 
-    id = Column(BigInteger, primary_key=True)  
-    user_id = Column(BigInteger)              
+    id = Column(BigIntegerPK, primary_key=True)
+    user_id = Column(BigInteger)
     test_id = Column(BigInteger)
     score = Column(BigInteger)
     total_questions = Column(BigInteger)
     date_taken = Column(DateTime)
     month_year = Column(String, index=True)
 
+    __table_args__ = (
+        Index("ix_quiz_results_month_user_score", "month_year", "user_id", "score"),
+    )
+
+# Test reytingi va shaxsiy tarix uchun qoplovchi indekslar: sahifa jadvalga
+# murojaatsiz bitta indeks oralig'ini o'qish bilan olinadi.
+Index(
+    "ix_quiz_results_test_score",
+    QuizResult.test_id, QuizResult.score.desc(), QuizResult.id.desc(), QuizResult.user_id, QuizResult.total_questions,
+)
+Index(
+    "ix_quiz_results_user_date",
+    QuizResult.user_id, QuizResult.date_taken.desc(), QuizResult.id.desc(),
+    QuizResult.test_id, QuizResult.score, QuizResult.total_questions,
+)
+
+class QuizResultRollup(Base):
+    """Yopilgan oylar uchun quiz_results ning foydalanuvchi/test bo'yicha yig'indisi.
+
+    Eski xom natijalar arxivlanib o'chirilgandan keyin ham oylik va test
+    bo'yicha tarix shu jadvaldan o'qiladi (retention.py).
+    """
+    __tablename__ = "quiz_result_rollups"
+
+    month_year = Column(String, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    test_id = Column(BigInteger, primary_key=True)
+    attempts = Column(BigInteger, nullable=False, default=0)
+    score = Column(BigInteger, nullable=False, default=0)
+    total_questions = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_quiz_result_rollups_month_test", "month_year", "test_id"),
+    )
+
+class ResultMonth(Base):
+    """Har bir oy natijalarining holati: qachon yig'ilgan va arxivlangan."""
+    __tablename__ = "result_months"
+
+    month_year = Column(String, primary_key=True)
+    compacted_rows = Column(BigInteger, nullable=False, default=0)
+    compacted_at = Column(DateTime)
+    archived_rows = Column(BigInteger, nullable=False, default=0)
+    archive_parts = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime)
+
+class MonthlyScore(Base):
+    """Oylik reyting uchun har bir natijada yangilanadigan yig'indi jadval."""
+    __tablename__ = "monthly_scores"
+
+    month_year = Column(String, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    score = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_monthly_scores_month_score", "month_year", "score"),
+    )
+
+class QuizSessionRecord(Base):
+    __tablename__ = "quiz_sessions"
+
+    user_id = Column(BigInteger, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QuestionStat(Base):
+    """Savol bo'yicha yig'ilgan hisoblagichlar (bufer orqali partiyalab yangilanadi)."""
+    __tablename__ = "question_stats"
+
+    question_id = Column(BigInteger, primary_key=True)
+    test_id = Column(BigInteger, nullable=False, index=True)
+    shown = Column(BigInteger, nullable=False, default=0)
+    answered = Column(BigInteger, nullable=False, default=0)
+    correct = Column(BigInteger, nullable=False, default=0)
+
+class QuestionOptionStat(Base):
+    """Qaysi variant necha marta tanlangani: 0 - to'g'ri javob, k - k-noto'g'ri variant."""
+    __tablename__ = "question_option_stats"
+
+    question_id = Column(BigInteger, primary_key=True)
+    option = Column(Integer, primary_key=True)
+    chosen = Column(BigInteger, nullable=False, default=0)
+
+class Broadcast(Base):
+    """Ommaviy xabar yuborish ishi: last_user_id - oxirgi yuborilgan to'plamning nazorat nuqtasi.
+
+    owner va lease_until - ishni hozir bajarayotgan worker va uning ijarasi muddati:
+    bir nechta worker bo'lsa, ishni faqat ijarasi bor worker yuboradi.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(BigIntegerPK, primary_key=True)
+    text = Column(Text, nullable=False)
+    admin_chat_id = Column(BigInteger)
+    status = Column(String, nullable=False, default="running")  # running, done, cancelled
+    last_user_id = Column(BigInteger, nullable=False, default=0)
+    delivered = Column(BigInteger, nullable=False, default=0)
+    blocked = Column(BigInteger, nullable=False, default=0)
+    failed = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    owner = Column(String)
+    lease_until = Column(DateTime)
+
+class JournalSegment(Base):
+    """DB ga commit qilingan natijalar jurnali segmentlari (qayta tiklashda ikki marta yozmaslik uchun)."""
+    __tablename__ = "journal_segments"
+
+    key = Column(String, primary_key=True)
+    committed_at = Column(DateTime, default=datetime.utcnow)
+
 
 def init_db():
-    """Barcha jadvallarni yaratadi (agar mavjud bo'lmasa)."""
-    Base.metadata.create_all(bind=engine)
+    """Sxemani so'nggi migratsiya versiyasiga keltiradi."""
+    from migrations import migrate
+    migrate(get_engine())
 
-def get_db():
-    """DB sessiyasini yaratadi va qaytaradi."""
-    db = SessionLocal()
+@contextmanager
+def session_scope():
+    """Bitta ish birligi uchun sessiya: commit yoki rollback, so'ng ulanishni qaytaradi."""
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
     finally:
         db.close()
 
+def get_db():
+    """DB sessiyasini yaratadi va qaytaradi."""
+    with session_scope() as db:
+        yield db
+
+async def run_db(func, *args):
+    """func(db, *args) ni alohida DB thread'ida, yangi sessiya bilan bajaradi."""
+    def _call():
+        with session_scope() as db:
+            return func(db, *args)
+
+    # contextvars (masalan, joriy handler nomi) DB thread'iga ham o'tadi.
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, ctx.run, _call)
+
 def get_or_create_user(db, telegram_id, update_info):
     """Foydalanuvchini topadi yoki yangi yaratadi."""
     user = db.query(User).filter(User.id == telegram_id).first()
@@ -77,63 +323,294 @@ def get_or_create_user(db, telegram_id, update_info):
     return user
 
 def update_global_score(db, user_id, correct_count):
-    """Global to'g'ri javoblar sonini yangilaydi."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if user:
-        user.total_correct_global += correct_count
-        db.commit()
+    """Global to'g'ri javoblar sonini bitta atomar UPDATE bilan oshiradi (commit qilmaydi)."""
+    db.query(User).filter(User.id == user_id).update(
+        {User.total_correct_global: func.coalesce(User.total_correct_global, 0) + correct_count},
+        synchronize_session=False,
+    )
+
+def _dialect_insert(db):
+    """ON CONFLICT qo'llaydigan dialekt uchun insert(), aks holda None."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+def _upsert_monthly_score(db, user_id, month_key, score):
+    """monthly_scores dagi foydalanuvchi yig'indisini score ga oshiradi."""
+    insert = _dialect_insert(db)
+    if insert is None:
+        updated = db.query(MonthlyScore).filter(
+            MonthlyScore.month_year == month_key, MonthlyScore.user_id == user_id
+        ).update({MonthlyScore.score: MonthlyScore.score + score}, synchronize_session=False)
+        if not updated:
+            db.add(MonthlyScore(month_year=month_key, user_id=user_id, score=score))
+        return
+
+    stmt = insert(MonthlyScore).values(month_year=month_key, user_id=user_id, score=score)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[MonthlyScore.month_year, MonthlyScore.user_id],
+        set_={"score": MonthlyScore.score + stmt.excluded.score},
+    ))
+
+def _monthly_totals_select(test_id=None):
+    """(oy, foydalanuvchi, ball) so'rovi: xom natijalar va arxivlangan oylar yig'indilari.
+
+    Arxivlangan oyning yig'indisi o'chirilgan xom natijalarni, qolgan xom
+    natijalar esa hali yig'ilmaganlarini o'z ichiga oladi, shuning uchun ikkisi qo'shiladi.
+    """
+    raw = (
+        select(QuizResult.month_year, QuizResult.user_id, func.sum(QuizResult.score).label("score"))
+        .where(QuizResult.month_year.isnot(None))
+        .group_by(QuizResult.month_year, QuizResult.user_id)
+    )
+    archived = (
+        select(QuizResultRollup.month_year, QuizResultRollup.user_id, func.sum(QuizResultRollup.score).label("score"))
+        .join(ResultMonth, ResultMonth.month_year == QuizResultRollup.month_year)
+        .where(ResultMonth.archived_at.isnot(None))
+        .group_by(QuizResultRollup.month_year, QuizResultRollup.user_id)
+    )
+    if test_id is not None:
+        raw = raw.where(QuizResult.test_id == test_id)
+        archived = archived.where(QuizResultRollup.test_id == test_id)
+    parts = union_all(raw, archived).subquery()
+    return (
+        select(parts.c.month_year, parts.c.user_id, func.coalesce(func.sum(parts.c.score), 0).label("score"))
+        .group_by(parts.c.month_year, parts.c.user_id)
+    )
+
+def _monthly_totals(db, test_id=None):
+    """(oy, foydalanuvchi) -> ball."""
+    return {(month_key, user_id): score for month_key, user_id, score in db.execute(_monthly_totals_select(test_id))}
+
+def rebuild_monthly_scores(db):
+    """monthly_scores jadvalini quiz_results va arxivlangan oylar yig'indilaridan qaytadan hisoblaydi."""
+    db.query(MonthlyScore).delete(synchronize_session=False)
+    db.bulk_insert_mappings(MonthlyScore, [
+        {'month_year': month_key, 'user_id': user_id, 'score': score}
+        for (month_key, user_id), score in _monthly_totals(db).items()
+    ])
+    db.commit()
+
+def _subtract_monthly_scores(db, test_id):
+    """Testning ballarini monthly_scores dan ayiradi; nolga tushgan qatorlar o'chiriladi.
+
+    Foydalanuvchilar sonidan qat'i nazar ikkita so'rov: UPDATE ... FROM va DELETE.
+    """
+    totals = _monthly_totals_select(test_id).subquery()
+    db.execute(
+        update(MonthlyScore)
+        .where(MonthlyScore.month_year == totals.c.month_year, MonthlyScore.user_id == totals.c.user_id)
+        .values(score=MonthlyScore.score - totals.c.score)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(MonthlyScore)
+        .where(
+            MonthlyScore.score <= 0,
+            tuple_(MonthlyScore.month_year, MonthlyScore.user_id).in_(select(totals.c.month_year, totals.c.user_id)),
+        )
+        .execution_options(synchronize_session=False)
+    )
 
 def save_quiz_result(db, user_id, test_id, score, total_q):
-    """Quiz natijasini saqlaydi (Global va Oylik)."""
+    """Quiz natijasini, global va oylik ballarni bitta tranzaksiyada saqlaydi."""
     
-    month_key = datetime.utcnow().strftime("%Y-%m")
+    now = datetime.utcnow()
+    month_key = now.strftime("%Y-%m")
     result = QuizResult(
         user_id=user_id,
         test_id=test_id,
         score=score,
         total_questions=total_q,
+        date_taken=now,
         month_year=month_key
     )
     db.add(result)
     
+    _upsert_monthly_score(db, user_id, month_key, score)
     update_global_score(db, user_id, score)
     
     db.commit()
 
-def get_leaderboards(db):
+def save_quiz_results_batch(db, results, segments=(), forget=()):
+    """Bir nechta natijani bitta tranzaksiyada saqlaydi.
+
+    results - user_id, test_id, score, total_questions, date_taken va
+    month_year kalitli lug'atlar. Ballar foydalanuvchi bo'yicha
+    yig'ilib, har bir foydalanuvchi uchun bittadan UPDATE bajariladi.
+    segments - shu natijalar turgan jurnal segmentlari kalitlari: ular natijalar
+    bilan birga commit qilinadi. forget - fayli o'chirilgan, endi keraksiz kalitlar.
+    """
+    if forget:
+        db.query(JournalSegment).filter(JournalSegment.key.in_(list(forget))).delete(synchronize_session=False)
+    if segments:
+        db.execute(JournalSegment.__table__.insert(), [{'key': key, 'committed_at': datetime.utcnow()} for key in segments])
+    if not results:
+        db.commit()
+        return
+    db.execute(QuizResult.__table__.insert(), results)
+
+    global_totals = {}
+    monthly_totals = {}
+    for r in results:
+        global_totals[r['user_id']] = global_totals.get(r['user_id'], 0) + r['score']
+        key = (r['month_year'], r['user_id'])
+        monthly_totals[key] = monthly_totals.get(key, 0) + r['score']
+
+    for (month_key, user_id), score in monthly_totals.items():
+        _upsert_monthly_score(db, user_id, month_key, score)
+    for user_id, score in global_totals.items():
+        update_global_score(db, user_id, score)
+
+    db.commit()
+
+def committed_journal_segments(db, keys):
+    """Berilgan jurnal segmentlaridan natijalari allaqachon DB da bo'lganlari."""
+    if not keys:
+        return set()
+    return set(db.execute(select(JournalSegment.key).where(JournalSegment.key.in_(list(keys)))).scalars())
+
+def get_monthly_leaderboard(db, month_key, limit=LEADERBOARD_LIMIT):
+    """Berilgan oy ("YYYY-MM") reytingi; yopilgan va arxivlangan oylar uchun ham ishlaydi."""
+    monthly_results = (
+        db.query(MonthlyScore.user_id, User.username, MonthlyScore.score)
+        .join(User, User.id == MonthlyScore.user_id)
+        .filter(MonthlyScore.month_year == month_key)
+        .order_by(MonthlyScore.score.desc())
+        .limit(limit)
+        .all()
+    )
+    
+    return [
+        {'id': user_id, 'username': username or f"ID:{user_id}", 'score': score}
+        for user_id, username, score in monthly_results
+    ]
+
+def get_leaderboards(db, limit=LEADERBOARD_LIMIT):
     """Global va Oylik reytinglarni qaytaradi."""
     
-    global_lb = db.query(User.id, User.total_correct_global).order_by(User.total_correct_global.desc()).limit(10).all()
+    global_lb = db.query(User.id, User.total_correct_global).order_by(User.total_correct_global.desc()).limit(limit).all()
     
 
     current_month = datetime.utcnow().strftime("%Y-%m")
-    monthly_results = db.query(
-        QuizResult.user_id, 
-        func.sum(QuizResult.score).label('monthly_score')
-    ).filter(QuizResult.month_year == current_month).group_by(QuizResult.user_id).all()
-    
-    monthly_lb_data = []
-    for user_id, score in monthly_results:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            monthly_lb_data.append({
-                'id': user_id,
-                'username': user.username or f"ID:{user_id}",
-                'score': score
-            })
-    
-    monthly_lb_data.sort(key=lambda x: x['score'], reverse=True)
+    monthly_lb_data = get_monthly_leaderboard(db, current_month, limit)
     
     return global_lb, monthly_lb_data
 
+def get_test_board(db, test_id, after=None, limit=RESULTS_PAGE_SIZE):
+    """Test bo'yicha eng yaxshi urinishlar (ix_quiz_results_test_score bo'ylab keyset sahifa).
 
-def save_test_to_db(db, test_name, parsed_questions):
-    """Testni DB ga saqlaydi."""
-    test = Test(name=test_name)
-    db.add(test)
-    db.flush()
+    after - oldingi sahifa oxirgi qatorining (score, id) jufti.
+    (qatorlar, keyingi sahifa kursori yoki None) qaytaradi.
+    """
+    query = (
+        select(QuizResult.id, QuizResult.user_id, QuizResult.score, QuizResult.total_questions)
+        .where(QuizResult.test_id == test_id)
+        .order_by(QuizResult.score.desc(), QuizResult.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.where(tuple_(QuizResult.score, QuizResult.id) < tuple_(*after))
+    rows = db.execute(query).all()
+    page = rows[:limit]
+    usernames = {}
+    if page:
+        usernames = dict(db.execute(
+            select(User.id, User.username).where(User.id.in_({row.user_id for row in page}))
+        ).all())
+    entries = [
+        {'id': row.user_id, 'username': usernames.get(row.user_id) or f"ID:{row.user_id}",
+         'score': row.score, 'total': row.total_questions}
+        for row in page
+    ]
+    cursor = (page[-1].score, page[-1].id) if len(rows) > limit else None
+    return entries, cursor
+
+def get_user_results(db, user_id, after=None, limit=RESULTS_PAGE_SIZE):
+    """Foydalanuvchining urinishlari, yangilaridan boshlab (ix_quiz_results_user_date bo'ylab).
+
+    after - oldingi sahifa oxirgi qatorining (date_taken, id) jufti.
+    """
+    query = (
+        select(QuizResult.id, QuizResult.test_id, QuizResult.score, QuizResult.total_questions, QuizResult.date_taken)
+        .where(QuizResult.user_id == user_id)
+        .order_by(QuizResult.date_taken.desc(), QuizResult.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.where(tuple_(QuizResult.date_taken, QuizResult.id) < tuple_(*after))
+    rows = db.execute(query).all()
+    page = rows[:limit]
+    names = {}
+    if page:
+        names = dict(db.execute(select(Test.id, Test.name).where(Test.id.in_({row.test_id for row in page}))).all())
+    entries = [
+        {'test_name': names.get(row.test_id, "?"), 'score': row.score,
+         'total': row.total_questions, 'date_taken': row.date_taken}
+        for row in page
+    ]
+    cursor = (page[-1].date_taken, page[-1].id) if len(rows) > limit else None
+    return entries, cursor
+
+def get_test_name(db, test_id):
+    """Test nomi katalog nusxasidan (odatda DB ga murojaatsiz); topilmasa None."""
+    sync_catalogue(db)
+    entries, _, positions = test_catalogue.snapshot(lambda: load_test_catalogue(db))
+    position = positions.get(test_id)
+    return entries[position].name if position is not None else None
+
+def get_test_id_by_name(db, name):
+    """Test id si nom bo'yicha (avval aniq, keyin katta-kichik harfsiz); topilmasa None."""
+    test = db.query(Test.id, Test.name).filter(Test.name == name).first()
+    if test is None:
+        test = db.query(Test.id, Test.name).filter(func.lower(Test.name) == name.lower()).first()
+    return (test.id, test.name) if test else None
+
+def get_user_rank(db, user_id):
+    """Foydalanuvchining global va oylik o'rnini qaytaradi (yo'q bo'lsa None)."""
+    global_score = db.query(User.total_correct_global).filter(User.id == user_id).scalar()
+    global_rank = None
+    if global_score is not None:
+        global_rank = db.query(func.count(User.id)).filter(User.total_correct_global > global_score).scalar() + 1
 
-    q_list_to_save = []
+    current_month = datetime.utcnow().strftime("%Y-%m")
+    monthly_score = db.query(MonthlyScore.score).filter(
+        MonthlyScore.month_year == current_month, MonthlyScore.user_id == user_id
+    ).scalar()
+    monthly_rank = None
+    if monthly_score is not None:
+        monthly_rank = db.query(func.count(MonthlyScore.user_id)).filter(
+            MonthlyScore.month_year == current_month, MonthlyScore.score > monthly_score
+        ).scalar() + 1
+
+    return global_rank, monthly_rank
+
+
+def _insert_questions(db, test_id, rows, chunk_size=SAVE_CHUNK_SIZE):
+    """Savol satrlarini (question_text, options_json, correct_label) chunk_size tadan
+    Core executemany bilan yozadi va yozilganlar sonini qaytaradi."""
+    questions_table = Question.__table__
+    total = 0
+    chunk = []
+    for row in rows:
+        row['test_id'] = test_id
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.execute(questions_table.insert(), chunk)
+            total += len(chunk)
+            chunk = []
+
+    if chunk:
+        db.execute(questions_table.insert(), chunk)
+        total += len(chunk)
+    return total
+
+def _question_rows(parsed_questions):
     for q_data in parsed_questions:
         all_options = [q_data['correct_answer']] + q_data['options']
         random.shuffle(all_options)
@@ -142,44 +619,396 @@ def save_test_to_db(db, test_name, parsed_questions):
         
         correct_label = next(key for key, value in options_map.items() if value == q_data['correct_answer'])
         
-        q_list_to_save.append(Question(
-            test_id=test.id,
-            question_text=q_data['question'],
-            options_json=json.dumps(options_map),
-            correct_label=correct_label
-        ))
-        
-    db.bulk_save_objects(q_list_to_save)
+        yield {
+            'question_text': q_data['question'],
+            'options_json': options_map,
+            'correct_label': correct_label
+        }
+
+def save_test_to_db(db, test_name, parsed_questions, chunk_size=SAVE_CHUNK_SIZE):
+    """Testni DB ga saqlaydi va (test_id, savollar_soni) qaytaradi.
+
+    parsed_questions istalgan iterator bo'lishi mumkin (masalan, parser.iter_quiz):
+    savollar chunk_size tadan yig'ilib, bitta INSERT bilan yoziladi.
+    Birorta ham savol bo'lmasa, hech narsa saqlanmaydi va (None, 0) qaytadi.
+    """
+    test = Test(name=test_name)
+    db.add(test)
+    db.flush()
+
+    total = _insert_questions(db, test.id, _question_rows(parsed_questions), chunk_size)
+    if not total:
+        db.rollback()
+        return None, 0
+
+    _bump_catalogue_version(db)
     db.commit()
-    return test.id
+    question_cache.invalidate(test_id=test.id, name=test_name)
+    test_catalogue.invalidate()
+    return test.id, total
 
-def get_test_questions_from_db(db, test_name):
-    """DB dan test savollarini oladi (A, B, C... formatda)."""
-    test = db.query(Test).filter(Test.name == test_name).first()
-    if not test:
-        return None, None
-        
-    questions_data = db.query(Question).filter(Question.test_id == test.id).all()
+def import_test(db, test_name, rows, chunk_size=SAVE_CHUNK_SIZE):
+    """Testni nom bo'yicha upsert qiladi va yozilgan savollar sonini qaytaradi.
+
+    Test mavjud bo'lsa, uning savollari to'liq almashtiriladi (test_id va
+    natijalar saqlanib qoladi), shuning uchun qayta import natijani o'zgartirmaydi.
+    rows - question_text, options_json, correct_label kalitli lug'atlar.
+    """
+    test_id = db.query(Test.id).filter(Test.name == test_name).scalar()
+    if test_id is None:
+        test = Test(name=test_name)
+        db.add(test)
+        db.flush()
+        test_id = test.id
+    else:
+        _delete_question_stats(db, test_id)
+        db.query(Question).filter(Question.test_id == test_id).delete(synchronize_session=False)
+        db.query(Test).filter(Test.id == test_id).update({Test.version: Test.version + 1}, synchronize_session=False)
+
+    total = _insert_questions(db, test_id, rows, chunk_size)
+    if not total:
+        db.rollback()
+        return 0
+
+    _bump_catalogue_version(db)
+    db.commit()
+    question_cache.invalidate(test_id=test_id, name=test_name)
+    test_catalogue.invalidate()
+    return total
+
+def iter_test_export(db, names=None, chunk_size=SAVE_CHUNK_SIZE):
+    """Testlarni (nom, savol satrlari iteratori) juftliklari sifatida oqim bilan o'qiydi.
+
+    Savollar chunk_size tadan olinadi; keyingi testga o'tishdan oldin
+    oldingi iterator oxirigacha o'qilishi kerak.
+    """
+    query = db.query(Test.id, Test.name).order_by(Test.name)
+    if names:
+        query = query.filter(Test.name.in_(names))
+    for test_id, name in query.all():
+        rows = db.execute(
+            select(Question.question_text, Question.options_json, Question.correct_label)
+            .where(Question.test_id == test_id)
+            .order_by(Question.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        yield name, (row._asdict() for row in rows)
+
+def save_question_stats(db, question_rows, option_rows):
+    """Buferdagi savol hisoblagichlarini mavjudlariga qo'shadi (bitta tranzaksiya).
+
+    question_rows: question_id, test_id, shown, answered, correct;
+    option_rows: question_id, option, chosen.
+    Shu orada o'chirilgan yoki qayta import qilingan savollarning hisoblari tashlab yuboriladi.
+    """
+    existing = _existing_question_ids(db, {row['question_id'] for row in question_rows}
+                                      | {row['question_id'] for row in option_rows})
+    question_rows = [row for row in question_rows if row['question_id'] in existing]
+    option_rows = [row for row in option_rows if row['question_id'] in existing]
+    insert = _dialect_insert(db)
+    if insert is None:
+        for row in question_rows:
+            updated = db.query(QuestionStat).filter(QuestionStat.question_id == row['question_id']).update({
+                QuestionStat.shown: QuestionStat.shown + row['shown'],
+                QuestionStat.answered: QuestionStat.answered + row['answered'],
+                QuestionStat.correct: QuestionStat.correct + row['correct'],
+            }, synchronize_session=False)
+            if not updated:
+                db.add(QuestionStat(**row))
+        for row in option_rows:
+            updated = db.query(QuestionOptionStat).filter(
+                QuestionOptionStat.question_id == row['question_id'], QuestionOptionStat.option == row['option']
+            ).update({QuestionOptionStat.chosen: QuestionOptionStat.chosen + row['chosen']}, synchronize_session=False)
+            if not updated:
+                db.add(QuestionOptionStat(**row))
+        db.commit()
+        return
+
+    if question_rows:
+        stmt = insert(QuestionStat)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[QuestionStat.question_id],
+            set_={
+                "shown": QuestionStat.shown + stmt.excluded.shown,
+                "answered": QuestionStat.answered + stmt.excluded.answered,
+                "correct": QuestionStat.correct + stmt.excluded.correct,
+            },
+        ), question_rows)
+    if option_rows:
+        stmt = insert(QuestionOptionStat)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[QuestionOptionStat.question_id, QuestionOptionStat.option],
+            set_={"chosen": QuestionOptionStat.chosen + stmt.excluded.chosen},
+        ), option_rows)
+    db.commit()
+
+def _existing_question_ids(db, question_ids, chunk_size=SAVE_CHUNK_SIZE):
+    """Hali mavjud savollar ID lari; tranzaksiya tugaguncha ular o'chirilmaydi (Postgres'da FOR SHARE)."""
+    question_ids = sorted(question_ids)
+    existing = set()
+    for start in range(0, len(question_ids), chunk_size):
+        chunk = question_ids[start:start + chunk_size]
+        existing.update(db.execute(
+            select(Question.id).where(Question.id.in_(chunk)).with_for_update(read=True)
+        ).scalars())
+    return existing
+
+def _delete_question_stats(db, test_id):
+    question_ids = select(Question.id).where(Question.test_id == test_id)
+    db.query(QuestionOptionStat).filter(QuestionOptionStat.question_id.in_(question_ids)).delete(synchronize_session=False)
+    db.query(QuestionStat).filter(QuestionStat.test_id == test_id).delete(synchronize_session=False)
+
+def get_question_difficulty(db, test_name, limit=QUESTION_REPORT_LIMIT):
+    """Test savollari qiyinligi: to'g'ri javob ulushi eng pastlari birinchi.
+
+    Faqat yig'ilgan hisoblagichlardan o'qiladi. Test topilmasa None,
+    aks holda lug'atlar ro'yxati: question, shown, answered, correct,
+    top_wrong (eng ko'p tanlangan noto'g'ri variant, matn) va top_wrong_count.
+    """
+    test_id = db.query(Test.id).filter(Test.name == test_name).scalar()
+    if test_id is None:
+        return None
+
+    accuracy = QuestionStat.correct * 1.0 / func.nullif(QuestionStat.answered, 0)
+    rows = (
+        db.query(QuestionStat, Question.question_text, Question.options_json, Question.correct_label)
+        .join(Question, Question.id == QuestionStat.question_id)
+        .filter(QuestionStat.test_id == test_id, QuestionStat.answered > 0)
+        .order_by(accuracy, QuestionStat.answered.desc())
+        .limit(limit)
+        .all()
+    )
+    wrong_counts = {}
+    if rows:
+        for question_id, option, chosen in (
+            db.query(QuestionOptionStat.question_id, QuestionOptionStat.option, QuestionOptionStat.chosen)
+            .filter(QuestionOptionStat.question_id.in_([stat.question_id for stat, *_ in rows]), QuestionOptionStat.option > 0)
+        ):
+            if chosen > wrong_counts.get(question_id, (0, 0))[1]:
+                wrong_counts[question_id] = (option, chosen)
+
+    report = []
+    for stat, question_text, options, correct_label in rows:
+        # make_question bilan bir xil tartib: to'g'ri javobdan boshqa variantlar.
+        wrong = [opt for key, opt in options.items() if key != correct_label]
+        option, count = wrong_counts.get(stat.question_id, (0, 0))
+        report.append({
+            'question': question_text,
+            'shown': stat.shown,
+            'answered': stat.answered,
+            'correct': stat.correct,
+            'top_wrong': wrong[option - 1] if 0 < option <= len(wrong) else None,
+            'top_wrong_count': count,
+        })
+    return report
+
+def get_test_names(db):
+    """Barcha test nomlarini qaytaradi."""
+    return [t[0] for t in db.query(Test.name).all()]
+
+def load_test_catalogue(db):
+    """Barcha testlarni savollar soni bilan birga o'qiydi."""
+    rows = (
+        db.query(Test.id, Test.name, func.count(Question.id))
+        .outerjoin(Question, Question.test_id == Test.id)
+        .group_by(Test.id, Test.name)
+        .all()
+    )
+    return [CatalogueEntry(test_id, name, count) for test_id, name, count in rows]
+
+def _bump_catalogue_version(db):
+    """Katalog versiyasini oshiradi (o'zgarish bilan bitta tranzaksiyada)."""
+    updated = db.query(CatalogueVersion).filter(CatalogueVersion.id == 1).update(
+        {CatalogueVersion.version: CatalogueVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        # Qator 12-migratsiyada yaratiladi; bu faqat migratsiyasiz yaratilgan baza uchun.
+        db.add(CatalogueVersion(id=1, version=1))
+
+def get_catalogue_version(db):
+    return db.query(CatalogueVersion.version).filter(CatalogueVersion.id == 1).scalar() or 0
+
+def sync_catalogue(db):
+    """Boshqa jarayonda testlar o'zgargan bo'lsa, katalog nusxasini va eskirgan savollar to'plamlarini bekor qiladi."""
+    if not test_catalogue.refresh(lambda: get_catalogue_version(db)):
+        return
+    cached = question_cache.versions()
+    if not cached:
+        return
+    current = dict(db.query(Test.id, Test.version).filter(Test.id.in_(list(cached))).all())
+    for test_id, version in cached.items():
+        if current.get(test_id) != version:
+            question_cache.invalidate(test_id=test_id)
+
+def get_catalogue_page(db, anchor_id=None, backward=False, prefix="", limit=CATALOGUE_PAGE_SIZE):
+    """Testlar katalogining bitta sahifasi (xotiradagi nusxadan)."""
+    sync_catalogue(db)
+    return test_catalogue.page(lambda: load_test_catalogue(db), anchor_id, backward, prefix, limit)
+
+def load_question_set(db, test):
+    """Test savollarini DB dan o'qiydi, tahlil qiladi va keshga qo'yadi."""
+    questions_data = db.query(Question).filter(Question.test_id == test.id).order_by(Question.id).all()
     
     processed_qs = []
     for q in questions_data:
-        options = json.loads(q.options_json)
-        processed_qs.append({
-            'question': q.question_text,
-            'options': [opt for key, opt in options.items() if key != q.correct_label],
-            'correct_answer': options[q.correct_label]
-        })
+        options = q.options_json
+        processed_qs.append(make_question(
+            q.question_text,
+            (opt for key, opt in options.items() if key != q.correct_label),
+            options[q.correct_label],
+            q.id,
+        ))
+        
+    return question_cache.put(test.id, test.name, processed_qs, test.version)
+
+def get_popular_test_ids(db, limit, sample=POPULAR_SAMPLE_SIZE):
+    """Oxirgi `sample` ta natijada eng ko'p ishlangan testlar id lari (ko'p ishlanganidan boshlab).
+
+    Butun jadval o'rniga faqat PK bo'yicha oxirgi natijalar sanaladi.
+    """
+    recent = db.query(QuizResult.test_id).order_by(QuizResult.id.desc()).limit(sample).subquery()
+    return [
+        test_id for (test_id,) in db.query(recent.c.test_id)
+        .group_by(recent.c.test_id)
+        .order_by(func.count().desc())
+        .limit(limit)
+    ]
+
+
+def get_question_set_by_id(db, test_id):
+    """Test ID bo'yicha savollar to'plamini keshdan yoki DB dan oladi."""
+    sync_catalogue(db)
+    qset = question_cache.get_by_id(test_id)
+    if qset is None:
+        test = db.query(Test).filter(Test.id == test_id).first()
+        if not test:
+            return None
+        qset = load_question_set(db, test)
+    return qset
+
+def get_test_questions_from_db(db, test_name):
+    """Test savollarini (A, B, C... formatda) keshdan yoki DB dan oladi."""
+    sync_catalogue(db)
+    qset = question_cache.get(test_name)
+    if qset is None:
+        test = db.query(Test).filter(Test.name == test_name).first()
+        if not test:
+            return None, None
+        qset = load_question_set(db, test)
         
-    return processed_qs, test.id
+    return qset.questions, qset.test_id
+
+def delete_test_by_id(db, test_id):
+    """Testni ID bo'yicha o'chiradi va uning nomini qaytaradi (topilmasa None)."""
+    name = db.query(Test.name).filter(Test.id == test_id).scalar()
+    if name is None:
+        return None
+    delete_test_by_name(db, name)
+    return name
 
 def delete_test_by_name(db, test_name):
     test = db.query(Test).filter(Test.name == test_name).first()
     if not test:
         return False
 
+    # Oylik reyting monthly_scores dan o'qiladi: testning ballari xom natijalar bilan birga olib tashlanadi.
+    _subtract_monthly_scores(db, test.id)
+    _delete_question_stats(db, test.id)
     db.query(Question).filter(Question.test_id == test.id).delete()
     db.query(QuizResult).filter(QuizResult.test_id == test.id).delete()
+    db.query(QuizResultRollup).filter(QuizResultRollup.test_id == test.id).delete()
 
     db.delete(test)
+    _bump_catalogue_version(db)
     db.commit()
+    question_cache.invalidate(test_id=test.id, name=test_name)
+    test_catalogue.invalidate()
     return True
+
+
+def _broadcast_dict(broadcast):
+    return {
+        'id': broadcast.id, 'text': broadcast.text, 'admin_chat_id': broadcast.admin_chat_id,
+        'status': broadcast.status, 'last_user_id': broadcast.last_user_id,
+        'delivered': broadcast.delivered, 'blocked': broadcast.blocked, 'failed': broadcast.failed,
+        'created_at': broadcast.created_at, 'finished_at': broadcast.finished_at,
+        'owner': broadcast.owner, 'lease_until': broadcast.lease_until,
+    }
+
+def create_broadcast(db, text, admin_chat_id, owner=None, lease_until=None):
+    """Yangi yuborish ishini (owner ijarasi bilan) yaratadi; boshqasi hali ishlayotgan bo'lsa None."""
+    if db.query(Broadcast.id).filter(Broadcast.status == "running").first():
+        return None
+    broadcast = Broadcast(
+        text=text, admin_chat_id=admin_chat_id, created_at=datetime.utcnow(), owner=owner, lease_until=lease_until,
+    )
+    db.add(broadcast)
+    db.commit()
+    return _broadcast_dict(broadcast)
+
+def get_running_broadcasts(db):
+    return [_broadcast_dict(b) for b in db.query(Broadcast).filter(Broadcast.status == "running").order_by(Broadcast.id)]
+
+def claim_broadcast(db, broadcast_id, owner, lease_until):
+    """Ishlayotgan yuborishni owner ga oladi: egasi yo'q, o'zi yoki ijarasi tugagan bo'lsa True."""
+    updated = db.query(Broadcast).filter(
+        Broadcast.id == broadcast_id, Broadcast.status == "running",
+        or_(Broadcast.owner.is_(None), Broadcast.owner == owner, Broadcast.lease_until < datetime.utcnow()),
+    ).update({Broadcast.owner: owner, Broadcast.lease_until: lease_until}, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def release_broadcast(db, broadcast_id, owner):
+    """Worker to'xtaganda ijarani bo'shatadi: ishni boshqa worker darhol davom ettira oladi."""
+    db.query(Broadcast).filter(Broadcast.id == broadcast_id, Broadcast.owner == owner).update(
+        {Broadcast.owner: None, Broadcast.lease_until: None}, synchronize_session=False
+    )
+    db.commit()
+
+def get_broadcast(db, broadcast_id):
+    broadcast = db.get(Broadcast, broadcast_id)
+    return _broadcast_dict(broadcast) if broadcast else None
+
+def get_latest_broadcast(db):
+    broadcast = db.query(Broadcast).order_by(Broadcast.id.desc()).first()
+    return _broadcast_dict(broadcast) if broadcast else None
+
+def get_user_ids_after(db, after_id, limit):
+    """users.id bo'yicha keyset sahifa: after_id dan keyingi `limit` ta id."""
+    return list(db.execute(
+        select(User.id).where(User.id > after_id).order_by(User.id).limit(limit)
+    ).scalars())
+
+def save_broadcast_progress(db, broadcast_id, last_user_id, delivered, blocked, failed, status=None,
+                            owner=None, lease_until=None):
+    """Nazorat nuqtasi va hisoblarni yozadi, owner ijarasini uzaytiradi.
+
+    Ish bekor qilingan yoki ijarani boshqa worker olgan bo'lsa False.
+    """
+    values = {
+        Broadcast.last_user_id: last_user_id,
+        Broadcast.delivered: Broadcast.delivered + delivered,
+        Broadcast.blocked: Broadcast.blocked + blocked,
+        Broadcast.failed: Broadcast.failed + failed,
+    }
+    if status is not None:
+        values[Broadcast.status] = status
+        values[Broadcast.finished_at] = datetime.utcnow()
+    query = db.query(Broadcast).filter(Broadcast.id == broadcast_id, Broadcast.status == "running")
+    if owner is not None:
+        query = query.filter(or_(Broadcast.owner.is_(None), Broadcast.owner == owner))
+        values[Broadcast.owner] = owner
+        values[Broadcast.lease_until] = lease_until
+    updated = query.update(values, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def cancel_broadcast(db):
+    """Ishlayotgan yuborishni to'xtatadi; to'xtatilgan ish id si yoki None."""
+    broadcast = db.query(Broadcast).filter(Broadcast.status == "running").first()
+    if broadcast is None:
+        return None
+    broadcast.status = "cancelled"
+    broadcast.finished_at = datetime.utcnow()
+    db.commit()
+    return broadcast.id
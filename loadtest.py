@@ -0,0 +1,787 @@
+"""bot.py handler'larini Telegram'siz, SQLite ustida yuklama ostida sinash.
+
+Soxta Update/CallbackQuery obyektlari va chaqiruvlarni yozib boruvchi
+soxta Bot yordamida N ta virtual foydalanuvchi parallel ravishda
+/start -> /takequiz -> test tanlash -> barcha savollar -> reyting
+yo'lini bosib o'tadi. Natijada har bir handler uchun o'tkazuvchanlik,
+latency persentillari, SQL so'rovlar soni va eng yuqori xotira chiqadi.
+
+    python loadtest.py --users 500 --tests 5 --questions 30
+    python loadtest.py --render-bench 100000   # faqat savol/klaviatura yasash
+    python loadtest.py --outbound --flood-rate 0.05   # rate limiter va RetryAfter
+    python loadtest.py --history-bench 1000000,10000000   # reyting va natijalar tarixi
+    python loadtest.py --broadcast 5000 --global-rate 500   # /broadcast, to'xtatib davom ettirish bilan
+    python loadtest.py --results-bench 5000   # natijalarni alohida va partiyalab yozish
+    python loadtest.py --questions-bench 1000000   # savollar bankida o'qish va o'chirish
+    python loadtest.py --session-bench 10000 --questions 200   # sessiyalar xotirasi
+    python loadtest.py --parse-bench 50000   # katta /addtest hujjatini tahlil qilish va saqlash
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+from telegram.error import Forbidden, RetryAfter
+
+from metrics import current_handler
+
+
+def install_config(args):
+    """Harness uchun alohida config modulini o'rnatadi (haqiqiy config.py o'rniga)."""
+    config = types.ModuleType("config")
+    config.TELEGRAM_BOT_TOKEN = "0:loadtest"
+    config.ADMIN_ID = 1
+    config.DATABASE_URL = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loadtest.db')}"
+    config.DB_WORKERS = args.db_workers
+    config.SESSION_STORE = args.session_store
+    config.RESULT_WRITE_BEHIND = args.write_behind
+    if args.global_rate:
+        config.OUTBOUND_GLOBAL_RATE = config.OUTBOUND_GLOBAL_BURST = args.global_rate
+    if args.chat_rate:
+        config.OUTBOUND_CHAT_RATE = args.chat_rate
+    config.QUESTION_TIME_LIMIT = args.question_time_limit
+    config.SESSION_IDLE_TIMEOUT = args.idle_timeout
+    sys.modules["config"] = config
+    return config
+
+
+class Stats:
+    """Handler bo'yicha latency va SQL so'rovlar sonini yig'adi."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.queries = {}
+
+    def record(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def count_query(self):
+        name = current_handler.get()
+        if name is not None:
+            self.queries[name] = self.queries.get(name, 0) + 1
+
+    def report(self, elapsed, peak_memory, bot):
+        print(f"{'handler':<24}{'calls':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'sql/call':>10}")
+        total_calls = 0
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+            total_calls += len(values)
+            queries = self.queries.get(name, 0) / len(values)
+            print(
+                f"{name:<24}{len(values):>8}{len(values) / elapsed:>9.0f}"
+                f"{pick(0.5):>9.1f}{pick(0.95):>9.1f}{pick(0.99):>9.1f}{values[-1] * 1000:>9.1f}{queries:>10.2f}"
+            )
+        print(f"\nJami: {total_calls} ta handler chaqiruvi, {elapsed:.2f}s, {total_calls / elapsed:.0f} chaqiruv/s")
+        print(f"Bot API chaqiruvlari: {bot.counts}")
+        if bot.scheduler is not None:
+            print(f"Soxta RetryAfter: {bot.floods}, rejalashtiruvchi: {bot.scheduler.stats()}")
+        print(f"Eng yuqori xotira (tracemalloc): {peak_memory / 1024 / 1024:.1f} MB")
+
+
+class FakeBot:
+    """Bot API chaqiruvlarini yozib boradi; ixtiyoriy tarmoq kechikishini taqlid qiladi.
+
+    scheduler berilsa chaqiruvlar u orqali o'tadi, flood_rate ulushida esa
+    Telegram kabi RetryAfter qaytariladi.
+    """
+
+    def __init__(self, api_latency=0.0, scheduler=None, flood_rate=0.0, retry_after=0.2, seed=0):
+        self.api_latency = api_latency
+        self.scheduler = scheduler
+        self.flood_rate = flood_rate
+        self.retry_after = datetime.timedelta(seconds=retry_after)
+        self.rng = random.Random(seed)
+        self.counts = {}
+        self.floods = 0
+        self.messages = {}
+        self.blocked = set()  # botni bloklagan chatlar: Forbidden qaytadi
+        self._message_id = 0
+
+    async def call(self, method, chat_id, text=None, reply_markup=None, rate_limit_args=None):
+        if self.scheduler is None:
+            return await self._send(method, chat_id, text, reply_markup)
+        data = {} if method == "answerCallbackQuery" else {"chat_id": chat_id}
+        return await self.scheduler.process_request(
+            callback=self._send, args=(method, chat_id, text, reply_markup), kwargs={},
+            endpoint=method, data=data, rate_limit_args=rate_limit_args,
+        )
+
+    async def _send(self, method, chat_id, text=None, reply_markup=None):
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.floods += 1
+            raise RetryAfter(self.retry_after)
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.counts[method] = self.counts.get(method, 0) + 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        self._message_id += 1
+        message = FakeMessage(self, chat_id, self._message_id, text, reply_markup)
+        self.messages[(chat_id, message.message_id)] = message
+        return message
+
+    async def send_message(self, chat_id, text, reply_markup=None, rate_limit_args=None, **kwargs):
+        return await self.call("sendMessage", chat_id, text, reply_markup, rate_limit_args)
+
+    async def edit_message_text(self, text, chat_id, message_id, reply_markup=None, rate_limit_args=None, **kwargs):
+        edited = await self.call("editMessageText", chat_id, text, reply_markup, rate_limit_args)
+        message = self.messages.get((chat_id, message_id))
+        if message is not None:
+            message.text = text
+            message.reply_markup = reply_markup
+        return edited
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.first_name = f"User{user_id}"
+        self.full_name = f"User {user_id}"
+
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, message_id, text=None, reply_markup=None, document=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.chat = types.SimpleNamespace(id=chat_id)
+        self.message_id = message_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.document = document
+        self.last_reply = None
+
+    async def reply_text(self, text, reply_markup=None, rate_limit_args=None, **kwargs):
+        self.last_reply = await self.bot.call("sendMessage", self.chat_id, text, reply_markup, rate_limit_args)
+        return self.last_reply
+
+    async def reply_html(self, text, reply_markup=None, rate_limit_args=None, **kwargs):
+        return await self.reply_text(text, reply_markup=reply_markup, rate_limit_args=rate_limit_args)
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot, user, message, data):
+        self.bot = bot
+        self.from_user = user
+        self.message = message
+        self.data = data
+
+    def get_bot(self):
+        return self.bot
+
+    async def answer(self, *args, **kwargs):
+        await self.bot.call("answerCallbackQuery", self.from_user.id)
+
+    async def edit_message_text(self, text, reply_markup=None, rate_limit_args=None, **kwargs):
+        edited = await self.bot.call("editMessageText", self.from_user.id, text, reply_markup, rate_limit_args)
+        self.message.text = text
+        self.message.reply_markup = reply_markup
+        return edited
+
+
+class FakeUpdate:
+    def __init__(self, user, message=None, callback_query=None):
+        self.effective_user = user
+        self.message = message
+        self.callback_query = callback_query
+
+
+def buttons(message):
+    """Xabardagi inline tugmalarning callback_data qiymatlari."""
+    if message is None or message.reply_markup is None:
+        return []
+    return [button.callback_data for row in message.reply_markup.inline_keyboard for button in row]
+
+
+async def virtual_user(bot_module, fake_bot, stats, user_id, rng, max_taps, abandon_rate=0.0):
+    user = FakeUser(user_id)
+    chat = FakeMessage(fake_bot, user_id, 0)
+
+    async def timed(name, handler, update, context=None):
+        token = current_handler.set(name)
+        started = time.perf_counter()
+        try:
+            await handler(update, context)
+        finally:
+            stats.record(name, time.perf_counter() - started)
+            current_handler.reset(token)
+
+    await timed("start_command", bot_module.start_command, FakeUpdate(user, message=chat))
+
+    await timed("take_quiz_command", bot_module.take_quiz_command, FakeUpdate(user, message=chat))
+    quiz_message = chat.last_reply
+    test_buttons = [data for data in buttons(quiz_message) if data.startswith("t:")]
+    if not test_buttons:
+        return
+
+    query = FakeCallbackQuery(fake_bot, user, quiz_message, rng.choice(test_buttons))
+    await timed("start_quiz_selection", bot_module.handle_quiz_callback, FakeUpdate(user, callback_query=query))
+
+    if rng.random() < abandon_rate:
+        # Quizni tashlab ketgan foydalanuvchi: sessiyani taymer yakunlaydi.
+        return
+
+    # Rad etilgan bosish xabarni o'zgartirmaydi, shuning uchun takrorlashlar cheklanadi.
+    for _ in range(max_taps):
+        answers = buttons(quiz_message)
+        if not answers or answers == ["show_leaderboard"]:
+            break
+        query = FakeCallbackQuery(fake_bot, user, quiz_message, rng.choice(answers))
+        await timed("handle_quiz_callback", bot_module.handle_quiz_callback, FakeUpdate(user, callback_query=query))
+
+    query = FakeCallbackQuery(fake_bot, user, quiz_message, "show_leaderboard")
+    await timed("show_leaderboard", bot_module.handle_quiz_callback, FakeUpdate(user, callback_query=query))
+
+    await timed("my_results_command", bot_module.my_results_command, FakeUpdate(user, message=chat))
+    context = types.SimpleNamespace(args=["loadtest_0"])
+    await timed("show_test_leaderboard", bot_module.show_leaderboard, FakeUpdate(user, message=chat), context)
+    next_page = [data for data in buttons(chat.last_reply) if data.startswith("l:")]
+    if next_page:
+        query = FakeCallbackQuery(fake_bot, user, chat.last_reply, next_page[0])
+        await timed("handle_results_page", bot_module.handle_results_page, FakeUpdate(user, callback_query=query))
+
+
+def render_bench(bot_module, db_manager, iterations):
+    """build_question() ning mikro-benchmarki: bitta chaqiruv vaqti va ajratilgan xotira."""
+    with db_manager.session_scope() as db:
+        test_id = db.query(db_manager.Test.id).order_by(db_manager.Test.id).limit(1).scalar()
+        qset = db_manager.get_question_set_by_id(db, test_id)
+    sessions = [bot_module.QuizSession(qset.test_id, qset.name, qset.questions) for _ in range(64)]
+
+    def render(count):
+        for i in range(count):
+            state = sessions[i % len(sessions)]
+            state.index = i % len(state)
+            state.nonce = i  # har bir ko'rsatish alohida sessiya kabi: tugmalar keshi yordam bermaydi
+            bot_module.build_question(state)
+
+    render(1000)
+    started = time.perf_counter()
+    render(iterations)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    render(1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"build_question: {iterations} ta, {elapsed / iterations * 1e6:.1f} mks/chaqiruv, "
+          f"{iterations / elapsed:.0f} chaqiruv/s, 1000 chaqiruvda eng yuqori xotira {(peak - before) / 1024:.0f} KB")
+
+
+def current_rss():
+    """Jarayonning joriy RSS hajmi (bayt); /proc bo'lmasa None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def session_bench(bot_module, db_manager, sessions):
+    """`sessions` ta davom etayotgan quiz xotirasi: ixcham QuizSession va savollar nusxasi bilan lug'at."""
+    import gc
+    import json
+
+    with db_manager.session_scope() as db:
+        test = db.query(db_manager.Test).order_by(db_manager.Test.id).first()
+        qset = db_manager.get_question_set_by_id(db, test.id)
+        rows = db.query(db_manager.Question).filter(db_manager.Question.test_id == test.id).all()
+        # Avvalgi holat: har bir foydalanuvchi savollarni DB dan o'zi o'qib, lug'atlar ro'yxatini saqlardi.
+        payload = json.dumps([
+            {
+                'question': q.question_text,
+                'options': [opt for key, opt in q.options_json.items() if key != q.correct_label],
+                'correct_answer': q.options_json[q.correct_label],
+            }
+            for q in rows
+        ])
+
+    def compact():
+        return bot_module.QuizSession(qset.test_id, qset.name, qset.questions)
+
+    def copied():
+        questions = json.loads(payload)
+        random.shuffle(questions)
+        return {
+            'step': 'in_quiz', 'test_name': qset.name, 'test_id': qset.test_id, 'questions': questions,
+            'current_q_index': 0, 'correct_answers': 0, 'incorrect_answers': 0,
+        }
+
+    def rss_delta(make):
+        gc.collect()
+        before = current_rss()
+        store = {10_000 + i: make() for i in range(sessions)}
+        after = current_rss()
+        del store
+        return None if before is None else after - before
+
+    def traced(make):
+        gc.collect()
+        tracemalloc.start()
+        store = {10_000 + i: make() for i in range(sessions)}
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del store
+        return size
+
+    print(f"{sessions} ta sessiya, test {len(qset.questions)} ta savol")
+    # RSS tracemalloc'siz o'lchanadi (uning o'z yozuvlari ham xotira oladi); kichigi birinchi,
+    # chunki bo'shatilgan xotira RSS dan darhol qaytmaydi.
+    rss = {label: rss_delta(make) for label, make in (("compact", compact), ("copied", copied))}
+    for label, name, make in (("compact", "QuizSession (ixcham)", compact), ("copied", "savollar nusxasi (avval)", copied)):
+        size = traced(make)
+        rss_text = f"{rss[label] / 1024 / 1024:7.1f} MB" if rss[label] is not None else "-"
+        print(f"{name:<28} RSS +{rss_text}, tracemalloc {size / 1024 / 1024:7.1f} MB ({size / sessions:8.0f} bayt/sessiya)")
+
+
+def parse_bench(db_manager, questions):
+    """`questions` ta savolli /addtest hujjatini oqim bilan va butunlay xotiraga o'qib tahlil qilish va saqlash."""
+    import io
+    from parser import iter_quiz, parse_text_to_quiz
+
+    document = io.BytesIO()
+    for q in range(questions):
+        document.write(
+            f"{q + 1}. Savol {q}: quyidagilardan qaysi biri to'g'ri javob?\n*To'g'ri javob {q}\n"
+            f"Noto'g'ri javob {q}.1\nNoto'g'ri javob {q}.2\nNoto'g'ri javob {q}.3\n\n".encode()
+        )
+    size = document.tell()
+
+    def streamed(name):
+        # handle_admin_document bilan bir xil: yuklab olingan bufer qatorma-qator o'qiladi.
+        document.seek(0)
+        errors = []
+        lines = io.TextIOWrapper(document, encoding="utf-8-sig", errors="replace")
+        try:
+            with db_manager.session_scope() as db:
+                return db_manager.save_test_to_db(db, name, iter_quiz(lines, errors))[1]
+        finally:
+            lines.detach()
+
+    def materialized(name):
+        # Avvalgi yo'l: butun matn satrga, barcha savollar ro'yxatga.
+        parsed = parse_text_to_quiz(document.getvalue().decode("utf-8-sig"))
+        with db_manager.session_scope() as db:
+            return db_manager.save_test_to_db(db, name, parsed)[1]
+
+    def parse_only():
+        document.seek(0)
+        lines = io.TextIOWrapper(document, encoding="utf-8-sig", errors="replace")
+        try:
+            return sum(1 for _ in iter_quiz(lines))
+        finally:
+            lines.detach()
+
+    print(f"Hujjat: {questions} ta savol, {size / 1024 / 1024:.1f} MB")
+    started = time.perf_counter()
+    parsed = parse_only()
+    elapsed = time.perf_counter() - started
+    print(f"{'iter_quiz (faqat tahlil)':<30} {elapsed:6.2f}s, {parsed / elapsed:8.0f} savol/s")
+    for label, action in (("oqim: iter_quiz + saqlash", streamed), ("ro'yxat: parse_text_to_quiz", materialized)):
+        # Vaqt tracemalloc'siz (u ajratishlarni sekinlashtiradi), xotira ikkinchi o'tishda o'lchanadi.
+        started = time.perf_counter()
+        count = action(f"parse_bench_{time.time_ns()}")
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        action(f"parse_bench_{time.time_ns()}")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<30} {elapsed:6.2f}s, {count / elapsed:8.0f} savol/s, eng yuqori xotira {peak / 1024 / 1024:7.1f} MB")
+
+
+HISTORY_USERS = 50_000
+HISTORY_MONTHS = 36
+
+
+def grow_history(db_manager, target):
+    """quiz_results ni `target` qatorgacha o'tgan HISTORY_MONTHS oyga taqsimlangan natijalar bilan to'ldiradi."""
+    from sqlalchemy import func, text
+    from retention import month_key, shift_month
+
+    with db_manager.session_scope() as db:
+        existing = db.query(func.count(db_manager.QuizResult.id)).scalar()
+        if existing >= target:
+            return
+        if not db.query(db_manager.User).filter(db_manager.User.id >= 1_000_000).first():
+            db.execute(db_manager.User.__table__.insert(), [
+                {"id": 1_000_000 + u, "username": f"history_{u}", "total_correct_global": (u * 7919) % 5000}
+                for u in range(HISTORY_USERS)
+            ])
+        current = month_key(datetime.datetime.utcnow())
+        months = " ".join(f"WHEN {m} THEN '{shift_month(current, -m)}'" for m in range(HISTORY_MONTHS))
+        if db.get_bind().dialect.name == "postgresql":
+            numbers = "SELECT generate_series(:start, :stop - 1) AS n"
+        else:
+            numbers = "WITH RECURSIVE seq(n) AS (SELECT :start UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < :stop) SELECT n FROM seq"
+        db.execute(text(
+            "INSERT INTO quiz_results (user_id, test_id, score, total_questions, date_taken, month_year) "
+            f"SELECT 1000000 + s.n % {HISTORY_USERS}, 1 + s.n % 50, s.n % 21, 20, CURRENT_TIMESTAMP, "
+            f"CASE s.n % {HISTORY_MONTHS} {months} END FROM ({numbers}) s"
+        ), {"start": existing, "stop": target})
+        # monthly_scores har bir natija bilan yangilanadi; bu yerda to'g'ridan-to'g'ri qayta hisoblanadi.
+        db.execute(text("DELETE FROM monthly_scores"))
+        db.execute(text(
+            "INSERT INTO monthly_scores (month_year, user_id, score) "
+            "SELECT month_year, user_id, SUM(score) FROM quiz_results GROUP BY month_year, user_id"
+        ))
+
+
+def history_bench(db_manager, sizes, iterations=200):
+    """quiz_results o'sishi bilan reyting so'rovlari vaqtini o'lchaydi, so'ng arxivlashni bajaradi."""
+    from sqlalchemy import func
+    from retention import month_key, shift_month, run_retention
+
+    current = month_key(datetime.datetime.utcnow())
+    past = shift_month(current, -HISTORY_MONTHS + 1)
+
+    def timed_ms(func_, *args, repeat=iterations):
+        samples = []
+        for _ in range(repeat):
+            with db_manager.session_scope() as db:
+                started = time.perf_counter()
+                func_(db, *args)
+                samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return samples[len(samples) // 2]
+
+    def raw_board(db):
+        # Yig'indi jadvallarsiz joriy oy reytingi: quiz_results o'sishi bilan sekinlashadi.
+        QR = db_manager.QuizResult
+        return (db.query(QR.user_id, func.sum(QR.score)).filter(QR.month_year == current)
+                .group_by(QR.user_id).order_by(func.sum(QR.score).desc()).limit(10).all())
+
+    def measure(label):
+        with db_manager.session_scope() as db:
+            rows = db.query(func.count(db_manager.QuizResult.id)).scalar()
+        print(
+            f"{label:<22} quiz_results={rows:>10}  get_leaderboards {timed_ms(db_manager.get_leaderboards):6.2f} ms  "
+            f"get_user_rank {timed_ms(db_manager.get_user_rank, 1_000_123):6.2f} ms  "
+            f"{past} reytingi {timed_ms(db_manager.get_monthly_leaderboard, past):6.2f} ms  "
+            f"xom GROUP BY {timed_ms(raw_board, repeat=5):8.2f} ms"
+        )
+
+    measure("bo'sh")
+    for size in sizes:
+        started = time.perf_counter()
+        grow_history(db_manager, size)
+        print(f"  (+ {time.perf_counter() - started:.1f}s to'ldirish)")
+        measure(f"{size} ta natija")
+
+    started = time.perf_counter()
+    with db_manager.session_scope() as db:
+        report = run_retention(db, directory=tempfile.mkdtemp(prefix="quiz_archive_"))
+    print(
+        f"Arxivlash: {len(report['compacted'])} oy yig'ildi, {len(report['archived'])} oy arxivlandi "
+        f"({report['rows']} ta natija), {time.perf_counter() - started:.1f}s"
+    )
+    measure("arxivlashdan keyin")
+
+
+def questions_bench(db_manager, total, tests=1000):
+    """`total` ta savolli bankda savollarni o'qish va testni o'chirish vaqtini o'lchaydi."""
+    from sqlalchemy import event, func, text
+
+    per_test = total // tests
+    with db_manager.session_scope() as db:
+        if not db.query(db_manager.Test).filter(db_manager.Test.name == "qbench_0").first():
+            started = time.perf_counter()
+            db.execute(db_manager.Test.__table__.insert(), [{"name": f"qbench_{t}"} for t in range(tests)])
+            first_id = db.query(func.min(db_manager.Test.id)).filter(db_manager.Test.name.like("qbench_%")).scalar()
+            options = '\'{"A": "Variant A", "B": "Variant B", "C": "Variant C", "D": "Variant D"}\''
+            if db.get_bind().dialect.name == "postgresql":
+                options += "::jsonb"
+                numbers = "SELECT generate_series(0, :total - 1) AS n"
+            else:
+                numbers = "WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < :total) SELECT n FROM seq"
+            db.execute(text(
+                "INSERT INTO questions (test_id, question_text, options_json, correct_label) "
+                f"SELECT {first_id} + s.n / {per_test}, 'Savol ' || s.n, {options}, 'A' FROM ({numbers}) s"
+            ), {"total": tests * per_test})
+            db.commit()
+            print(f"{tests * per_test} ta savol ({tests} test x {per_test}) {time.perf_counter() - started:.1f}s da yozildi")
+        count = db.query(func.count(db_manager.Question.id)).scalar()
+    names = iter(f"qbench_{t}" for t in range(tests))
+
+    def median_ms(action, repeat):
+        samples = []
+        for _ in range(repeat):
+            name = next(names)
+            with db_manager.session_scope() as db:
+                test_id = db.query(db_manager.Test.id).filter(db_manager.Test.name == name).scalar()
+                db_manager.question_cache.invalidate(test_id=test_id, name=name)
+                started = time.perf_counter()
+                action(db, name, test_id)
+                samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return samples[len(samples) // 2]
+
+    def sql_lookup(db, name, test_id):
+        rows = db.execute(db_manager.Question.__table__.select().where(db_manager.Question.test_id == test_id)).all()
+        assert len(rows) == per_test
+
+    def lookup(db, name, test_id):
+        questions, _ = db_manager.get_test_questions_from_db(db, name)
+        assert len(questions) == per_test
+
+    def delete(db, name, test_id):
+        assert db_manager.delete_test_by_name(db, name)
+
+    def cascade(db, name, test_id):
+        # Faqat tests qatori o'chiriladi; savollarni ON DELETE CASCADE o'chiradi.
+        db.query(db_manager.Test).filter(db_manager.Test.id == test_id).delete()
+        db.commit()
+        assert not db.query(db_manager.Question.id).filter(db_manager.Question.test_id == test_id).first()
+
+    if db_manager.engine.dialect.name == "sqlite":
+        # SQLite tashqi kalitlarni faqat shu PRAGMA bilan tekshiradi (ulanish bo'yicha).
+        event.listen(db_manager.engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+        db_manager.engine.dispose()
+
+    def measure(label, repeat):
+        print(
+            f"{label:<24} SQL {median_ms(sql_lookup, repeat):7.2f} ms  get_test_questions_from_db {median_ms(lookup, repeat):7.2f} ms  "
+            f"delete_test_by_name {median_ms(delete, repeat):7.2f} ms  ON DELETE CASCADE {median_ms(cascade, repeat):7.2f} ms"
+        )
+
+    print(f"questions={count}, test boshiga {per_test} ta savol (median, keshsiz)")
+    measure("ix_questions_test_id", 20)
+    with db_manager.session_scope() as db:
+        db.execute(text("DROP INDEX ix_questions_test_id"))
+    try:
+        measure("indekssiz", 5)
+    finally:
+        with db_manager.session_scope() as db:
+            db.execute(text("CREATE INDEX ix_questions_test_id ON questions (test_id)"))
+
+
+async def broadcast_bench(db_manager, fake_bot, users, blocked_rate, stop_after, rng):
+    """/broadcast ishini stop_after sekunddan keyin to'xtatib, nazorat nuqtasidan davom ettiradi."""
+    from broadcast import BroadcastManager
+
+    first_id = 2_000_000
+    user_ids = range(first_id, first_id + users)
+    with db_manager.session_scope() as db:
+        for start in range(0, users, db_manager.SAVE_CHUNK_SIZE):
+            db.execute(db_manager.User.__table__.insert(), [
+                {"id": user_id, "username": f"user{user_id}", "total_correct_global": 0}
+                for user_id in user_ids[start:start + db_manager.SAVE_CHUNK_SIZE]
+            ])
+        broadcast = db_manager.create_broadcast(db, "Yangi testlar qo'shildi! /takequiz", 1)
+    fake_bot.blocked = {user_id for user_id in user_ids if rng.random() < blocked_rate}
+
+    started = time.perf_counter()
+    manager = BroadcastManager()
+    manager.start(fake_bot, broadcast)
+    # Jarayon to'xtashini taqlid qilish: vazifalar yarim yo'lda bekor qilinadi.
+    await asyncio.sleep(stop_after)
+    await manager.stop()
+    with db_manager.session_scope() as db:
+        checkpoint = db_manager.get_latest_broadcast(db)
+    print(f"To'xtatildi: {checkpoint['delivered'] + checkpoint['blocked'] + checkpoint['failed']} ta yozilgan, "
+          f"nazorat nuqtasi id > {checkpoint['last_user_id']}")
+
+    await asyncio.gather(*await BroadcastManager().resume(fake_bot))
+    elapsed = time.perf_counter() - started
+
+    with db_manager.session_scope() as db:
+        result = db_manager.get_latest_broadcast(db)
+    received = {}
+    for chat_id, _ in fake_bot.messages:
+        received[chat_id] = received.get(chat_id, 0) + 1
+    duplicates = sum(1 for user_id in user_ids if received.get(user_id, 0) > 1)
+    missing = sum(1 for user_id in user_ids if user_id not in fake_bot.blocked and user_id not in received)
+    print(f"Yuborish #{result['id']}: {result['status']}, yetkazildi {result['delivered']}, "
+          f"bloklagan {result['blocked']} (kutilgan {len(fake_bot.blocked)}), xato {result['failed']}")
+    print(f"{elapsed:.2f}s, {users / elapsed:.0f} xabar/s; yetmagan {missing}, "
+          f"qayta yuborilgan (to'xtagan to'plam) {duplicates}, admin xabari {received.get(1, 0)}")
+    if fake_bot.scheduler is not None:
+        print(f"Rejalashtiruvchi: {fake_bot.scheduler.stats()}")
+
+
+async def results_bench(db_manager, results):
+    """Natijalarni alohida commit'lar va write-behind partiyalari (jurnal bilan va jurnalsiz) bilan yozishni solishtiradi."""
+    from result_writer import ResultWriter
+
+    first_id = 3_000_000
+    with db_manager.session_scope() as db:
+        db.execute(db_manager.User.__table__.insert(), [
+            {"id": first_id + u, "username": f"finisher{u}", "total_correct_global": 0} for u in range(results)
+        ])
+        test_id = db.query(db_manager.Test.id).order_by(db_manager.Test.id).limit(1).scalar()
+
+    async def measure(label, submit, writer=None):
+        stalls = []
+
+        async def ticker():
+            # Event loop qancha vaqt to'silib qolganini o'lchaydi.
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stalls.append(time.perf_counter() - started - 0.001)
+
+        watcher = asyncio.create_task(ticker())
+        if writer:
+            await writer.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(submit(first_id + u) for u in range(results)))
+        replied = time.perf_counter() - started
+        if writer:
+            await writer.stop()
+        elapsed = time.perf_counter() - started
+        watcher.cancel()
+        extra = f", {writer.batches} partiya, {writer.syncs} fsync" if writer else ""
+        print(f"{label:<28} javobgacha {replied:6.2f}s, commit {elapsed:6.2f}s, {results / elapsed:7.0f} natija/s, "
+              f"event loop eng uzoq to'silishi {max(stalls, default=0) * 1000:6.1f} ms{extra}")
+
+    await measure("har biri alohida commit", lambda user_id: db_manager.run_db(db_manager.save_quiz_result, user_id, test_id, 5, 10))
+    writer = ResultWriter()
+    await measure("write-behind", lambda user_id: writer.submit(user_id, test_id, 5, 10), writer)
+    journal = ResultWriter(journal_path=os.path.join(tempfile.mkdtemp(), "results.journal"))
+    await measure("write-behind + jurnal", lambda user_id: journal.submit(user_id, test_id, 5, 10), journal)
+
+
+def seed_tests(db_manager, tests, questions, options):
+    with db_manager.session_scope() as db:
+        existing = set(db_manager.get_test_names(db))
+        for t in range(tests):
+            if f"loadtest_{t}" in existing:
+                continue
+            bank = [
+                {
+                    'question': f"Test {t} savol {q}?",
+                    'correct_answer': f"To'g'ri {q}",
+                    'options': [f"Variant {q}.{o}" for o in range(options - 1)],
+                }
+                for q in range(questions)
+            ]
+            db_manager.save_test_to_db(db, f"loadtest_{t}", bank)
+
+
+async def run(args):
+    import bot as bot_module
+    import db_manager
+    from sqlalchemy import event
+
+    db_manager.init_db()
+    seed_tests(db_manager, args.tests, args.questions, args.options)
+
+    if args.render_bench:
+        render_bench(bot_module, db_manager, args.render_bench)
+        return
+    if args.history_bench:
+        history_bench(db_manager, [int(size) for size in args.history_bench.split(",")])
+        return
+    if args.parse_bench:
+        parse_bench(db_manager, args.parse_bench)
+        return
+    if args.session_bench:
+        session_bench(bot_module, db_manager, args.session_bench)
+        return
+    if args.questions_bench:
+        questions_bench(db_manager, args.questions_bench)
+        return
+    if args.results_bench:
+        await results_bench(db_manager, args.results_bench)
+        return
+    if args.broadcast:
+        scheduler = bot_module.outbound if args.outbound or args.global_rate else None
+        fake_bot = FakeBot(args.api_latency / 1000, scheduler, args.flood_rate, args.retry_after, args.seed)
+        # Rejalashtiruvchi bilan yarim yo'l taxminan N / 2 / tezlik sekundda.
+        stop_after = args.broadcast / 2 * bot_module.outbound._global.interval if scheduler else 0.05
+        await broadcast_bench(db_manager, fake_bot, args.broadcast, args.blocked_rate, stop_after, random.Random(args.seed))
+        return
+
+    stats = Stats()
+    event.listen(db_manager.engine, "before_cursor_execute", lambda *a: stats.count_query())
+
+    scheduler = bot_module.outbound if args.outbound else None
+    fake_bot = FakeBot(args.api_latency / 1000, scheduler, args.flood_rate, args.retry_after, args.seed)
+    if bot_module.result_writer:
+        await bot_module.result_writer.start()
+    bot_module.session_timers.start(lambda user_id: bot_module.expire_session(fake_bot, user_id))
+    await bot_module.question_stats.start()
+
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(user_id):
+        async with semaphore:
+            await virtual_user(
+                bot_module, fake_bot, stats, user_id, random.Random(rng.random()), args.questions * 2, args.abandon_rate
+            )
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(10_000 + i) for i in range(args.users)))
+    if args.abandon_rate:
+        print(f"Tashlab ketilgan sessiyalar: {await bot_module.session_store.count()}, taymerlar tugashi kutilmoqda...")
+        while len(bot_module.session_timers):
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(bot_module.session_timers.tick)
+        print(f"Qolgan sessiyalar: {await bot_module.session_store.count()}")
+    if bot_module.result_writer:
+        await bot_module.result_writer.stop()
+    await bot_module.session_timers.stop()
+    await bot_module.question_stats.stop()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats.report(elapsed, peak, fake_bot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="virtual foydalanuvchilar soni")
+    parser.add_argument("--concurrency", type=int, default=200, help="bir vaqtda faol foydalanuvchilar")
+    parser.add_argument("--tests", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="soxta Bot API kechikishi (ms)")
+    parser.add_argument("--db-workers", type=int, default=8)
+    parser.add_argument("--session-store", default="memory", choices=["memory", "db"])
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--database-url", default=None, help="standart: vaqtinchalik SQLite fayl")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--outbound", action="store_true",
+                        help="Bot API chaqiruvlarini chiquvchi rejalashtiruvchi orqali o'tkazish")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="RetryAfter qaytariladigan chaqiruvlar ulushi")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="soxta RetryAfter kutish vaqti (s)")
+    parser.add_argument("--question-time-limit", type=float, default=None, help="QUESTION_TIME_LIMIT (s)")
+    parser.add_argument("--idle-timeout", type=float, default=30 * 60, help="SESSION_IDLE_TIMEOUT (s)")
+    parser.add_argument("--abandon-rate", type=float, default=0.0,
+                        help="birinchi savoldan keyin quizni tashlab ketadigan foydalanuvchilar ulushi")
+    parser.add_argument("--chat-rate", type=float, default=None, help="OUTBOUND_CHAT_RATE (xabar/s)")
+    parser.add_argument("--render-bench", type=int, default=0, metavar="N",
+                        help="handler'lar o'rniga build_question() ni N marta o'lchash")
+    parser.add_argument("--broadcast", type=int, default=0, metavar="N",
+                        help="N ta foydalanuvchiga /broadcast yuborish (yarmida to'xtatib davom ettiriladi)")
+    parser.add_argument("--blocked-rate", type=float, default=0.05, help="botni bloklagan foydalanuvchilar ulushi")
+    parser.add_argument("--global-rate", type=float, default=None,
+                        help="OUTBOUND_GLOBAL_RATE (xabar/s); berilsa chaqiruvlar rejalashtiruvchidan o'tadi")
+    parser.add_argument("--history-bench", default=None, metavar="N,M,...",
+                        help="quiz_results ni N, M, ... qatorgacha o'stirib reyting so'rovlarini o'lchash")
+    parser.add_argument("--parse-bench", type=int, default=0, metavar="N",
+                        help="N ta savolli hujjatni tahlil qilish va saqlashni o'lchash (/addtest fayl)")
+    parser.add_argument("--session-bench", type=int, default=0, metavar="N",
+                        help="N ta davom etayotgan quiz sessiyasi xotirasini o'lchash (--questions savolli test)")
+    parser.add_argument("--questions-bench", type=int, default=0, metavar="N",
+                        help="N ta savolli bankda savollarni o'qish va testni o'chirishni o'lchash")
+    parser.add_argument("--results-bench", type=int, default=0, metavar="N",
+                        help="N ta natijani alohida commit'lar va write-behind partiyalari bilan yozishni solishtirish")
+    args = parser.parse_args()
+
+    install_config(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+current_handler = contextvars.ContextVar("current_handler", default=None)
+
+
+class Histogram:
+    """Prometheus uslubidagi kumulyativ bucket'li histogramma."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def quantile(self, q):
+        """Bucket chegaralari bo'yicha taxminiy kvantil."""
+        with self._lock:
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= target and self.count:
+                    return bound
+        return float("inf") if self.count else 0.0
+
+    def samples(self):
+        with self._lock:
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                yield str(bound), cumulative
+            yield "+Inf", self.count
+
+
+def _process_started():
+    """Jarayon boshlangan payt perf_counter() shkalasida: Linux'da /proc dan, aks holda shu modul importi."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.perf_counter() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter()
+
+
+PROCESS_STARTED = _process_started()
+
+handler_latency = {}
+first_calls = {}  # handler -> (jarayon boshidan sekund, birinchi chaqiruv latency'si)
+handler_errors = {}
+sql_queries = {}
+sql_seconds = {}
+# SQL hisoblagichlari DB_WORKERS thread'laridan yangilanadi.
+_sql_lock = threading.Lock()
+_gauges = {}
+
+
+def instrument(handler, name=None):
+    """Handler'ni o'lchaydigan wrapper: latency, xatolar va SQL so'rovlar unga yoziladi."""
+    name = name or handler.__name__
+    histogram = handler_latency.setdefault(name, Histogram())
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = current_handler.set(name)
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            handler_errors[name] = handler_errors.get(name, 0) + 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            histogram.observe(elapsed)
+            current_handler.reset(token)
+            if name not in first_calls:
+                _record_first_call(name, started, elapsed)
+
+    return wrapper
+
+
+def _record_first_call(name, started, latency):
+    """Ishga tushgandan keyingi birinchi update va har bir handler'ning birinchi (sovuq) chaqiruvi."""
+    first_calls[name] = (started - PROCESS_STARTED, latency)
+    if len(first_calls) == 1:
+        print(f"Birinchi update ({name}): ishga tushgandan {started - PROCESS_STARTED:.2f}s keyin, {latency * 1000:.0f} ms")
+    else:
+        print(f"Birinchi {name}: {latency * 1000:.0f} ms")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    name = current_handler.get() or "other"
+    with _sql_lock:
+        sql_queries[name] = sql_queries.get(name, 0) + 1
+        sql_seconds[name] = sql_seconds.get(name, 0.0) + elapsed
+
+
+def instrument_engine(engine):
+    """SQLAlchemy engine'idagi har bir so'rovni joriy handler hisobiga yozadi."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def register_gauge(name, help_text, func):
+    """Gauge qo'shadi; func sinxron yoki async bo'lib, son yoki {label: son} qaytaradi."""
+    _gauges[name] = (help_text, func)
+
+
+async def _gauge_value(func):
+    value = func()
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+async def render_prometheus():
+    """Barcha metrikalarni Prometheus text formatida qaytaradi."""
+    lines = [
+        "# HELP bot_handler_latency_seconds Handler bajarilish vaqti.",
+        "# TYPE bot_handler_latency_seconds histogram",
+    ]
+    for name, histogram in sorted(handler_latency.items()):
+        for bound, count in histogram.samples():
+            lines.append(f'bot_handler_latency_seconds_bucket{{handler="{name}",le="{bound}"}} {count}')
+        lines.append(f'bot_handler_latency_seconds_sum{{handler="{name}"}} {histogram.sum}')
+        lines.append(f'bot_handler_latency_seconds_count{{handler="{name}"}} {histogram.count}')
+
+    lines += ["# HELP bot_handler_errors_total Handler ichidagi xatolar.", "# TYPE bot_handler_errors_total counter"]
+    for name, count in sorted(handler_errors.items()):
+        lines.append(f'bot_handler_errors_total{{handler="{name}"}} {count}')
+
+    with _sql_lock:
+        queries, seconds_by_handler = dict(sql_queries), dict(sql_seconds)
+    lines += ["# HELP bot_sql_queries_total Handler bo'yicha SQL so'rovlar.", "# TYPE bot_sql_queries_total counter"]
+    for name, count in sorted(queries.items()):
+        lines.append(f'bot_sql_queries_total{{handler="{name}"}} {count}')
+    lines += ["# HELP bot_sql_seconds_total Handler bo'yicha SQL vaqti.", "# TYPE bot_sql_seconds_total counter"]
+    for name, seconds in sorted(seconds_by_handler.items()):
+        lines.append(f'bot_sql_seconds_total{{handler="{name}"}} {seconds}')
+
+    for name, (help_text, func) in sorted(_gauges.items()):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        try:
+            value = await _gauge_value(func)
+        except Exception as e:
+            print(f"Metrika xatosi ({name}): {e}")
+            continue
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                lines.append(f'{name}{{key="{label}"}} {item}')
+        else:
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+async def summary():
+    """/stats uchun qisqa matnli hisobot."""
+    message = "Handler'lar (chaqiruv, o'rtacha ms, ~p95 ms, SQL/chaqiruv):\n"
+    for name, histogram in sorted(handler_latency.items()):
+        if not histogram.count:
+            continue
+        avg = histogram.sum / histogram.count * 1000
+        p95 = histogram.quantile(0.95) * 1000
+        queries = sql_queries.get(name, 0) / histogram.count
+        message += f"- {name}: {histogram.count}, {avg:.1f}, {p95:.0f}, {queries:.1f}\n"
+
+    if first_calls:
+        first = min(first_calls.values())
+        message += f"\nBirinchi update: ishga tushgandan {first[0]:.2f}s keyin, {first[1] * 1000:.0f} ms\n"
+
+    for name, (help_text, func) in sorted(_gauges.items()):
+        try:
+            message += f"\n{name}: {await _gauge_value(func)}"
+        except Exception as e:
+            message += f"\n{name}: xato ({e})"
+    return message
+
+
+async def _serve(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode(errors="replace").split()
+        if len(parts) >= 2 and parts[1].split("?")[0] == "/metrics":
+            body = (await render_prometheus()).encode()
+            status = "200 OK"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host, port):
+    """/metrics endpoint'ini bot event loop'ida ishga tushiradi."""
+    server = await asyncio.start_server(_serve, host, port)
+    print(f"Metrikalar: http://{host}:{port}/metrics")
+    return server
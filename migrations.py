@@ -0,0 +1,281 @@
+"""Versiyalangan sxema migratsiyalari.
+
+Har bir migratsiya bir marta, tartib bilan bajariladi va `schema_version`
+jadvaliga yoziladi. Migratsiyalar idempotent yoziladi: yangi bazada
+1-migratsiya jadvallarni joriy modellardan yaratadi, keyingilari esa
+eski bazalarda yetishmayotgan narsalarni qo'shadi.
+
+    python migrations.py          # barcha migratsiyalarni qo'llash
+    python migrations.py status   # joriy versiya
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+MIGRATIONS = []
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Bir nechta worker bir vaqtda migratsiya qilmasligi uchun Postgres advisory lock kaliti.
+MIGRATION_LOCK_ID = 7_246_315
+
+
+def migration(version, description):
+    """Funksiyani `version` raqamli migratsiya sifatida ro'yxatga oladi."""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    """Bazadagi sxema versiyasi (jadval bo'lmasa 0)."""
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def sync_indexes(conn):
+    """Modellarda e'lon qilingan, lekin bazada yo'q indekslarni yaratadi."""
+    from db_manager import Base
+
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+
+
+def is_up_to_date(engine):
+    """Sxema so'nggi versiyadami: bitta SELECT, lock va jadvallarni tekshirishsiz."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() == latest_version()
+    except SQLAlchemyError:
+        # schema_version hali yo'q: to'liq yo'l bilan migratsiya qilinadi.
+        return False
+
+
+def migrate(engine=None):
+    """Hali qo'llanmagan migratsiyalarni bajaradi va yakuniy versiyani qaytaradi."""
+    if engine is None:
+        from db_manager import get_engine
+        engine = get_engine()
+
+    # Odatiy qayta ishga tushirishda sxema allaqachon so'nggi versiyada bo'ladi.
+    if is_up_to_date(engine):
+        return latest_version()
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        version_metadata.create_all(conn)
+        current = current_version(conn)
+        for version, description, func in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"Migratsiya {version}: {description}")
+            func(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            current = version
+    return current
+
+
+@migration(1, "asosiy jadvallar")
+def create_tables(conn):
+    from db_manager import Base
+    Base.metadata.create_all(conn)
+
+
+@migration(2, "qidiruv indekslari: questions.test_id va reyting indekslari (modeldagi yetishmayotgan indekslar)")
+def add_lookup_indexes(conn):
+    sync_indexes(conn)
+
+
+@migration(3, "monthly_scores jadvalini mavjud natijalardan to'ldirish")
+def backfill_monthly_scores(conn):
+    from db_manager import MonthlyScore, rebuild_monthly_scores
+
+    db = Session(bind=conn)
+    if db.query(MonthlyScore).first() is None:
+        rebuild_monthly_scores(db)
+    db.close()
+
+
+@migration(4, "questions.test_id uchun ON DELETE CASCADE")
+def cascade_question_fk(conn):
+    if conn.dialect.name != "postgresql":
+        # SQLite ALTER CONSTRAINT ni qo'llamaydi; yangi jadvallar modeldan cascade bilan yaratiladi.
+        return
+    for fk in inspect(conn).get_foreign_keys("questions"):
+        if fk["referred_table"] != "tests":
+            continue
+        if (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+            return
+        conn.execute(text(f'ALTER TABLE questions DROP CONSTRAINT "{fk["name"]}"'))
+    conn.execute(text(
+        "DELETE FROM questions WHERE test_id IS NOT NULL AND test_id NOT IN (SELECT id FROM tests)"
+    ))
+    conn.execute(text(
+        "ALTER TABLE questions ADD CONSTRAINT questions_test_id_fkey "
+        "FOREIGN KEY (test_id) REFERENCES tests (id) ON DELETE CASCADE"
+    ))
+
+
+@migration(5, "questions.options_json ni JSONB ga o'tkazish")
+def options_to_jsonb(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    for column in inspect(conn).get_columns("questions"):
+        if column["name"] == "options_json" and column["type"].__class__.__name__.upper() != "JSONB":
+            conn.execute(text(
+                "ALTER TABLE questions ALTER COLUMN options_json TYPE JSONB USING options_json::jsonb"
+            ))
+
+
+
+@migration(6, "question_stats va question_option_stats hisoblagich jadvallari")
+def create_question_stats(conn):
+    from db_manager import Base, QuestionStat, QuestionOptionStat
+
+    Base.metadata.create_all(conn, tables=[QuestionStat.__table__, QuestionOptionStat.__table__])
+
+
+@migration(7, "quiz_results ni oylar bo'yicha partitsiyalash, natijalar yig'indisi jadvallari")
+def partition_quiz_results(conn):
+    from db_manager import Base, QuizResultRollup, ResultMonth
+
+    Base.metadata.create_all(conn, tables=[QuizResultRollup.__table__, ResultMonth.__table__])
+    if conn.dialect.name != "postgresql":
+        # SQLite partitsiyalarni qo'llamaydi; eski oylar retention.py da DELETE bilan tozalanadi.
+        return
+    partitioned = conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'quiz_results'::regclass"
+    )).first()
+    if partitioned:
+        return
+
+    from retention import partition_name
+
+    conn.execute(text("ALTER TABLE quiz_results RENAME TO quiz_results_unpartitioned"))
+    conn.execute(text(
+        "UPDATE quiz_results_unpartitioned "
+        "SET month_year = COALESCE(to_char(date_taken, 'YYYY-MM'), '1970-01') WHERE month_year IS NULL"
+    ))
+    # Partitsiya kaliti birlamchi kalitda bo'lishi shart, shuning uchun PK (id, month_year).
+    conn.execute(text(
+        "CREATE TABLE quiz_results ("
+        " id BIGINT NOT NULL DEFAULT nextval('quiz_results_id_seq'),"
+        " user_id BIGINT, test_id BIGINT, score BIGINT, total_questions BIGINT,"
+        " date_taken TIMESTAMP WITHOUT TIME ZONE, month_year VARCHAR NOT NULL"
+        ") PARTITION BY LIST (month_year)"
+    ))
+    conn.execute(text("CREATE TABLE quiz_results_default PARTITION OF quiz_results DEFAULT"))
+    months = conn.execute(text("SELECT DISTINCT month_year FROM quiz_results_unpartitioned")).scalars()
+    for month_key in months:
+        try:
+            name = partition_name(month_key)
+        except ValueError:
+            continue  # noto'g'ri formatdagi oylar default partitsiyada qoladi
+        conn.execute(text(
+            f'CREATE TABLE "{name}" PARTITION OF quiz_results '
+            f"FOR VALUES IN ('{month_key}')"
+        ))
+    conn.execute(text(
+        "INSERT INTO quiz_results (id, user_id, test_id, score, total_questions, date_taken, month_year) "
+        "SELECT id, user_id, test_id, score, total_questions, date_taken, month_year "
+        "FROM quiz_results_unpartitioned"
+    ))
+    conn.execute(text("ALTER SEQUENCE quiz_results_id_seq OWNED BY quiz_results.id"))
+    conn.execute(text("DROP TABLE quiz_results_unpartitioned"))
+    conn.execute(text("ALTER TABLE quiz_results ADD PRIMARY KEY (id, month_year)"))
+    sync_indexes(conn)
+
+
+@migration(8, "broadcasts: ommaviy xabar yuborish ishlari")
+def create_broadcasts(conn):
+    from db_manager import Base, Broadcast
+
+    Base.metadata.create_all(conn, tables=[Broadcast.__table__])
+
+
+@migration(9, "quiz_results: test reytingi va shaxsiy tarix uchun qoplovchi indekslar")
+def covering_result_indexes(conn):
+    # Eski natijalarda date_taken bo'sh bo'lishi mumkin: keyset kursori uchun oy boshi yoziladi.
+    months = conn.execute(text("SELECT DISTINCT month_year FROM quiz_results WHERE date_taken IS NULL")).scalars()
+    for month_key in list(months):
+        try:
+            taken = datetime.strptime(month_key, "%Y-%m")
+        except (TypeError, ValueError):
+            taken = datetime(1970, 1, 1)
+        condition = "month_year IS NULL" if month_key is None else "month_year = :month"
+        conn.execute(
+            text(f"UPDATE quiz_results SET date_taken = :taken WHERE date_taken IS NULL AND {condition}"),
+            {"taken": taken, "month": month_key},
+        )
+    # Yangi indekslarning boshi bilan bir xil bo'lgan bitta ustunli indekslar endi ortiqcha.
+    conn.execute(text("DROP INDEX IF EXISTS ix_quiz_results_user_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_quiz_results_test_id"))
+    sync_indexes(conn)
+
+
+
+@migration(10, "journal_segments: natijalar jurnali segmentlarining commit belgilari")
+def create_journal_segments(conn):
+    from db_manager import Base, JournalSegment
+
+    Base.metadata.create_all(conn, tables=[JournalSegment.__table__])
+
+
+@migration(11, "broadcasts: owner va lease_until - yuborishni bitta worker bajaradi")
+def broadcast_lease(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("broadcasts")}
+    if "owner" not in columns:
+        conn.execute(text("ALTER TABLE broadcasts ADD COLUMN owner VARCHAR"))
+    if "lease_until" not in columns:
+        conn.execute(text("ALTER TABLE broadcasts ADD COLUMN lease_until TIMESTAMP"))
+
+
+@migration(12, "catalogue_version: boshqa worker'lar katalog keshini yangilashi uchun versiya")
+def create_catalogue_version(conn):
+    from db_manager import Base, CatalogueVersion
+
+    Base.metadata.create_all(conn, tables=[CatalogueVersion.__table__])
+    if conn.execute(select(CatalogueVersion.version).where(CatalogueVersion.id == 1)).first() is None:
+        conn.execute(CatalogueVersion.__table__.insert().values(id=1, version=0))
+
+
+@migration(13, "tests.version: qayta import qilingan testlarni boshqa jarayonlar keshida aniqlash")
+def test_version(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("tests")}
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE tests ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+if __name__ == "__main__":
+    from db_manager import get_engine
+
+    engine = get_engine()
+    if sys.argv[1:] == ["status"]:
+        with engine.connect() as conn:
+            print(f"Sxema versiyasi: {current_version(conn)} / {latest_version()}")
+    else:
+        print(f"Sxema versiyasi: {migrate(engine)}")
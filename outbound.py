@@ -0,0 +1,174 @@
+"""Telegram Bot API'ga chiquvchi so'rovlar rejalashtiruvchisi.
+
+Har bir chat uchun alohida va butun bot uchun umumiy token bucket'lar
+bilan so'rovlarni Telegram limitlaridan oshirmay yuboradi. Umumiy
+navbatda quizdagi javoblar reyting kabi og'ir xabarlardan oldin o'tadi,
+RetryAfter kelsa so'rov ko'rsatilgan vaqtdan keyin qayta yuboriladi.
+
+Ustuvorlik har bir chaqiruvda `rate_limit_args` orqali beriladi:
+
+    await query.edit_message_text(text, rate_limit_args=PRIORITY_ANSWER)
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import config
+
+PRIORITY_ANSWER = 0  # quiz davomidagi javob va keyingi savol
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2  # reyting, ro'yxatlar, ommaviy xabarlar
+
+OUTBOUND_GLOBAL_RATE = getattr(config, "OUTBOUND_GLOBAL_RATE", 30)  # xabar/s
+OUTBOUND_GLOBAL_BURST = getattr(config, "OUTBOUND_GLOBAL_BURST", 30)
+OUTBOUND_CHAT_RATE = getattr(config, "OUTBOUND_CHAT_RATE", 1)  # xabar/s, shaxsiy chat
+OUTBOUND_CHAT_BURST = getattr(config, "OUTBOUND_CHAT_BURST", 3)
+OUTBOUND_GROUP_RATE = getattr(config, "OUTBOUND_GROUP_RATE", 20 / 60)  # xabar/s, guruh
+OUTBOUND_MAX_RETRIES = getattr(config, "OUTBOUND_MAX_RETRIES", 3)
+
+# Shuncha chat bucket'idan oshsa, to'liq tiklanganlari o'chiriladi.
+MAX_CHAT_BUCKETS = 10_000
+
+
+class TokenBucket:
+    """GCRA ko'rinishidagi token bucket: faqat navbatdagi bo'sh vaqtni saqlaydi."""
+
+    __slots__ = ("interval", "tolerance", "ready_at")
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1.0 / rate
+        self.tolerance = (max(burst, 1) - 1) * self.interval
+        self.ready_at = 0.0
+
+    def reserve(self, now):
+        """Token band qiladi va undan foydalanish uchun kutish kerak bo'lgan vaqtni qaytaradi."""
+        ready_at = max(self.ready_at, now)
+        self.ready_at = ready_at + self.interval
+        return max(0.0, ready_at - self.tolerance - now)
+
+    def delay(self, now):
+        """Token band qilmasdan, keyingisigacha qolgan vaqt."""
+        return max(0.0, self.ready_at - self.tolerance - now)
+
+    def pause(self, until):
+        """`until` gacha yangi token bermaydi (RetryAfter uchun)."""
+        self.ready_at = max(self.ready_at, until + self.tolerance)
+
+    def idle(self, now):
+        return self.ready_at + self.tolerance <= now
+
+
+def retry_after_seconds(exc):
+    retry_after = exc.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Chat va global limitlar, ustuvorlik navbati va RetryAfter'dan keyin qayta urinish."""
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, global_burst=OUTBOUND_GLOBAL_BURST,
+                 chat_rate=OUTBOUND_CHAT_RATE, chat_burst=OUTBOUND_CHAT_BURST,
+                 group_rate=OUTBOUND_GROUP_RATE, max_retries=OUTBOUND_MAX_RETRIES, clock=time.monotonic):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.clock = clock
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._pump = None
+        self.counters = {"sent": 0, "delayed": 0, "retry_after": 0, "retried": 0, "failed": 0}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+        for _, _, waiter in self._waiters:
+            waiter.cancel()
+        self._waiters.clear()
+
+    def stats(self):
+        return dict(self.counters, queued=len(self._waiters), chats=len(self._chats))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                now = self.clock()
+                for key in [key for key, b in self._chats.items() if b.idle(now)]:
+                    del self._chats[key]
+            group = isinstance(chat_id, str) or chat_id < 0
+            if group:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority):
+        """Avval chat limiti, keyin ustuvorlik bo'yicha umumiy limit."""
+        wait = self._chat_bucket(chat_id).reserve(self.clock())
+        if wait:
+            self.counters["delayed"] += 1
+            await asyncio.sleep(wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._drain())
+        await waiter
+
+    async def _drain(self):
+        """Umumiy bucket ruxsat berganda navbat boshidagi so'rovni o'tkazadi."""
+        while self._waiters:
+            wait = self._global.delay(self.clock())
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self._global.reserve(self.clock())
+            waiter.set_result(None)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = PRIORITY_DEFAULT if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+        if isinstance(chat_id, str):
+            try:
+                chat_id = int(chat_id)
+            except ValueError:
+                pass
+
+        for attempt in range(self.max_retries + 1):
+            # answerCallbackQuery kabi chatga yozilmaydigan so'rovlar kutmaydi.
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.counters["retry_after"] += 1
+                if attempt == self.max_retries:
+                    self.counters["failed"] += 1
+                    print(f"RetryAfter: {endpoint} {self.max_retries} marta qayta urinishdan keyin ham rad etildi")
+                    raise
+                self.counters["retried"] += 1
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(self.clock() + retry_after_seconds(e))
+                else:
+                    await asyncio.sleep(retry_after_seconds(e))
+                continue
+            self.counters["sent"] += 1
+            return result
@@ -1,48 +1,70 @@
 import re
 import random
 
-def parse_text_to_quiz(text):
+QUESTION_START_REGEX = re.compile(r"^\d+\.\s*(.*)")
+
+
+def iter_quiz(lines, errors=None):
     """
-    Kiritilgan matnni savol-javoblar ro'yxatiga tahlil qiladi.
+    Qatorlarni birma-bir o'qib, tayyor bo'lgan savollarni yield qiladi.
     Savollar '1.', '2.', ... bilan boshlanadi.
     To'g'ri javob '*' bilan boshlanadi.
+    errors ro'yxati berilsa, tashlab yuborilgan qatorlar (qator_raqami, sabab)
+    ko'rinishida unga qo'shiladi.
     """
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    
-    quizzes = []
     current_question_data = None
-    
-    QUESTION_START_REGEX = re.compile(r"^\d+\.\s*(.*)")
-    
-    for line in lines:
+    question_line = 0
+
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+
         match = QUESTION_START_REGEX.match(line)
-        
+
         if match:
             if current_question_data:
-                if current_question_data['options']:
-                    quizzes.append(current_question_data)
-            
+                if current_question_data['options'] and current_question_data['correct_answer']:
+                    yield current_question_data
+                elif errors is not None:
+                    errors.append((question_line, "savolda to'g'ri javob yoki variantlar yo'q"))
+
             current_question_data = {
                 'question': match.group(1).strip(),
                 'options': [],
                 'correct_answer': None
             }
+            question_line = line_no
         elif line.startswith('*'):
-        
+
             if current_question_data:
                 current_question_data['correct_answer'] = line[1:].strip()
+            elif errors is not None:
+                errors.append((line_no, "javob savoldan oldin kelgan"))
 
         elif current_question_data and current_question_data['correct_answer'] is not None:
             current_question_data['options'].append(line)
-    
-    if current_question_data and current_question_data['correct_answer'] is not None:
-        quizzes.append(current_question_data)
-        
-    return [q for q in quizzes if q['correct_answer']]
+        elif errors is not None:
+            errors.append((line_no, "qator hech bir savolga tegishli emas (variantlar to'g'ri javobdan keyin yozilishi kerak)"))
+
+    if current_question_data:
+        if current_question_data['correct_answer']:
+            yield current_question_data
+        elif errors is not None:
+            errors.append((question_line, "savolda to'g'ri javob yo'q"))
+
+
+def parse_text_to_quiz(text):
+    """
+    Kiritilgan matnni savol-javoblar ro'yxatiga tahlil qiladi.
+    Savollar '1.', '2.', ... bilan boshlanadi.
+    To'g'ri javob '*' bilan boshlanadi.
+    """
+    return list(iter_quiz(text.split('\n')))
 
 def format_question_for_db(question_data):
     """
     DBga saqlash uchun (db_manager ichida amalga oshiriladi, bu funksiyani o'chirib tashlaymiz
     va db_manager.py ichida barcha logikani yozamiz, chunki bizga variantlarni aralashtirish kerak).
     """
-    pass
\ No newline at end of file
+    pass
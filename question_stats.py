@@ -0,0 +1,103 @@
+import asyncio
+
+import config
+from db_manager import run_db, save_question_stats
+
+QUESTION_STATS_FLUSH_INTERVAL = getattr(config, "QUESTION_STATS_FLUSH_INTERVAL", 5.0)
+
+
+class QuestionStatsBuffer:
+    """Savollar bo'yicha hisoblagichlarni xotirada yig'ib, DB ga davriy qo'shib yozadi.
+
+    Javob berish yo'lida DB ga murojaat bo'lmaydi: har bir ko'rsatish va
+    javob faqat lug'atdagi sonni oshiradi. Jarayon kutilmaganda to'xtasa,
+    oxirgi interval hisoblari yo'qoladi (natijalarga ta'sir qilmaydi).
+    """
+
+    def __init__(self, interval=QUESTION_STATS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._questions = {}  # question_id -> [test_id, shown, answered, correct]
+        self._options = {}  # (question_id, option) -> chosen
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.flushed = 0
+
+    def _row(self, test_id, question_id):
+        row = self._questions.get(question_id)
+        if row is None:
+            row = self._questions[question_id] = [test_id, 0, 0, 0]
+        return row
+
+    def shown(self, test_id, question):
+        if question.question_id is not None:
+            self._row(test_id, question.question_id)[1] += 1
+
+    def answered(self, test_id, question, option, correct):
+        """option - variant raqami (0 - to'g'ri javob)."""
+        if question.question_id is None:
+            return
+        row = self._row(test_id, question.question_id)
+        row[2] += 1
+        row[3] += bool(correct)
+        key = (question.question_id, option)
+        self._options[key] = self._options.get(key, 0) + 1
+
+    def discard_test(self, test_id):
+        """O'chirilgan testning hali yozilmagan hisoblarini tashlab yuboradi."""
+        dropped = [question_id for question_id, row in self._questions.items() if row[0] == test_id]
+        for question_id in dropped:
+            del self._questions[question_id]
+        dropped = set(dropped)
+        for key in [key for key in self._options if key[0] in dropped]:
+            del self._options[key]
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        """Yig'ilgan hisoblarni bitta tranzaksiyada DB ga qo'shadi."""
+        async with self._lock:
+            questions, self._questions = self._questions, {}
+            options, self._options = self._options, {}
+            if not questions and not options:
+                return
+            question_rows = [
+                {'question_id': question_id, 'test_id': test_id, 'shown': shown, 'answered': answered, 'correct': correct}
+                for question_id, (test_id, shown, answered, correct) in questions.items()
+            ]
+            option_rows = [
+                {'question_id': question_id, 'option': option, 'chosen': chosen}
+                for (question_id, option), chosen in options.items()
+            ]
+            try:
+                await run_db(save_question_stats, question_rows, option_rows)
+            except Exception as e:
+                print(f"Savol statistikasini yozishda xatolik: {e}")
+                # Yozilmagan hisoblar keyingi urinishga qaytariladi.
+                for question_id, (test_id, shown, answered, correct) in questions.items():
+                    row = self._row(test_id, question_id)
+                    row[1] += shown
+                    row[2] += answered
+                    row[3] += correct
+                for key, chosen in options.items():
+                    self._options[key] = self._options.get(key, 0) + chosen
+                return
+            self.flushed += len(question_rows)
+
+    def stats(self):
+        return {"pending_questions": len(self._questions), "pending_options": len(self._options), "flushed": self.flushed}
@@ -0,0 +1,270 @@
+import bisect
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import config
+from callback_data import keyed_digest
+
+CachedQuestion = namedtuple("CachedQuestion", "question options correct_answer arrangements question_id")
+QuestionSet = namedtuple("QuestionSet", "test_id name questions size version")
+CatalogueEntry = namedtuple("CatalogueEntry", "test_id name question_count")
+
+CACHE_MAX_TESTS = getattr(config, "CACHE_MAX_TESTS", 256)
+CACHE_MAX_BYTES = getattr(config, "CACHE_MAX_BYTES", 64 * 1024 * 1024)
+# Boshqa jarayonlardagi (worker, transfer.py import) o'zgarishlar shuncha sekundda bir tekshiriladi.
+CATALOGUE_CHECK_INTERVAL = getattr(config, "CATALOGUE_CHECK_INTERVAL", 5.0)
+
+ANSWER_CHOICES = 4
+OPTION_LABELS = "ABCDEF"
+# Har bir savol uchun oldindan tayyorlangan variant joylashuvlari soni.
+ARRANGEMENTS_PER_QUESTION = 8
+
+
+def make_question(question, options, correct_answer, question_id=None):
+    """Savolni keshga tayyorlaydi: variantlar joylashuvi va to'g'ri slot oldindan hisoblanadi.
+
+    arrangements - (tugma matnlari, to'g'ri slot, variant raqamlari) uchliklari;
+    variant raqami 0 - to'g'ri javob, k - options[k - 1]; sessiya ulardan birini tanlaydi.
+    Joylashuvlar maxfiy kalitdan olinadi: savol matnini bilgan holda ularni
+    qayta hosil qilib to'g'ri javobni topib bo'lmaydi.
+    """
+    options = tuple(options)
+    slots = min(ANSWER_CHOICES, len(options) + 1)
+    key = str(question_id) if question_id is not None else question
+    rng = random.Random(keyed_digest(b"arrangement", key.encode()))
+    labelled = {}
+    arrangements = []
+    for i in range(ARRANGEMENTS_PER_QUESTION):
+        choices = rng.sample(range(1, len(options) + 1), slots - 1)
+        correct_slot = rng.randrange(slots)
+        choices.insert(correct_slot, 0)
+        labels = tuple(
+            labelled.setdefault((slot, choice), f"{OPTION_LABELS[slot]}. {options[choice - 1] if choice else correct_answer}")
+            for slot, choice in enumerate(choices)
+        )
+        arrangements.append((labels, correct_slot, tuple(choices)))
+    return CachedQuestion(question, options, correct_answer, tuple(arrangements), question_id)
+
+
+def estimate_size(questions):
+    """Savollar to'plamining xotiradagi taxminiy hajmi (baytlarda)."""
+    size = sys.getsizeof(questions)
+    for q in questions:
+        size += sys.getsizeof(q) + sys.getsizeof(q.question) + sys.getsizeof(q.correct_answer)
+        size += sys.getsizeof(q.options) + sum(sys.getsizeof(opt) for opt in q.options)
+        labels = {id(label): label for arrangement in q.arrangements for label in arrangement[0]}
+        size += sys.getsizeof(q.arrangements) + len(q.arrangements) * 2 * sys.getsizeof(q.arrangements[0][0])
+        size += sum(sys.getsizeof(label) for label in labels.values())
+    return size
+
+
+class QuestionCache:
+    """Tahlil qilingan, o'zgarmas savollar to'plamlari uchun LRU kesh."""
+
+    def __init__(self, max_tests=CACHE_MAX_TESTS, max_bytes=CACHE_MAX_BYTES):
+        self.max_tests = max_tests
+        self.max_bytes = max_bytes
+        self._by_id = OrderedDict()
+        self._ids_by_name = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        """Test nomi bo'yicha to'plamni qaytaradi (yo'q bo'lsa None)."""
+        with self._lock:
+            test_id = self._ids_by_name.get(name)
+            return self._lookup(test_id)
+
+    def get_by_id(self, test_id):
+        """Test ID bo'yicha to'plamni qaytaradi (yo'q bo'lsa None)."""
+        with self._lock:
+            return self._lookup(test_id)
+
+    def _lookup(self, test_id):
+        qset = self._by_id.get(test_id) if test_id is not None else None
+        if qset is None:
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(test_id)
+        self.hits += 1
+        return qset
+
+    def put(self, test_id, name, questions, version=1):
+        """To'plamni keshga qo'yadi va eng eski yozuvlarni chiqarib tashlaydi.
+
+        version - tests.version: test qayta import qilinganda oshadi.
+        """
+        questions = tuple(questions)
+        qset = QuestionSet(test_id, name, questions, estimate_size(questions), version)
+        if qset.size > self.max_bytes:
+            return qset
+
+        with self._lock:
+            self._remove(test_id)
+            self._by_id[test_id] = qset
+            self._ids_by_name[name] = test_id
+            self._bytes += qset.size
+            while len(self._by_id) > self.max_tests or self._bytes > self.max_bytes:
+                oldest_id = next(iter(self._by_id))
+                self._remove(oldest_id)
+        return qset
+
+    def invalidate(self, test_id=None, name=None):
+        """Test o'zgarganda (qo'shilganda/o'chirilganda) keshdan olib tashlaydi."""
+        with self._lock:
+            if test_id is None and name is not None:
+                test_id = self._ids_by_name.get(name)
+            if test_id is not None:
+                self._remove(test_id)
+            if name is not None:
+                self._ids_by_name.pop(name, None)
+
+    def versions(self):
+        """Keshdagi to'plamlar: test_id -> version."""
+        with self._lock:
+            return {test_id: qset.version for test_id, qset in self._by_id.items()}
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._ids_by_name.clear()
+            self._bytes = 0
+
+    def _remove(self, test_id):
+        qset = self._by_id.pop(test_id, None)
+        if qset is None:
+            return
+        self._bytes -= qset.size
+        if self._ids_by_name.get(qset.name) == test_id:
+            del self._ids_by_name[qset.name]
+
+    def stats(self):
+        """Kesh statistikasi: hit/miss, yozuvlar soni va hajmi."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "tests": len(self._by_id),
+                "bytes": self._bytes,
+            }
+
+
+class TTLCache:
+    """Qisqa muddatli kesh: qiymatlar ttl sekunddan keyin eskiradi."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._items = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._items.clear()
+        else:
+            self._items.pop(key, None)
+
+
+class TestCatalogue:
+    """Testlar ro'yxatining xotiradagi nusxasi: nom bo'yicha saralangan,
+    test qo'shilganda yoki o'chirilganda bekor qilinadi.
+
+    Boshqa jarayonlardagi o'zgarishlar uchun refresh() DB dagi katalog
+    versiyasini check_interval sekundda ko'pi bilan bir marta tekshiradi.
+    """
+
+    def __init__(self, check_interval=CATALOGUE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries = None
+        self._keys = None
+        self._positions = None
+        self._generation = 0
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries = None
+
+    def refresh(self, version_loader):
+        """Tekshirish vaqti kelgan bo'lsa version_loader() ni o'qiydi; versiya o'zgargan bo'lsa True."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+        version = version_loader()
+        with self._lock:
+            if version == self._version:
+                return False
+            changed = self._version is not None
+            self._version = version
+            self._generation += 1
+            self._entries = None
+        return changed
+
+    def snapshot(self, loader):
+        """Joriy nusxani qaytaradi; bo'lmasa loader() orqali yuklaydi."""
+        with self._lock:
+            if self._entries is not None:
+                return self._entries, self._keys, self._positions
+            generation = self._generation
+
+        entries = sorted(loader(), key=lambda e: (e.name.casefold(), e.test_id))
+        keys = [e.name.casefold() for e in entries]
+        positions = {e.test_id: i for i, e in enumerate(entries)}
+        with self._lock:
+            # Yuklash paytida test qo'shilgan/o'chirilgan bo'lsa, eski nusxa saqlanmaydi.
+            if generation == self._generation:
+                self._entries, self._keys, self._positions = entries, keys, positions
+        return entries, keys, positions
+
+    def page(self, loader, anchor_id=None, backward=False, prefix="", limit=10):
+        """Keyset sahifalash: langar testdan keyingi (yoki oldingi) limit ta yozuv.
+
+        (entries, prev_anchor, next_anchor) qaytaradi; anchor None bo'lsa
+        o'sha yo'nalishda sahifa yo'q.
+        """
+        entries, keys, positions = self.snapshot(loader)
+        prefix = prefix.casefold()
+        lo = bisect.bisect_left(keys, prefix)
+        hi = bisect.bisect_left(keys, prefix + "\U0010ffff") if prefix else len(keys)
+
+        position = positions.get(anchor_id)
+        if position is None or not lo <= position < hi:
+            start = lo
+        elif backward:
+            start = max(lo, position - limit)
+        else:
+            start = position + 1
+        end = min(hi, start + limit)
+
+        page = entries[start:end]
+        prev_anchor = page[0].test_id if page and start > lo else None
+        next_anchor = page[-1].test_id if page and end < hi else None
+        return page, prev_anchor, next_anchor
+
+
+question_cache = QuestionCache()
+test_catalogue = TestCatalogue()
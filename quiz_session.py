@@ -0,0 +1,94 @@
+import random
+import time
+from array import array
+
+
+class QuizSession:
+    """Bitta foydalanuvchining davom etayotgan quiz holati.
+
+    Savollar o'zi saqlanmaydi: sessiya keshdagi umumiy to'plamga havola
+    va savollar tartibining ixcham permutatsiyasini saqlaydi. Variantlar
+    joylashuvi faqat `seed` dan kelib chiqadi.
+    """
+
+    __slots__ = (
+        "test_id", "test_name", "questions", "order", "index", "correct", "incorrect",
+        "nonce", "seed", "chat_id", "message_id", "started_at", "asked_at",
+    )
+
+    step = "in_quiz"
+
+    def __init__(self, test_id, test_name, questions):
+        self.test_id = test_id
+        self.test_name = test_name
+        self.questions = questions
+        order = list(range(len(questions)))
+        random.shuffle(order)
+        self.order = array("H" if len(order) <= 0xFFFF else "I", order)
+        self.index = 0
+        self.correct = 0
+        self.incorrect = 0
+        self.nonce = random.getrandbits(32)
+        # nonce callback_data da ko'rinadi, shuning uchun joylashuv alohida maxfiy seed'dan olinadi.
+        self.seed = random.getrandbits(32)
+        # Taymer tugaganda tahrirlanadigan xabar va vaqt belgilari (time.time()).
+        self.chat_id = None
+        self.message_id = None
+        self.started_at = self.asked_at = time.time()
+
+    def __len__(self):
+        return len(self.order)
+
+    def current_question(self):
+        """Joriy indeksdagi savolni qaytaradi."""
+        return self.questions[self.order[self.index]]
+
+    def arrangement(self):
+        """Joriy savol uchun (tugma matnlari, to'g'ri slot, variant raqamlari)."""
+        arrangements = self.current_question().arrangements
+        # seed va pozitsiyadan olingan 32-bitli aralashtirish (xorshift-multiply).
+        x = (self.seed ^ (self.index * 0x9E3779B1)) & 0xFFFFFFFF
+        x = ((x ^ (x >> 16)) * 0x45D9F3B) & 0xFFFFFFFF
+        return arrangements[(x ^ (x >> 16)) % len(arrangements)]
+
+    @property
+    def answered(self):
+        return self.correct + self.incorrect
+
+    def to_dict(self):
+        """Sessiyani saqlash uchun oddiy lug'atga aylantiradi."""
+        return {
+            "step": self.step,
+            "test_id": self.test_id,
+            "test_name": self.test_name,
+            "order": self.order.tolist(),
+            "index": self.index,
+            "correct": self.correct,
+            "incorrect": self.incorrect,
+            "nonce": self.nonce,
+            "seed": self.seed,
+            "chat_id": self.chat_id,
+            "message_id": self.message_id,
+            "started_at": self.started_at,
+            "asked_at": self.asked_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data, questions):
+        """to_dict() natijasidan va keshdagi savollardan sessiyani tiklaydi."""
+        session = cls.__new__(cls)
+        session.test_id = data["test_id"]
+        session.test_name = data["test_name"]
+        session.questions = questions
+        order = data["order"]
+        session.order = array("H" if len(order) <= 0xFFFF else "I", order)
+        session.index = data["index"]
+        session.correct = data["correct"]
+        session.incorrect = data["incorrect"]
+        session.nonce = data["nonce"]
+        session.seed = data.get("seed", 0)
+        session.chat_id = data.get("chat_id")
+        session.message_id = data.get("message_id")
+        session.started_at = data.get("started_at") or time.time()
+        session.asked_at = data.get("asked_at") or session.started_at
+        return session
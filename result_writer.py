@@ -0,0 +1,260 @@
+import asyncio
+import glob
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from db_manager import run_db, save_quiz_results_batch, committed_journal_segments
+
+RESULT_WRITE_BEHIND = getattr(config, "RESULT_WRITE_BEHIND", False)
+RESULT_BATCH_SIZE = getattr(config, "RESULT_BATCH_SIZE", 200)
+RESULT_FLUSH_INTERVAL = getattr(config, "RESULT_FLUSH_INTERVAL", 1.0)
+RESULT_JOURNAL_PATH = getattr(config, "RESULT_JOURNAL_PATH", None)
+
+
+def make_result(user_id, test_id, score, total_q):
+    """Navbatga qo'yiladigan natija yozuvini tayyorlaydi."""
+    now = datetime.utcnow()
+    return {
+        'user_id': user_id,
+        'test_id': test_id,
+        'score': score,
+        'total_questions': total_q,
+        'date_taken': now,
+        'month_year': now.strftime("%Y-%m"),
+    }
+
+
+class ResultWriter:
+    """Quiz natijalarini navbatga yig'ib, DB ga partiyalab yozadi.
+
+    Navbat batch_size ga yetganda yoki har interval sekundda bo'shatiladi.
+    journal_path berilsa, har bir natija avval diskdagi jurnalga yoziladi
+    va bot qayta ishga tushganda DB ga yozilmagan natijalar tiklanadi.
+    Jurnalga yozish va fsync alohida thread'da guruhlab bajariladi: bitta
+    fsync davomida kelgan natijalar keyingi fsync'ga qo'shiladi, event loop
+    esa diskni kutmaydi. Natija navbatga faqat jurnalga yozilgandan keyin tushadi.
+    Jurnal segmentlarga bo'linadi: segment faqat undagi barcha natijalar
+    commit qilingandan keyin o'chiriladi. Segmentning birinchi qatoridagi noyob
+    kalit natijalar bilan bitta tranzaksiyada journal_segments ga yoziladi:
+    commit va fayl o'chirilishi orasida jarayon to'xtasa, qayta tiklash
+    natijalarni ikki marta yozmaydi. on_saved(batch) har bir partiya
+    commit qilingandan keyin chaqiriladi (masalan, keshni bekor qilish uchun).
+    """
+
+    def __init__(self, batch_size=RESULT_BATCH_SIZE, interval=RESULT_FLUSH_INTERVAL, journal_path=RESULT_JOURNAL_PATH,
+                 on_saved=None):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.journal_path = journal_path
+        self.on_saved = on_saved
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._stopping = False
+        self._retry = []
+        self._journal = None
+        self._journal_lock = asyncio.Lock()
+        self._journal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal") if journal_path else None
+        self._pending = []  # (natija, future) - keyingi fsync'ni kutayotganlar
+        self._syncing = False
+        self._segment = 0
+        self._segment_key = None
+        self._sealed = []  # (yo'l, kalit) - navbatdagi partiya bilan commit qilinadigan segmentlar
+        self._forget = []  # fayli o'chirilgan segment kalitlari (keyingi tranzaksiyada o'chiriladi)
+        self.flushed = 0
+        self.batches = 0
+        self.syncs = 0
+
+    async def start(self):
+        """Jurnaldagi yozilmagan natijalarni tiklaydi va fon vazifasini boshlaydi."""
+        if self.journal_path:
+            await self._replay_journal()
+            self._open_segment()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Fon vazifasini to'xtatadi va qolgan natijalarni yozadi."""
+        if self._task:
+            # Bekor qilish o'rniga signal: Python 3.11 da wait_for bilan bir vaqtga tushgan cancel yo'qolib, stop() osilib qolardi.
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._journal:
+            async with self._journal_lock:
+                self._journal.close()
+                self._journal = None
+            if not self._sealed and not self._retry:
+                os.remove(self._segment_path(self._segment))
+        if self._forget:
+            try:
+                await run_db(save_quiz_results_batch, [], (), self._forget)
+                self._forget = []
+            except Exception as e:
+                print(f"Jurnal belgilarini o'chirishda xatolik: {e}")
+        if self._journal_executor:
+            self._journal_executor.shutdown()
+
+    async def submit(self, user_id, test_id, score, total_q):
+        """Natijani navbatga qo'yadi (DB ga yozilishini kutmaydi, jurnal bo'lsa fsync'ni kutadi)."""
+        result = make_result(user_id, test_id, score, total_q)
+        if not self._journal:
+            self._enqueue(result)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((result, future))
+        if not self._syncing:
+            self._syncing = True
+            asyncio.create_task(self._sync_journal())
+        await future
+
+    def _enqueue(self, result):
+        self._queue.put_nowait(result)
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+
+    async def _sync_journal(self):
+        """Kutayotgan natijalarni bitta write + fsync bilan jurnalga yozadi, so'ng navbatga qo'yadi."""
+        loop = asyncio.get_running_loop()
+        async with self._journal_lock:
+            while self._pending:
+                pending, self._pending = self._pending, []
+                results = [result for result, _ in pending]
+                try:
+                    await loop.run_in_executor(self._journal_executor, self._write_journal, self._journal, results)
+                except Exception as e:
+                    for _, future in pending:
+                        future.set_exception(e)
+                    continue
+                self.syncs += 1
+                for result, future in pending:
+                    # Segment almashishidan oldin navbatda bo'lishi kerak (flush shu lock'ni oladi).
+                    self._enqueue(result)
+                    future.set_result(None)
+            self._syncing = False
+
+    @staticmethod
+    def _write_journal(journal, results):
+        journal.write("".join(json.dumps(result, default=str) + "\n" for result in results))
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            if not self._stopping:
+                await self.flush()
+
+    async def flush(self):
+        """Navbatdagi barcha natijalarni bitta tranzaksiyada yozadi."""
+        async with self._lock:
+            if self._journal:
+                # Yozilayotgan fsync tugaguncha kutiladi: yopilgan segmentdagi har bir natija shu partiyada.
+                async with self._journal_lock:
+                    batch = self._take_batch()
+                    if batch:
+                        await asyncio.get_running_loop().run_in_executor(self._journal_executor, self._rotate_segment)
+            else:
+                batch = self._take_batch()
+            if not batch:
+                return
+            sealed, self._sealed = self._sealed, []
+            forget = self._forget
+
+            try:
+                await run_db(save_quiz_results_batch, batch, [key for _, key in sealed], forget)
+            except Exception as e:
+                print(f"Natijalarni yozishda xatolik: {e}")
+                self._retry = batch
+                self._sealed = sealed + self._sealed
+                return
+
+            self.flushed += len(batch)
+            self.batches += 1
+            if self.on_saved:
+                self.on_saved(batch)
+            self._forget = []
+            for path, key in sealed:
+                os.remove(path)
+                self._forget.append(key)
+
+    def _take_batch(self):
+        batch, self._retry = self._retry, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _rotate_segment(self):
+        self._sealed.append((self._segment_path(self._segment), self._segment_key))
+        self._journal.close()
+        self._segment += 1
+        self._open_segment()
+
+    def _segment_path(self, segment):
+        return f"{self.journal_path}.{segment}"
+
+    def _open_segment(self):
+        self._segment_key = uuid.uuid4().hex
+        self._journal = open(self._segment_path(self._segment), "a", encoding="utf-8")
+        self._journal.write(json.dumps({'segment': self._segment_key}) + "\n")
+
+    async def _replay_journal(self):
+        segments = {}
+        for path in glob.glob(f"{glob.escape(self.journal_path)}.*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                segments[int(suffix)] = path
+        paths = [segments[n] for n in sorted(segments)]
+        contents = [self._read_segment(path) for path in paths]
+        keys = [key for key, _ in contents if key]
+        committed = await run_db(committed_journal_segments, keys)
+
+        results = [result for key, rows in contents if key not in committed for result in rows]
+        if results:
+            await run_db(save_quiz_results_batch, results, [key for key in keys if key not in committed])
+            print(f"Jurnaldan {len(results)} ta natija tiklandi.")
+        for path in paths:
+            os.remove(path)
+        self._forget = keys
+        if segments:
+            self._segment = max(segments) + 1
+
+    @staticmethod
+    def _read_segment(path):
+        """Segmentni (kalit, natijalar) ko'rinishida o'qiydi; kalitsiz eski segmentlarda kalit None."""
+        key, results = None, []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # Oxirgi qator yozilayotganda jarayon to'xtagan bo'lishi mumkin.
+                    continue
+                if 'segment' in result:
+                    key = result['segment']
+                    continue
+                result['date_taken'] = datetime.fromisoformat(result['date_taken'])
+                results.append(result)
+        return key, results
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() + len(self._retry),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "journal_syncs": self.syncs,
+        }
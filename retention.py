@@ -0,0 +1,290 @@
+"""quiz_results uchun saqlash siyosati: yopilgan oylarni yig'ish va arxivlash.
+
+Yopilgan (joriydan oldingi) oylarning xom natijalari quiz_result_rollups
+jadvaliga foydalanuvchi/test bo'yicha yig'iladi. RESULT_RETENTION_MONTHS
+oydan eski xom natijalar RESULT_ARCHIVE_DIR ga gzip JSONL fayl qilib
+yoziladi va jadvaldan o'chiriladi (Postgres'da butun partitsiya tashlanadi).
+Oylik reyting monthly_scores dan o'qiladi, shuning uchun arxivlash unga ta'sir qilmaydi.
+
+    python retention.py            # yig'ish va arxivlash
+    python retention.py status     # oylar holati
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+import config
+from db_manager import (
+    init_db, run_db, session_scope, _dialect_insert,
+    MonthlyScore, QuizResult, QuizResultRollup, ResultMonth, SAVE_CHUNK_SIZE,
+)
+
+RESULT_RETENTION_MONTHS = getattr(config, "RESULT_RETENTION_MONTHS", 6)  # xom natijalar saqlanadigan oylar
+RESULT_ARCHIVE_DIR = getattr(config, "RESULT_ARCHIVE_DIR", "archive")
+RETENTION_INTERVAL = getattr(config, "RETENTION_INTERVAL", None)  # soat; None - bot ichida ishlamaydi
+PARTITION_INTERVAL = 24  # soat; keyingi oy partitsiyasi shuncha vaqtda bir tekshiriladi
+
+# Bir vaqtda faqat bitta jarayon arxivlashi uchun Postgres advisory lock kaliti.
+RETENTION_LOCK_ID = 7_246_316
+
+MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+
+def month_key(moment):
+    return moment.strftime("%Y-%m")
+
+
+def shift_month(key, delta):
+    """"YYYY-MM" oyini delta oyga suradi."""
+    year, month = map(int, key.split("-"))
+    index = year * 12 + month - 1 + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def partition_name(key):
+    if not MONTH_RE.match(key or ""):
+        raise ValueError(f"Noto'g'ri oy: {key!r}")
+    return "quiz_results_" + key.replace("-", "_")
+
+
+def archive_path(directory, key, part):
+    suffix = f".{part}" if part else ""
+    return os.path.join(directory, f"quiz_results-{key}{suffix}.jsonl.gz")
+
+
+def is_partitioned(db):
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'quiz_results'::regclass"
+    )).first() is not None
+
+
+def ensure_partitions(db, months):
+    """Postgres'da berilgan oylar uchun partitsiyalarni oldindan yaratadi."""
+    if not is_partitioned(db):
+        return
+    for key in months:
+        name = partition_name(key)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            continue
+        # Default partitsiyaga shu oy natijalari tushib qolgan bo'lsa, partitsiya yaratib bo'lmaydi.
+        stray = db.execute(text(
+            "SELECT 1 FROM quiz_results_default WHERE month_year = :key LIMIT 1"
+        ), {"key": key}).first()
+        if stray:
+            print(f"{key} natijalari default partitsiyada, alohida partitsiya yaratilmadi")
+            continue
+        db.execute(text(f"CREATE TABLE \"{name}\" PARTITION OF quiz_results FOR VALUES IN ('{key}')"))
+    db.commit()
+
+
+def _add_rollups(db, key):
+    """Oyning xom natijalarini quiz_result_rollups dagi qatorlarga qo'shadi."""
+    totals = (
+        select(
+            QuizResult.month_year, QuizResult.user_id, QuizResult.test_id,
+            func.count(QuizResult.id),
+            func.coalesce(func.sum(QuizResult.score), 0),
+            func.coalesce(func.sum(QuizResult.total_questions), 0),
+        )
+        .where(QuizResult.month_year == key)
+        .group_by(QuizResult.month_year, QuizResult.user_id, QuizResult.test_id)
+    )
+    columns = ["month_year", "user_id", "test_id", "attempts", "score", "total_questions"]
+    insert = _dialect_insert(db)
+    if insert is None:
+        for row in db.execute(totals).all():
+            values = dict(zip(columns, row))
+            existing = db.get(QuizResultRollup, (key, values["user_id"], values["test_id"]))
+            if existing is None:
+                db.add(QuizResultRollup(**values))
+            else:
+                existing.attempts += values["attempts"]
+                existing.score += values["score"]
+                existing.total_questions += values["total_questions"]
+        db.flush()
+        return
+
+    stmt = insert(QuizResultRollup).from_select(columns, totals)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[QuizResultRollup.month_year, QuizResultRollup.user_id, QuizResultRollup.test_id],
+        set_={
+            "attempts": QuizResultRollup.attempts + stmt.excluded.attempts,
+            "score": QuizResultRollup.score + stmt.excluded.score,
+            "total_questions": QuizResultRollup.total_questions + stmt.excluded.total_questions,
+        },
+    ))
+
+
+def compact_month(db, state, rows):
+    """Arxivlanmagan oy yig'indisini xom natijalardan qaytadan hisoblaydi."""
+    db.query(QuizResultRollup).filter(QuizResultRollup.month_year == state.month_year).delete(synchronize_session=False)
+    _add_rollups(db, state.month_year)
+    state.compacted_rows = rows
+    state.compacted_at = datetime.utcnow()
+
+
+def _drop_month_rows(db, key):
+    name = partition_name(key) if MONTH_RE.match(key) else None
+    if name and is_partitioned(db) and db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        db.execute(text(f'ALTER TABLE quiz_results DETACH PARTITION "{name}"'))
+        db.execute(text(f'DROP TABLE "{name}"'))
+    else:
+        db.query(QuizResult).filter(QuizResult.month_year == key).delete(synchronize_session=False)
+
+
+def archive_month(db, state, directory):
+    """Oyning xom natijalarini faylga yozadi va jadvaldan o'chiradi; yozilgan qatorlar soni."""
+    key = state.month_year
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(directory, key, state.archive_parts)
+    query = (
+        select(QuizResult.__table__)
+        .where(QuizResult.month_year == key)
+        .order_by(QuizResult.id)
+        .execution_options(yield_per=SAVE_CHUNK_SIZE)
+    )
+    written = 0
+    # Fayl to'liq yozilib bo'lgandan keyingina natijalar o'chiriladi.
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=6) as stream:
+        for row in db.execute(query).mappings():
+            record = dict(row)
+            if record["date_taken"] is not None:
+                record["date_taken"] = record["date_taken"].isoformat()
+            stream.write(json.dumps(record) + "\n")
+            written += 1
+    os.replace(path + ".tmp", path)
+
+    _drop_month_rows(db, key)
+    state.archived_rows += written
+    state.archive_parts += 1
+    state.archived_at = datetime.utcnow()
+    return written
+
+
+def _lock(db):
+    """Joriy tranzaksiya davomida boshqa jarayonlarning arxivlashini kutdiradi (Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": RETENTION_LOCK_ID})
+
+
+def prepare_partitions(db, now=None):
+    """Joriy va keyingi oy partitsiyalarini yaratadi, natijalar default partitsiyaga tushmasligi uchun."""
+    current = month_key(now or datetime.utcnow())
+    _lock(db)
+    ensure_partitions(db, [current, shift_month(current, 1)])
+
+
+def run_retention(db, now=None, keep_months=RESULT_RETENTION_MONTHS, directory=RESULT_ARCHIVE_DIR):
+    """Yopilgan oylarni yig'adi, eskilarini arxivlaydi; bajarilgan ishlar hisobotini qaytaradi.
+
+    Har bir oy alohida tranzaksiyada qayta ishlanadi, shuning uchun to'xtab qolgan
+    ish keyingi ishga tushirishda davom ettiriladi.
+    """
+    current = month_key(now or datetime.utcnow())
+    prepare_partitions(db, now)
+    _lock(db)
+    cutoff = shift_month(current, -keep_months)
+    report = {"compacted": [], "archived": [], "rows": 0}
+
+    # Har bir natija monthly_scores ga ham yoziladi, shuning uchun oylar ro'yxati shu kichik jadvaldan olinadi.
+    months = [
+        key for (key,) in db.query(MonthlyScore.month_year).distinct().order_by(MonthlyScore.month_year)
+        if key and key < current
+    ]
+    db.commit()
+    for key in months:
+        _lock(db)
+        rows = db.query(func.count(QuizResult.id)).filter(QuizResult.month_year == key).scalar()
+        if not rows:
+            db.commit()
+            continue
+        state = db.get(ResultMonth, key)
+        if state is None:
+            state = ResultMonth(month_year=key, compacted_rows=0, archived_rows=0, archive_parts=0)
+            db.add(state)
+
+        if state.archived_at is None:
+            if state.compacted_at is None or state.compacted_rows != rows:
+                compact_month(db, state, rows)
+                report["compacted"].append(key)
+        else:
+            # Arxivlangan oyga kechikib yozilgan natijalar yig'indiga qo'shiladi va darhol arxivlanadi.
+            _add_rollups(db, key)
+            state.compacted_rows += rows
+            state.compacted_at = datetime.utcnow()
+            report["compacted"].append(key)
+
+        if key < cutoff:
+            report["rows"] += archive_month(db, state, directory)
+            report["archived"].append(key)
+        db.commit()
+    return report
+
+
+async def retention_loop(interval_hours=RETENTION_INTERVAL):
+    """Bot ichida arxivlashni davriy bajaradi."""
+    while True:
+        try:
+            report = await run_db(run_retention)
+            if report["compacted"] or report["archived"]:
+                print(
+                    f"Arxivlash: yig'ildi {', '.join(report['compacted']) or '-'}; "
+                    f"arxivlandi {', '.join(report['archived']) or '-'} ({report['rows']} ta natija)"
+                )
+        except Exception as e:
+            print(f"Arxivlashda xatolik: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+async def partition_loop(interval_hours=PARTITION_INTERVAL):
+    """Arxivlash bot ichida o'chirilgan bo'lsa ham yangi oy partitsiyalarini oldindan yaratadi."""
+    while True:
+        try:
+            await run_db(prepare_partitions)
+        except Exception as e:
+            print(f"Partitsiyalarni yaratishda xatolik: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def print_status(db):
+    raw = dict(
+        db.query(QuizResult.month_year, func.count(QuizResult.id)).group_by(QuizResult.month_year).all()
+    )
+    states = {state.month_year: state for state in db.query(ResultMonth)}
+    print(f"{'Oy':<8} {'xom':>10} {'yig`ilgan':>10} {'arxivda':>10}  holat")
+    for key in sorted(set(raw) | set(states), key=lambda k: k or ""):
+        state = states.get(key)
+        status = "arxivlangan" if state and state.archived_at else "yig'ilgan" if state else "ochiq"
+        print(
+            f"{key or '-':<8} {raw.get(key, 0):>10} {state.compacted_rows if state else 0:>10} "
+            f"{state.archived_rows if state else 0:>10}  {status}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=["run", "status"], default="run")
+    parser.add_argument("--keep-months", type=int, default=RESULT_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", default=RESULT_ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    init_db()
+    with session_scope() as db:
+        if args.command == "status":
+            print_status(db)
+            return
+        report = run_retention(db, keep_months=args.keep_months, directory=args.archive_dir)
+    print(f"Yig'ilgan oylar: {', '.join(report['compacted']) or '-'}")
+    print(f"Arxivlangan oylar: {', '.join(report['archived']) or '-'} ({report['rows']} ta natija)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import json
+from abc import ABC, abstractmethod
+
+from sqlalchemy import update, delete, func
+from sqlalchemy.exc import IntegrityError
+
+import config
+from db_manager import run_db, get_question_set_by_id, QuizSessionRecord
+from quiz_session import QuizSession
+
+SESSION_STORE = getattr(config, "SESSION_STORE", "memory")
+PUT_ATTEMPTS = 3  # put() da parallel INSERT to'qnashganda urinishlar soni
+SCAN_BATCH_SIZE = 500  # items() bitta so'rovda o'qiydigan sessiyalar soni
+
+
+class SessionStore(ABC):
+    """Foydalanuvchi sessiyalari ombori interfeysi.
+
+    Har bir yozuv versiyaga ega: save() va delete() kutilgan versiya
+    mos kelmasa False qaytaradi (optimistik bloklash).
+    """
+
+    @abstractmethod
+    async def get(self, user_id):
+        """(state, version) qaytaradi; sessiya bo'lmasa (None, None)."""
+
+    @abstractmethod
+    async def save(self, user_id, state, version=None):
+        """version=None bo'lsa yangi sessiya yaratadi, aks holda uni yangilaydi."""
+
+    @abstractmethod
+    async def delete(self, user_id, version=None):
+        """Sessiyani o'chiradi; version berilsa faqat u mos kelganda."""
+
+    @abstractmethod
+    async def put(self, user_id, state):
+        """Versiyadan qat'i nazar sessiyani yozadi (yangi oqim boshlanganda)."""
+
+    @abstractmethod
+    async def count(self):
+        """Faol sessiyalar soni."""
+
+    @abstractmethod
+    def items(self):
+        """Barcha sessiyalarni (user_id, state) ko'rinishida beradi (async iterator)."""
+
+
+class MemorySessionStore(SessionStore):
+    """Jarayon ichidagi lug'atga asoslangan ombor (standart)."""
+
+    def __init__(self):
+        self._sessions = {}
+
+    async def get(self, user_id):
+        return self._sessions.get(user_id, (None, None))
+
+    async def save(self, user_id, state, version=None):
+        _, current = self._sessions.get(user_id, (None, None))
+        if current != version:
+            return False
+        self._sessions[user_id] = (state, (version or 0) + 1)
+        return True
+
+    async def delete(self, user_id, version=None):
+        _, current = self._sessions.get(user_id, (None, None))
+        if current is None or (version is not None and current != version):
+            return False
+        del self._sessions[user_id]
+        return True
+
+    async def put(self, user_id, state):
+        _, current = self._sessions.get(user_id, (None, None))
+        self._sessions[user_id] = (state, (current or 0) + 1)
+
+    async def count(self):
+        return len(self._sessions)
+
+    async def items(self):
+        for user_id, (state, _) in list(self._sessions.items()):
+            yield user_id, state
+
+
+def _dump_state(state):
+    if isinstance(state, QuizSession):
+        return json.dumps(state.to_dict())
+    return json.dumps(state)
+
+
+def _load_state(db, data):
+    data = json.loads(data)
+    if data.get("step") != QuizSession.step:
+        return data
+    qset = get_question_set_by_id(db, data["test_id"])
+    if qset is None:
+        return None
+    return QuizSession.from_dict(data, qset.questions)
+
+
+def _db_get(db, user_id):
+    record = db.get(QuizSessionRecord, user_id)
+    if record is None:
+        return None, None
+    return _load_state(db, record.data), record.version
+
+
+def _db_save(db, user_id, data, version):
+    if version is None:
+        db.add(QuizSessionRecord(user_id=user_id, version=1, data=data))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    result = db.execute(
+        update(QuizSessionRecord)
+        .where(QuizSessionRecord.user_id == user_id, QuizSessionRecord.version == version)
+        .values(data=data, version=QuizSessionRecord.version + 1)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _db_delete(db, user_id, version):
+    stmt = delete(QuizSessionRecord).where(QuizSessionRecord.user_id == user_id)
+    if version is not None:
+        stmt = stmt.where(QuizSessionRecord.version == version)
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount == 1
+
+
+def _db_put(db, user_id, data):
+    """Sessiyani yangilaydi yoki yaratadi; boshqa worker shu paytda yaratib ulgurgan bo'lsa, qayta uriniladi."""
+    for attempt in range(PUT_ATTEMPTS):
+        result = db.execute(
+            update(QuizSessionRecord)
+            .where(QuizSessionRecord.user_id == user_id)
+            .values(data=data, version=QuizSessionRecord.version + 1)
+        )
+        if result.rowcount == 0:
+            db.add(QuizSessionRecord(user_id=user_id, version=1, data=data))
+        try:
+            db.commit()
+            return
+        except IntegrityError:
+            db.rollback()
+            if attempt == PUT_ATTEMPTS - 1:
+                raise
+
+
+def _db_count(db):
+    return db.query(func.count(QuizSessionRecord.user_id)).scalar()
+
+
+def _db_scan(db, after, limit):
+    """user_id > after bo'lgan navbatdagi sessiyalar; testi o'chirilganlari o'chiriladi."""
+    records = (
+        db.query(QuizSessionRecord.user_id, QuizSessionRecord.data)
+        .filter(QuizSessionRecord.user_id > after)
+        .order_by(QuizSessionRecord.user_id)
+        .limit(limit)
+        .all()
+    )
+    rows, orphans = [], []
+    for user_id, data in records:
+        state = _load_state(db, data)
+        if state is None:
+            orphans.append(user_id)
+        else:
+            rows.append((user_id, state))
+    if orphans:
+        db.execute(delete(QuizSessionRecord).where(QuizSessionRecord.user_id.in_(orphans)))
+        db.commit()
+    last = records[-1][0] if len(records) == limit else None
+    return rows, last
+
+
+class DBSessionStore(SessionStore):
+    """Sessiyalarni `quiz_sessions` jadvalida saqlaydi.
+
+    Bot qayta ishga tushganda sessiyalar yo'qolmaydi va bir nechta
+    worker bitta jadvaldan xavfsiz foydalana oladi.
+    """
+
+    async def get(self, user_id):
+        state, version = await run_db(_db_get, user_id)
+        if state is None and version is not None:
+            await run_db(_db_delete, user_id, version)
+            return None, None
+        return state, version
+
+    async def save(self, user_id, state, version=None):
+        return await run_db(_db_save, user_id, _dump_state(state), version)
+
+    async def delete(self, user_id, version=None):
+        return await run_db(_db_delete, user_id, version)
+
+    async def put(self, user_id, state):
+        await run_db(_db_put, user_id, _dump_state(state))
+
+    async def count(self):
+        return await run_db(_db_count)
+
+    async def items(self):
+        after = -1
+        while after is not None:
+            rows, after = await run_db(_db_scan, after, SCAN_BATCH_SIZE)
+            for row in rows:
+                yield row
+
+
+def create_session_store(kind=SESSION_STORE):
+    """Konfiguratsiyaga ko'ra sessiya omborini yaratadi ("memory" yoki "db")."""
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "db":
+        return DBSessionStore()
+    raise ValueError(f"Noma'lum SESSION_STORE: {kind}")
@@ -0,0 +1,25 @@
+"""Testlar vaqtinchalik SQLite bazasida ishlaydi: haqiqiy config.py o'rniga alohida config moduli.
+
+TEST_DATABASE_URL berilsa (masalan bo'sh Postgres bazasi), testlar o'sha bazada bajariladi.
+"""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+config = types.ModuleType("config")
+config.TELEGRAM_BOT_TOKEN = "0:test"
+config.ADMIN_ID = 1
+config.DATABASE_URL = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+sys.modules["config"] = config
+
+
+@pytest.fixture(scope="session")
+def database():
+    from db_manager import init_db
+
+    init_db()
@@ -0,0 +1,39 @@
+import asyncio
+import types
+from datetime import datetime, timedelta
+
+from broadcast import BroadcastManager
+from db_manager import session_scope, get_or_create_user, create_broadcast, cancel_broadcast, Broadcast
+
+
+class StalledBot:
+    """Birinchi to'plamda to'xtab turadi: ish worker to'xtatilguncha tugamaydi."""
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.Event().wait()
+
+
+def test_running_broadcast_is_resumed_by_one_worker_only(database):
+    first, second = BroadcastManager(), BroadcastManager()
+    with session_scope() as db:
+        get_or_create_user(db, 5001, types.SimpleNamespace(username=None, full_name=None))
+        broadcast = create_broadcast(db, "salom", None, first.owner, first.lease_until())
+
+    async def scenario():
+        bot = StalledBot()
+        # Egasi hali ishlayapti: boshqa worker ishni olmaydi.
+        assert await second.resume(bot) == []
+        # Egasi to'xtab ijarasi tugagach, ish bitta worker'ga o'tadi.
+        with session_scope() as db:
+            db.get(Broadcast, broadcast['id']).lease_until = datetime.utcnow() - timedelta(seconds=1)
+        tasks = await second.resume(bot)
+        assert len(tasks) == 1
+        assert await first.resume(bot) == []
+        await second.stop()
+
+    asyncio.run(scenario())
+    with session_scope() as db:
+        row = db.get(Broadcast, broadcast['id'])
+        # To'xtagan worker ijarani bo'shatadi: keyingi ishga tushish kutmaydi.
+        assert row.owner is None
+        cancel_broadcast(db)
@@ -0,0 +1,58 @@
+from db_manager import session_scope, save_test_to_db, get_catalogue_page
+from quiz_cache import test_catalogue
+
+QUESTIONS = [{'question': "1 + 1?", 'correct_answer': "2", 'options': ["3"]}]
+
+
+def page_names(prefix):
+    with session_scope() as db:
+        entries, _, _ = get_catalogue_page(db, prefix=prefix, limit=50)
+    return [entry.name for entry in entries]
+
+
+def test_catalogue_picks_up_changes_from_other_processes(database, monkeypatch):
+    monkeypatch.setattr(test_catalogue, "check_interval", 0)
+    monkeypatch.setattr(test_catalogue, "_next_check", 0.0)
+    with session_scope() as db:
+        save_test_to_db(db, "catalogue_a", QUESTIONS)
+    assert page_names("catalogue_") == ["catalogue_a"]
+
+    # Boshqa jarayonda qo'shilgan test: bu jarayonning invalidate() i chaqirilmaydi.
+    invalidate = test_catalogue.invalidate
+    monkeypatch.setattr(test_catalogue, "invalidate", lambda: None)
+    with session_scope() as db:
+        save_test_to_db(db, "catalogue_b", QUESTIONS)
+    monkeypatch.setattr(test_catalogue, "invalidate", invalidate)
+
+    assert page_names("catalogue_") == ["catalogue_a", "catalogue_b"]
+
+
+def test_catalogue_version_is_checked_at_most_once_per_interval(database, monkeypatch):
+    monkeypatch.setattr(test_catalogue, "check_interval", 3600)
+    monkeypatch.setattr(test_catalogue, "_next_check", 0.0)
+    calls = []
+    test_catalogue.refresh(lambda: calls.append(1) or 0)
+    test_catalogue.refresh(lambda: calls.append(1) or 0)
+    assert len(calls) == 1
+
+
+def test_reimport_in_another_process_refreshes_cached_questions(database, monkeypatch):
+    from db_manager import import_test, get_question_set_by_id, question_cache
+
+    with session_scope() as db:
+        test_id, _ = save_test_to_db(db, "catalogue_reimported", QUESTIONS)
+        old = get_question_set_by_id(db, test_id)
+
+    # transfer.py import boshqa jarayonda: bu jarayonning keshlari bekor qilinmaydi.
+    monkeypatch.setattr(question_cache, "invalidate", lambda **kwargs: None)
+    monkeypatch.setattr(test_catalogue, "invalidate", lambda: None)
+    rows = [{'question_text': "1 + 2?", 'options_json': {'A': "3", 'B': "4"}, 'correct_label': "A"}]
+    with session_scope() as db:
+        import_test(db, "catalogue_reimported", rows)
+    monkeypatch.undo()
+
+    monkeypatch.setattr(test_catalogue, "_next_check", 0.0)
+    with session_scope() as db:
+        new = get_question_set_by_id(db, test_id)
+    assert new.version == old.version + 1
+    assert [q.question for q in new.questions] == ["1 + 2?"]
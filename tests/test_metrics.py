@@ -0,0 +1,30 @@
+import sys
+import threading
+import types
+
+import metrics
+
+
+def test_sql_counters_lose_no_increments_across_threads(monkeypatch):
+    monkeypatch.setattr(metrics, "sql_queries", {})
+    monkeypatch.setattr(metrics, "sql_seconds", {})
+    threads, per_thread = 8, 5000
+
+    def run():
+        conn = types.SimpleNamespace(info={})
+        for _ in range(per_thread):
+            metrics._before_cursor_execute(conn, None, "SELECT 1", None, None, False)
+            metrics._after_cursor_execute(conn, None, "SELECT 1", None, None, False)
+
+    # Thread'lar tez-tez almashsin: qulfsiz hisoblagichda o'sish yo'qolardi.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert metrics.sql_queries["other"] == threads * per_thread
@@ -0,0 +1,102 @@
+import asyncio
+
+from db_manager import (
+    session_scope, save_test_to_db, delete_test_by_name, import_test, iter_test_export,
+    get_question_set_by_id, QuestionStat, QuestionOptionStat,
+)
+from question_stats import QuestionStatsBuffer
+
+QUESTIONS = [{'question': "2 + 2?", 'correct_answer': "4", 'options': ["3", "5"]}]
+
+
+def make_tests(db, names):
+    ids = {name: save_test_to_db(db, name, QUESTIONS)[0] for name in names}
+    return ids, {name: get_question_set_by_id(db, test_id).questions[0] for name, test_id in ids.items()}
+
+
+def record(buffer, ids, questions):
+    for name, question in questions.items():
+        buffer.shown(ids[name], question)
+        buffer.answered(ids[name], question, 1, False)
+
+
+def test_flush_skips_questions_removed_by_another_worker(database):
+    with session_scope() as db:
+        ids, questions = make_tests(db, ["stats_reimported", "stats_deleted", "stats_kept"])
+    buffer = QuestionStatsBuffer()
+    record(buffer, ids, questions)
+
+    # Hisoblar buferda turganda testni boshqa jarayon qayta import qiladi va o'chiradi.
+    with session_scope() as db:
+        name, rows = next(iter_test_export(db, ["stats_reimported"]))
+        rows = list(rows)
+    with session_scope() as db:
+        import_test(db, name, rows)
+    with session_scope() as db:
+        delete_test_by_name(db, "stats_deleted")
+
+    asyncio.run(buffer.flush())
+
+    stale_ids = [questions["stats_deleted"].question_id, questions["stats_reimported"].question_id]
+    with session_scope() as db:
+        assert db.query(QuestionStat).filter(QuestionStat.question_id.in_(stale_ids)).count() == 0
+        assert db.query(QuestionOptionStat).filter(QuestionOptionStat.question_id.in_(stale_ids)).count() == 0
+        kept = db.get(QuestionStat, questions["stats_kept"].question_id)
+        assert (kept.shown, kept.answered, kept.correct) == (1, 1, 0)
+    assert buffer.stats()["pending_questions"] == 0
+
+
+def test_discard_test_drops_only_that_test(database):
+    with session_scope() as db:
+        ids, questions = make_tests(db, ["discard_gone", "discard_kept"])
+    buffer = QuestionStatsBuffer()
+    record(buffer, ids, questions)
+
+    buffer.discard_test(ids["discard_gone"])
+
+    assert set(buffer._questions) == {questions["discard_kept"].question_id}
+    assert {key[0] for key in buffer._options} == {questions["discard_kept"].question_id}
+
+
+def test_tap_that_loses_the_version_check_is_not_counted(database, monkeypatch):
+    import types
+
+    import bot
+    from callback_data import encode_callback
+    from quiz_session import QuizSession
+    from session_store import MemorySessionStore
+
+    with session_scope() as db:
+        test_id, _ = save_test_to_db(db, "stats_taps", QUESTIONS * 2)
+        qset = get_question_set_by_id(db, test_id)
+
+    class LosingStore(MemorySessionStore):
+        """Boshqa bosish sessiyani oldinroq yangilagan: save() har doim rad etiladi."""
+
+        async def save(self, user_id, state, version=None):
+            return False
+
+    async def tap(store):
+        state = QuizSession(qset.test_id, qset.name, qset.questions)
+        await store.put(8101, state)
+
+        async def noop(*args, **kwargs):
+            pass
+
+        query = types.SimpleNamespace(
+            data=encode_callback("a", state.nonce, 0, 0), from_user=types.SimpleNamespace(id=8101),
+            message=None, answer=noop, edit_message_text=noop,
+        )
+        update = types.SimpleNamespace(callback_query=query, message=types.SimpleNamespace(reply_text=noop))
+        monkeypatch.setattr(bot, "session_store", store)
+        await bot.handle_quiz_callback(update, None)
+        return state.order[0]
+
+    buffer = QuestionStatsBuffer()
+    monkeypatch.setattr(bot, "question_stats", buffer)
+    asyncio.run(tap(LosingStore()))
+    assert buffer._options == {}
+    assert all(row[2] == 0 for row in buffer._questions.values())
+
+    first = asyncio.run(tap(MemorySessionStore()))
+    assert buffer._questions[qset.questions[first].question_id][2] == 1
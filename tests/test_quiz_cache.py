@@ -0,0 +1,29 @@
+import hashlib
+import hmac
+
+import callback_data
+from quiz_cache import make_question, ARRANGEMENTS_PER_QUESTION
+
+OPTIONS = ["3", "5", "6", "7"]
+
+
+def layouts(question):
+    return [labels for labels, _, _ in question.arrangements]
+
+
+def test_arrangements_depend_on_the_server_secret(monkeypatch):
+    question = make_question("2 + 2?", OPTIONS, "4", 11)
+    for labels, slot, choices in question.arrangements:
+        assert labels[slot].endswith(". 4") and choices[slot] == 0
+    # Savol matni va ID ma'lum bo'lsa ham, kalitsiz joylashuvlarni qayta hosil qilib bo'lmaydi.
+    monkeypatch.setattr(callback_data, "_mac_base", hmac.new(b"other secret", digestmod=hashlib.sha256))
+    assert layouts(make_question("2 + 2?", OPTIONS, "4", 11)) != layouts(question)
+
+
+def test_correct_slot_is_not_a_fixed_rotation():
+    rotation = [i % 4 for i in range(ARRANGEMENTS_PER_QUESTION)]
+    slots = [
+        [slot for _, slot, _ in make_question(f"Savol {n}?", OPTIONS, "4", n).arrangements]
+        for n in range(20)
+    ]
+    assert any(row != rotation for row in slots)
@@ -0,0 +1,95 @@
+import asyncio
+import glob
+import os
+import tempfile
+import types
+
+from db_manager import session_scope, get_or_create_user, save_test_to_db, QuizResult, JournalSegment
+from result_writer import ResultWriter
+
+QUESTIONS = [{'question': "3 + 3?", 'correct_answer': "6", 'options': ["5", "7"]}]
+
+
+def setup_test(name, user_ids):
+    with session_scope() as db:
+        for user_id in user_ids:
+            get_or_create_user(db, user_id, types.SimpleNamespace(username=None, full_name=None))
+        test_id, _ = save_test_to_db(db, name, QUESTIONS)
+    return test_id
+
+
+def saved(test_id):
+    with session_scope() as db:
+        return db.query(QuizResult).filter(QuizResult.test_id == test_id).count()
+
+
+def test_journaled_burst_is_saved_and_stop_returns(database):
+    user_ids = range(9001, 9401)
+    test_id = setup_test("writer_burst", user_ids)
+    path = os.path.join(tempfile.mkdtemp(), "results.journal")
+
+    async def scenario():
+        writer = ResultWriter(batch_size=200, interval=0.05, journal_path=path)
+        await writer.start()
+        await asyncio.gather(*(writer.submit(user_id, test_id, 1, 1) for user_id in user_ids))
+        await asyncio.wait_for(writer.stop(), timeout=10)
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert saved(test_id) == len(user_ids)
+    # Bir vaqtda kelgan natijalar bitta fsync'da yoziladi.
+    assert writer.syncs < len(user_ids)
+    assert glob.glob(path + ".*") == []
+
+
+def test_unflushed_journal_is_replayed_on_start(database):
+    test_id = setup_test("writer_replay", [9501])
+    path = os.path.join(tempfile.mkdtemp(), "results.journal")
+
+    async def crash():
+        writer = ResultWriter(batch_size=1000, interval=60, journal_path=path)
+        await writer.start()
+        await writer.submit(9501, test_id, 1, 1)
+        # Jarayon to'xtashi: navbat DB ga yozilmaydi.
+        writer._task.cancel()
+
+    async def restart():
+        writer = ResultWriter(journal_path=path)
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(crash())
+    assert saved(test_id) == 0
+    asyncio.run(restart())
+    assert saved(test_id) == 1
+
+
+def test_replay_skips_segments_committed_before_a_crash(database, monkeypatch):
+    import result_writer
+
+    test_id = setup_test("writer_committed", [9601])
+    path = os.path.join(tempfile.mkdtemp(), "results.journal")
+
+    async def crash_after_commit():
+        writer = ResultWriter(batch_size=1000, interval=60, journal_path=path)
+        await writer.start()
+        await writer.submit(9601, test_id, 1, 1)
+        # Partiya commit qilinadi, lekin jarayon segment faylini o'chirishga ulgurmaydi.
+        monkeypatch.setattr(result_writer.os, "remove", lambda path: None)
+        await writer.flush()
+        monkeypatch.undo()
+        writer._task.cancel()
+
+    async def restart():
+        writer = ResultWriter(journal_path=path)
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(crash_after_commit())
+    assert saved(test_id) == 1
+    asyncio.run(restart())
+    assert saved(test_id) == 1
+    assert glob.glob(path + ".*") == []
+    # Fayli o'chirilgan segmentlarning belgilari ham tozalanadi.
+    with session_scope() as db:
+        assert db.query(JournalSegment).count() == 0
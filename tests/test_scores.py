@@ -0,0 +1,95 @@
+import asyncio
+import types
+from datetime import datetime
+
+from db_manager import (
+    session_scope, get_or_create_user, save_test_to_db, save_quiz_result, delete_test_by_name,
+    get_monthly_leaderboard, get_user_rank, run_db, MonthlyScore, QuizResult, User,
+)
+
+QUESTIONS = [{'question': "2 + 2?", 'correct_answer': "4", 'options': ["3", "5"]}]
+
+
+def make_user(db, user_id):
+    get_or_create_user(db, user_id, types.SimpleNamespace(username=f"u{user_id}", full_name=f"User {user_id}"))
+
+
+def monthly_score(db, user_id):
+    month_key = datetime.utcnow().strftime("%Y-%m")
+    return db.query(MonthlyScore.score).filter(
+        MonthlyScore.month_year == month_key, MonthlyScore.user_id == user_id
+    ).scalar()
+
+
+def test_delete_test_removes_its_points_from_monthly_scores(database):
+    with session_scope() as db:
+        make_user(db, 7001)
+        make_user(db, 7002)
+        deleted_id, _ = save_test_to_db(db, "scores_deleted", QUESTIONS)
+        kept_id, _ = save_test_to_db(db, "scores_kept", QUESTIONS)
+        save_quiz_result(db, 7001, deleted_id, 7, 10)
+        save_quiz_result(db, 7002, deleted_id, 4, 10)
+        save_quiz_result(db, 7002, kept_id, 3, 10)
+
+    with session_scope() as db:
+        assert delete_test_by_name(db, "scores_deleted")
+
+    with session_scope() as db:
+        assert db.query(QuizResult).filter(QuizResult.test_id == deleted_id).count() == 0
+        # Faqat shu testdan ball olgan foydalanuvchi reytingdan chiqadi.
+        assert monthly_score(db, 7001) is None
+        assert monthly_score(db, 7002) == 3
+        board = {row['id']: row['score'] for row in get_monthly_leaderboard(db, datetime.utcnow().strftime("%Y-%m"), 100)}
+        assert 7001 not in board
+        assert board[7002] == 3
+        assert get_user_rank(db, 7001)[1] is None
+
+
+def test_parallel_finishes_lose_no_updates(database):
+    user_id, finishes, score = 8001, 50, 3
+    with session_scope() as db:
+        make_user(db, user_id)
+        test_id, _ = save_test_to_db(db, "scores_parallel", QUESTIONS)
+
+    async def finish_all():
+        await asyncio.gather(*(
+            run_db(save_quiz_result, user_id, test_id, score, 5) for _ in range(finishes)
+        ))
+
+    asyncio.run(finish_all())
+
+    with session_scope() as db:
+        assert db.query(User.total_correct_global).filter(User.id == user_id).scalar() == finishes * score
+        assert monthly_score(db, user_id) == finishes * score
+        assert db.query(QuizResult).filter(QuizResult.test_id == test_id).count() == finishes
+
+
+def test_delete_test_subtracts_scores_in_constant_statements(database):
+    from sqlalchemy import event
+
+    from db_manager import get_engine
+
+    user_ids = range(7101, 7131)
+    with session_scope() as db:
+        test_id, _ = save_test_to_db(db, "scores_popular", QUESTIONS)
+        for user_id in user_ids:
+            make_user(db, user_id)
+            save_quiz_result(db, user_id, test_id, 2, 10)
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if "monthly_scores" in statement:
+            statements.append(statement)
+
+    event.listen(get_engine(), "before_cursor_execute", count)
+    try:
+        with session_scope() as db:
+            assert delete_test_by_name(db, "scores_popular")
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", count)
+
+    # 30 foydalanuvchi uchun ham bitta UPDATE va bitta DELETE.
+    assert len(statements) == 2
+    with session_scope() as db:
+        assert all(monthly_score(db, user_id) is None for user_id in user_ids)
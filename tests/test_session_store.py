@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import session_store
+from db_manager import session_scope, save_test_to_db, delete_test_by_name, get_question_set_by_id
+from quiz_session import QuizSession
+from session_store import SessionStore, MemorySessionStore, DBSessionStore
+
+QUESTIONS = [{'question': "2 + 2?", 'correct_answer': "4", 'options': ["3", "5"]}]
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+@pytest.mark.parametrize("store_class", [MemorySessionStore, DBSessionStore])
+def test_versioned_save_and_delete(database, store_class):
+    async def scenario():
+        store = store_class()
+        user_id = 6001 if store_class is MemorySessionStore else 6002
+        assert await store.save(user_id, {'step': 'awaiting_test_name'})
+        state, version = await store.get(user_id)
+        assert state == {'step': 'awaiting_test_name'}
+        # Eski versiya bilan yozish rad etiladi.
+        assert await store.save(user_id, {'step': 'awaiting_test_content'}, version)
+        assert not await store.save(user_id, {'step': 'stale'}, version)
+        await store.put(user_id, {'step': 'awaiting_test_name'})
+        state, version = await store.get(user_id)
+        assert state == {'step': 'awaiting_test_name'}
+        assert await store.delete(user_id, version)
+        assert await store.get(user_id) == (None, None)
+
+    asyncio.run(scenario())
+
+
+def test_db_put_gives_up_after_bounded_attempts():
+    attempts = []
+
+    class ConflictingSession:
+        def execute(self, stmt):
+            attempts.append(stmt)
+            return type("Result", (), {"rowcount": 0})()
+
+        def add(self, record):
+            pass
+
+        def commit(self):
+            raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+        def rollback(self):
+            pass
+
+    with pytest.raises(IntegrityError):
+        session_store._db_put(ConflictingSession(), 6003, "{}")
+    assert len(attempts) == session_store.PUT_ATTEMPTS
+
+
+def test_persisted_sessions_are_rearmed_after_restart(database, monkeypatch):
+    import bot
+
+    with session_scope() as db:
+        kept_id, _ = save_test_to_db(db, "sessions_kept", QUESTIONS)
+        gone_id, _ = save_test_to_db(db, "sessions_gone", QUESTIONS)
+        kept = get_question_set_by_id(db, kept_id)
+        gone = get_question_set_by_id(db, gone_id)
+
+    async def scenario():
+        store = DBSessionStore()
+        stale = QuizSession(kept.test_id, kept.name, kept.questions)
+        stale.started_at = stale.asked_at = time.time() - 2 * bot.SESSION_IDLE_TIMEOUT
+        await store.put(6101, stale)
+        await store.put(6102, {'step': 'awaiting_test_name'})
+        await store.put(6103, QuizSession(gone.test_id, gone.name, gone.questions))
+        with session_scope() as db:
+            delete_test_by_name(db, "sessions_gone")
+
+        # Yangi jarayon: taymerlar bo'sh, sessiyalar faqat jadvalda.
+        monkeypatch.setattr(bot, "session_store", store)
+        monkeypatch.setattr(bot, "session_timers", bot.TimerWheel())
+        await bot.rearm_sessions()
+
+        timers = bot.session_timers._timers
+        assert set(timers) == {6101, 6102}
+        # Muddati o'tgan sessiya keyingi tick'dayoq yakunlanadi, admin sessiyasi esa kutadi.
+        assert bot.session_timers.advance(time.time() + bot.session_timers.tick) == [6101]
+        # Testi o'chirilgan sessiya jadvaldan olib tashlanadi.
+        assert await store.get(6103) == (None, None)
+        assert await store.count() == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import types
+
+from update_processor import PerUserUpdateProcessor
+
+
+def make_update(user_id):
+    return types.SimpleNamespace(effective_user=types.SimpleNamespace(id=user_id))
+
+
+def test_user_backlog_does_not_hold_global_slots():
+    async def scenario():
+        processor = PerUserUpdateProcessor(4)
+        order, finished = [], {}
+        started = time.perf_counter()
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+            finished[name] = time.perf_counter() - started
+
+        tasks = [
+            asyncio.create_task(processor.process_update(make_update(1), handle(f"a{i}", 0.1)))
+            for i in range(8)
+        ]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(processor.process_update(make_update(2), handle("b", 0))))
+        await asyncio.gather(*tasks)
+        return order, finished
+
+    order, finished = asyncio.run(scenario())
+    # A ning 8 ta update'i ketma-ket (~0.8 s), B esa ularni kutmaydi.
+    assert [name for name in order if name.startswith("a")] == [f"a{i}" for i in range(8)]
+    assert finished["b"] < 0.05
+    assert finished["a7"] >= 0.8
+
+
+def test_same_user_updates_never_overlap():
+    async def scenario():
+        processor = PerUserUpdateProcessor(8)
+        running, peak = 0, 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(1), handle()) for _ in range(10)))
+        return peak, processor._tails
+
+    peak, tails = asyncio.run(scenario())
+    assert peak == 1
+    assert tails == {}
+
+
+def test_global_limit_still_applies():
+    async def scenario():
+        processor = PerUserUpdateProcessor(3)
+        running, peak = 0, 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(user_id), handle()) for user_id in range(10)))
+        return peak
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_cancelled_waiter_keeps_order():
+    async def scenario():
+        processor = PerUserUpdateProcessor(4)
+        order = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        first = asyncio.create_task(processor.process_update(make_update(1), handle("first", 0.05)))
+        second = asyncio.create_task(processor.process_update(make_update(1), handle("second", 0)))
+        third = asyncio.create_task(processor.process_update(make_update(1), handle("third", 0)))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.gather(first, second, third, return_exceptions=True)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "third"]
+
+
+def test_library_entry_point_is_not_overridden():
+    # process_update PTB da @final: tartib faqat do_process_update ichida.
+    assert "process_update" not in PerUserUpdateProcessor.__dict__
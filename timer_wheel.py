@@ -0,0 +1,84 @@
+import asyncio
+import math
+import time
+
+
+class TimerWheel:
+    """Ko'p sonli kalit uchun bitta fon vazifasiga asoslangan hashed timer wheel.
+
+    Har bir kalitda ko'pi bilan bitta taymer bo'ladi: schedule() va cancel()
+    O(1), har bir tick faqat bitta slotni ko'rib chiqadi. Aniqlik - tick.
+    """
+
+    def __init__(self, tick=1.0, slots=512, clock=time.time):
+        self.tick = tick
+        self.clock = clock
+        self._slots = [set() for _ in range(slots)]
+        self._timers = {}  # key -> (deadline, slot index)
+        self._last_tick = int(clock() // tick)
+        self._task = None
+        self._on_expire = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, key, deadline):
+        """Kalit uchun taymerni `deadline` (clock() vaqti) ga o'rnatadi yoki suradi."""
+        self.cancel(key)
+        # Taymer deadline'dan keyingi birinchi tick chegarasida ishlaydi; o'tib ketgan
+        # tick'ga tushsa, to'liq aylanishni kutmasligi uchun navbatdagisiga qo'yiladi.
+        tick = max(math.ceil(deadline / self.tick), self._last_tick + 1)
+        index = tick % len(self._slots)
+        self._slots[index].add(key)
+        self._timers[key] = (deadline, index)
+
+    def cancel(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            self._slots[timer[1]].discard(key)
+
+    def advance(self, now):
+        """`now` gacha o'tgan tick'larni qayta ishlaydi va muddati tugagan kalitlarni qaytaradi."""
+        current = int(now // self.tick)
+        first = max(self._last_tick + 1, current - len(self._slots) + 1)
+        expired = []
+        for tick in range(first, current + 1):
+            slot = self._slots[tick % len(self._slots)]
+            # Keyingi aylanishlarga tegishli kalitlar slotda qoladi.
+            due = [key for key in slot if self._timers[key][0] <= now]
+            for key in due:
+                slot.discard(key)
+                del self._timers[key]
+            expired += due
+        self._last_tick = max(self._last_tick, current)
+        return expired
+
+    def start(self, on_expire):
+        """Fon vazifasini ishga tushiradi; on_expire(key) - async funksiya."""
+        self._on_expire = on_expire
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            for key in self.advance(self.clock()):
+                task = asyncio.create_task(self._fire(key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key):
+        try:
+            await self._on_expire(key)
+        except Exception as e:
+            print(f"Taymer xatosi ({key}): {e}")
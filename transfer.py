@@ -0,0 +1,118 @@
+"""Testlar katalogini muhitlar orasida ko'chirish (JSONL.gz).
+
+Fayl gzip bilan siqilgan JSON satrlaridan iborat: har bir test sarlavha
+satri va undan keyingi savol satrlari bilan yoziladi:
+
+    {"test": "Geografiya_101"}
+    {"question": "...", "options": {"A": "...", "B": "..."}, "correct": "B"}
+
+Import test nomi bo'yicha idempotent: mavjud testning savollari
+almashtiriladi, yangi test yaratiladi.
+
+    python transfer.py export tests.jsonl.gz [--test NOM ...]
+    python transfer.py import tests.jsonl.gz [--chunk-size 1000]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+from db_manager import init_db, session_scope, import_test, iter_test_export, SAVE_CHUNK_SIZE
+
+
+def write_tests(stream, tests):
+    """(nom, savol satrlari) juftliklarini oqimga yozadi; (testlar, savollar) soni."""
+    test_count = question_count = 0
+    for name, rows in tests:
+        stream.write(json.dumps({"test": name}, ensure_ascii=False) + "\n")
+        for row in rows:
+            stream.write(json.dumps({
+                "question": row["question_text"],
+                "options": row["options_json"],
+                "correct": row["correct_label"],
+            }, ensure_ascii=False) + "\n")
+            question_count += 1
+        test_count += 1
+    return test_count, question_count
+
+
+def read_tests(stream):
+    """Oqimdan (nom, savol satrlari generatori) juftliklarini o'qiydi."""
+    records = (json.loads(line) for line in stream if line.strip())
+    header = next(records, None)
+    while header is not None:
+        if "test" not in header:
+            raise ValueError("Fayl test sarlavhasi bilan boshlanishi kerak")
+        following = []
+
+        def rows():
+            for record in records:
+                if "test" in record:
+                    following.append(record)
+                    return
+                yield {
+                    "question_text": record["question"],
+                    "options_json": record["options"],
+                    "correct_label": record["correct"],
+                }
+
+        questions = rows()
+        yield header["test"], questions
+        # Iste'molchi oxirigacha o'qimagan bo'lsa, keyingi sarlavhagacha o'tkazib yuboriladi.
+        for _ in questions:
+            pass
+        header = following[0] if following else None
+
+
+def export_tests(path, names=None):
+    started = time.perf_counter()
+    with session_scope() as db, gzip.open(path, "wt", encoding="utf-8") as stream:
+        tests, questions = write_tests(stream, iter_test_export(db, names))
+    report("Eksport", tests, questions, time.perf_counter() - started, path)
+
+
+def import_tests(path, chunk_size=SAVE_CHUNK_SIZE):
+    init_db()
+    started = time.perf_counter()
+    tests = questions = 0
+    with session_scope() as db, gzip.open(path, "rt", encoding="utf-8") as stream:
+        for name, rows in read_tests(stream):
+            count = import_test(db, name, rows, chunk_size)
+            if count:
+                tests += 1
+                questions += count
+            else:
+                print(f"O'tkazib yuborildi (savollar yo'q): {name}")
+    report("Import", tests, questions, time.perf_counter() - started, path)
+
+
+def report(action, tests, questions, elapsed, path):
+    size = os.path.getsize(path) / 1024 / 1024
+    print(
+        f"{action}: {tests} ta test, {questions} ta savol, {elapsed:.2f}s, "
+        f"{questions / elapsed if elapsed else 0:.0f} savol/s, fayl {size:.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="testlarni faylga yozish")
+    export.add_argument("path")
+    export.add_argument("--test", action="append", dest="names", help="faqat shu nomli test (takrorlash mumkin)")
+
+    load = sub.add_parser("import", help="testlarni fayldan yuklash")
+    load.add_argument("path")
+    load.add_argument("--chunk-size", type=int, default=SAVE_CHUNK_SIZE)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_tests(args.path, args.names)
+    else:
+        import_tests(args.path, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
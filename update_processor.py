@@ -0,0 +1,60 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+# PTB semafori navbatda turgan update'larni ham sanaydi: u faqat xotirani cheklaydi.
+MAX_PENDING_UPDATES = 1024
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Turli foydalanuvchilarning update'larini parallel, bitta
+    foydalanuvchinikini esa kelgan tartibida ketma-ket bajaradi.
+
+    Har bir foydalanuvchi uchun oxirgi update'ning tugash future'i saqlanadi;
+    navbatdagi update uni bajarish slotini egallamasdan kutadi, shuning
+    uchun bitta foydalanuvchining to'plangan update'lari boshqalarni to'smaydi.
+    Bir vaqtda bajariladigan handler'lar soni alohida semafor bilan cheklanadi.
+    """
+
+    def __init__(self, max_concurrent_updates, max_pending_updates=MAX_PENDING_UPDATES):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.max_running_updates = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._tails = {}  # user_id -> foydalanuvchining oxirgi update'i tugashi
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            async with self._running:
+                await coroutine
+            return
+
+        previous = self._tails.get(user.id)
+        done = self._tails[user.id] = asyncio.get_running_loop().create_future()
+        started = False
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            started = True
+            async with self._running:
+                await coroutine
+        finally:
+            if not started:
+                # Navbatda kutayotganda bekor qilindi: handler ishga tushmaydi.
+                coroutine.close()
+            if previous is not None and not previous.done():
+                # Keyingi update baribir oldingisi tugashini kutishi kerak.
+                previous.add_done_callback(lambda _: self._release(user.id, done))
+            else:
+                self._release(user.id, done)
+
+    def _release(self, user_id, done):
+        done.set_result(None)
+        if self._tails.get(user_id) is done:
+            del self._tails[user_id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,63 @@
+import config
+from telegram import Update
+
+WEBHOOK_URL = getattr(config, "WEBHOOK_URL", None)
+WEBHOOK_PATH = getattr(config, "WEBHOOK_PATH", "/telegram")
+WEBHOOK_LISTEN = getattr(config, "WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = getattr(config, "WEBHOOK_PORT", 8443)
+WEBHOOK_SECRET = getattr(config, "WEBHOOK_SECRET", None)
+
+
+def create_asgi_app(application):
+    """Telegram update'larini qabul qiluvchi Starlette ASGI ilovasini yaratadi."""
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse, Response
+    from starlette.routing import Route
+
+    async def telegram(request):
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return Response(status_code=403)
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return Response()
+
+    async def healthcheck(request):
+        return PlainTextResponse("ok")
+
+    return Starlette(routes=[
+        Route(WEBHOOK_PATH, telegram, methods=["POST"]),
+        Route("/healthcheck", healthcheck, methods=["GET"]),
+    ])
+
+
+async def run_webhook(application, allowed_updates, on_startup=None, on_shutdown=None):
+    """Botni o'rnatilgan uvicorn serverida webhook rejimida ishga tushiradi.
+
+    Kerakli paketlar: starlette, uvicorn.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(
+        create_asgi_app(application),
+        host=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        log_level="warning",
+    ))
+
+    async with application:
+        if on_startup:
+            await on_startup(application)
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                allowed_updates=allowed_updates,
+                secret_token=WEBHOOK_SECRET,
+            )
+        await application.start()
+        print(f"Webhook {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} da tinglanmoqda...")
+        try:
+            await server.serve()
+        finally:
+            await application.stop()
+            if on_shutdown:
+                await on_shutdown(application)
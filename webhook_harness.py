@@ -0,0 +1,173 @@
+"""Webhook rejimini Telegram'ga ulanmasdan o'lchash uchun lokal harness.
+
+1. Soxta Bot API serverini ishga tushiring:
+       python webhook_harness.py stub --port 8081
+2. config.py da BOT_MODE = "webhook", BOT_API_BASE_URL = "http://127.0.0.1:8081/bot"
+   qilib botni ishga tushiring: python bot.py
+3. Sintetik update'larni yuboring:
+       python webhook_harness.py post --updates 5000 --users 500
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESSAGE_METHODS = {"sendMessage", "editMessageText"}
+
+
+class StubBotAPI(BaseHTTPRequestHandler):
+    """Har qanday Bot API chaqiruviga muvaffaqiyatli javob beradi va ularni sanaydi."""
+
+    calls = {}
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.lock:
+                self._reply({"calls": dict(self.calls), "uptime": time.monotonic() - self.started})
+        elif self.path == "/reset":
+            with self.lock:
+                self.calls.clear()
+                type(self).started = time.monotonic()
+            self._reply({"ok": True})
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        params = {}
+        if self.headers.get("Content-Type", "").startswith("application/json") and raw:
+            params = json.loads(raw)
+        elif raw:
+            params = dict(urllib.parse.parse_qsl(raw.decode()))
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        elif method in MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id") or 1)
+            result = {
+                "message_id": int(params.get("message_id") or 1),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        self._reply({"ok": True, "result": result})
+
+
+def make_update(update_id, user_id, kind):
+    """Sintetik Telegram update JSON'ini yaratadi."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user}
+    if kind == "callback":
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(user_id),
+                "data": "show_leaderboard", "message": dict(message, text="..."),
+            },
+        }
+    text = "/start" if kind == "start" else "/leaderboard"
+    message["text"] = text
+    message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def post_updates(args):
+    kinds = ["start", "leaderboard", "callback"]
+    latencies = []
+    lock = threading.Lock()
+    if args.stub:
+        _get_json(f"{args.stub}/reset")
+
+    def post(i):
+        body = json.dumps(make_update(i + 1, 1000 + i % args.users, kinds[i % len(kinds)])).encode()
+        request = urllib.request.Request(args.url, data=body, headers={"Content-Type": "application/json"})
+        if args.secret:
+            request.add_header("X-Telegram-Bot-Api-Secret-Token", args.secret)
+        started = time.perf_counter()
+        urllib.request.urlopen(request, timeout=30).read()
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(post, range(args.updates)))
+    accepted = time.perf_counter() - started
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"Yuborildi: {args.updates} ta update, {accepted:.2f}s, {args.updates / accepted:.0f} update/s")
+    print(f"POST latency: p50={p(0.5):.1f}ms p95={p(0.95):.1f}ms p99={p(0.99):.1f}ms")
+
+    if args.stub:
+        # Har bir update kamida bitta xabar yuborish/tahrirlashga olib keladi.
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            calls = _get_json(f"{args.stub}/stats")["calls"]
+            if sum(calls.get(m, 0) for m in MESSAGE_METHODS) >= args.updates:
+                break
+            time.sleep(0.2)
+        stats = _get_json(f"{args.stub}/stats")
+        handled = sum(stats["calls"].get(m, 0) for m in MESSAGE_METHODS)
+        total = time.perf_counter() - started
+        print(f"Javoblar: {handled} ta, {total:.2f}s, {handled / total:.0f} javob/s")
+        print(f"Bot API chaqiruvlari: {stats['calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stub = sub.add_parser("stub", help="soxta Bot API serverini ishga tushirish")
+    stub.add_argument("--port", type=int, default=8081)
+
+    post = sub.add_parser("post", help="webhook'ga sintetik update'lar yuborish")
+    post.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    post.add_argument("--stub", default="http://127.0.0.1:8081")
+    post.add_argument("--secret", default=None)
+    post.add_argument("--updates", type=int, default=1000)
+    post.add_argument("--users", type=int, default=100)
+    post.add_argument("--concurrency", type=int, default=32)
+    post.add_argument("--timeout", type=float, default=60)
+
+    args = parser.parse_args()
+    if args.command == "stub":
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), StubBotAPI)
+        print(f"Soxta Bot API: http://127.0.0.1:{args.port}/bot")
+        server.serve_forever()
+    else:
+        post_updates(args)
+
+
+if __name__ == "__main__":
+    main()